@@ -0,0 +1,109 @@
+import os
+import random
+import sqlite3
+from typing import Any, Dict, List, Tuple
+
+import asyncpg
+
+# Row counts at scale 1; every scale multiplies all three tables
+BASE_ORGANIZATIONS = 50
+BASE_WALLETS = 500
+BASE_VCCS = 3000
+
+SCALES = {
+    "small": 1,
+    "medium": 10,
+    "large": 100,
+}
+
+COUNTRIES = ["US", "IN", "UK", "DE", "SG", "BR"]
+CURRENCIES = ["USD", "EUR", "GBP", "INR"]
+CARD_TYPES = ["virtual", "physical", "single-use"]
+
+SQLITE_DDL = """
+    CREATE TABLE organizations (organization_id INTEGER PRIMARY KEY, organization_name TEXT,
+                                status TEXT, country TEXT);
+    CREATE TABLE wallets (wallet_id INTEGER PRIMARY KEY,
+                          organization_id INTEGER REFERENCES organizations(organization_id),
+                          funding_wallet_id INTEGER UNIQUE, balance REAL, currency TEXT, status TEXT);
+    CREATE TABLE vccs (vcc_id INTEGER PRIMARY KEY,
+                       funding_wallet_id INTEGER REFERENCES wallets(funding_wallet_id),
+                       card_type TEXT, amount INTEGER, status TEXT);
+    CREATE INDEX idx_vccs_status ON vccs(status);
+"""
+
+POSTGRES_DDL = """
+    DROP TABLE IF EXISTS vccs, wallets, organizations;
+    CREATE TABLE organizations (organization_id integer PRIMARY KEY, organization_name text,
+                                status text, country text);
+    CREATE TABLE wallets (wallet_id integer PRIMARY KEY,
+                          organization_id integer REFERENCES organizations(organization_id),
+                          funding_wallet_id integer UNIQUE, balance numeric, currency text, status text);
+    CREATE TABLE vccs (vcc_id integer PRIMARY KEY,
+                       funding_wallet_id integer REFERENCES wallets(funding_wallet_id),
+                       card_type text, amount integer, status text);
+    CREATE INDEX idx_vccs_status ON vccs(status);
+"""
+
+
+def generate_rows(scale: int, seed: int = 42) -> Dict[str, List[Tuple[Any, ...]]]:
+    """Synthetic organizations, wallets and cards; the same seed always gives the same rows"""
+    rng = random.Random(seed)
+    organizations = BASE_ORGANIZATIONS * scale
+    wallets = BASE_WALLETS * scale
+    vccs = BASE_VCCS * scale
+    return {
+        "organizations": [
+            (org_id, f"org{org_id}", rng.choice(["active", "active", "inactive"]), rng.choice(COUNTRIES))
+            for org_id in range(1, organizations + 1)
+        ],
+        "wallets": [
+            (wallet_id, rng.randint(1, organizations), 1000 + wallet_id, round(rng.uniform(0, 50000), 2),
+             rng.choice(CURRENCIES), rng.choice(["active", "active", "active", "inactive"]))
+            for wallet_id in range(1, wallets + 1)
+        ],
+        "vccs": [
+            (vcc_id, 1000 + rng.randint(1, wallets), rng.choice(CARD_TYPES), rng.randint(1, 1000),
+             rng.choice(["active", "active", "active", "active", "inactive"]))
+            for vcc_id in range(1, vccs + 1)
+        ],
+    }
+
+
+def seed_sqlite(path: str, scale: int, seed: int = 42) -> str:
+    """Create the dataset in a SQLite file, reusing the file if it already holds this scale"""
+    if os.path.exists(path):
+        conn = sqlite3.connect(path)
+        try:
+            if conn.execute("SELECT COUNT(*) FROM vccs").fetchone()[0] == BASE_VCCS * scale:
+                return path
+        except sqlite3.Error:
+            pass
+        finally:
+            conn.close()
+        os.remove(path)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    conn = sqlite3.connect(path)
+    try:
+        conn.executescript(SQLITE_DDL)
+        for table, rows in generate_rows(scale, seed).items():
+            placeholders = ", ".join("?" * len(rows[0]))
+            conn.executemany(f"INSERT INTO {table} VALUES ({placeholders})", rows)
+        conn.commit()
+        conn.execute("ANALYZE")
+    finally:
+        conn.close()
+    return path
+
+
+async def seed_postgres(connect_kwargs: Dict[str, Any], scale: int, seed: int = 42):
+    """(Re)create the dataset in a Postgres database. Drops the three tables first."""
+    conn = await asyncpg.connect(**connect_kwargs)
+    try:
+        async with conn.transaction():
+            await conn.execute(POSTGRES_DDL)
+            for table, rows in generate_rows(scale, seed).items():
+                await conn.copy_records_to_table(table, records=rows)
+        await conn.execute("ANALYZE organizations, wallets, vccs")
+    finally:
+        await conn.close()
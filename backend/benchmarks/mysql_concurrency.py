@@ -0,0 +1,120 @@
+"""Concurrent-request throughput of the MySQL path, blocking vs. pooled executor.
+
+The "blocking" mode reproduces the old behaviour (a synchronous PyMySQL
+connect + query inside the coroutine); the "pooled" mode goes through
+DatabaseManager.execute_query. Both modes also run a ticker coroutine that
+measures how long the event loop was stalled.
+
+Run from the backend directory against a real MySQL server:
+
+    BENCH_MYSQL_HOST=127.0.0.1 BENCH_MYSQL_USER=root BENCH_MYSQL_PASSWORD=secret \\
+    BENCH_MYSQL_DATABASE=test python -m benchmarks.mysql_concurrency --requests 200
+"""
+import argparse
+import asyncio
+import json
+import os
+import time
+
+import pymysql
+
+from database_manager import DatabaseManager
+
+
+def mysql_settings() -> dict:
+    return {
+        "host": os.getenv("BENCH_MYSQL_HOST", "127.0.0.1"),
+        "port": int(os.getenv("BENCH_MYSQL_PORT", "3306")),
+        "username": os.getenv("BENCH_MYSQL_USER", "root"),
+        "password": os.getenv("BENCH_MYSQL_PASSWORD", ""),
+        "database": os.getenv("BENCH_MYSQL_DATABASE", "mysql"),
+    }
+
+
+async def blocking_query(settings: dict, query: str):
+    """Old code path: synchronous driver calls directly on the event loop"""
+    conn = pymysql.connect(
+        host=settings["host"],
+        port=settings["port"],
+        user=settings["username"],
+        password=settings["password"],
+        database=settings["database"]
+    )
+    try:
+        cursor = conn.cursor()
+        cursor.execute(query)
+        cursor.fetchall()
+    finally:
+        conn.close()
+
+
+async def measure_loop_lag(stop: asyncio.Event, interval: float = 0.01) -> float:
+    """Largest delay between scheduled and actual wake-ups of a ticker coroutine"""
+    worst = 0.0
+    while not stop.is_set():
+        start = time.perf_counter()
+        await asyncio.sleep(interval)
+        worst = max(worst, time.perf_counter() - start - interval)
+    return worst
+
+
+async def run_mode(mode: str, settings: dict, query: str, requests: int, concurrency: int) -> dict:
+    db_manager = DatabaseManager()
+    connection_id = await db_manager.add_connection(
+        name="bench", db_type="mysql", pool_max_size=concurrency, **settings
+    )
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one_request():
+        async with semaphore:
+            if mode == "blocking":
+                await blocking_query(settings, query)
+            else:
+                await db_manager.execute_query(connection_id, query)
+
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(measure_loop_lag(stop))
+    started = time.perf_counter()
+    await asyncio.gather(*(one_request() for _ in range(requests)))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    max_lag = await lag_task
+    await db_manager.close_all()
+
+    return {
+        "mode": mode,
+        "requests": requests,
+        "concurrency": concurrency,
+        "seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 1),
+        "max_loop_lag_ms": round(max_lag * 1000, 1),
+    }
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=10)
+    parser.add_argument("--sleep", type=float, default=0.05,
+                        help="server-side SLEEP() per query, simulating a slow query")
+    parser.add_argument("--json", action="store_true", help="print results as JSON")
+    args = parser.parse_args()
+
+    settings = mysql_settings()
+    query = f"SELECT SLEEP({args.sleep})"
+    results = [
+        await run_mode(mode, settings, query, args.requests, args.concurrency)
+        for mode in ("blocking", "pooled")
+    ]
+
+    if args.json:
+        print(json.dumps(results, indent=2))
+        return
+    print(f"{'mode':<10}{'seconds':>10}{'req/s':>10}{'max lag ms':>12}")
+    for result in results:
+        print(f"{result['mode']:<10}{result['seconds']:>10}{result['requests_per_second']:>10}"
+              f"{result['max_loop_lag_ms']:>12}")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
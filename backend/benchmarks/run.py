@@ -0,0 +1,302 @@
+"""Benchmark the chat pipeline and its components against a synthetic dataset.
+
+Run from the backend directory:
+
+    python -m benchmarks.run                                  # SQLite, small and medium scales
+    python -m benchmarks.run --scales small,large --output baseline.json
+    python -m benchmarks.run --baseline baseline.json         # exits 1 on a regression
+    python -m benchmarks.run --db postgresql --pg-host localhost --pg-password bench --seed-postgres
+
+--seed-postgres drops and recreates the wallets, vccs and organizations
+tables, so only point it at a throwaway database such as a container.
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import resource
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+# Benchmark connections must not end up in the persistent registry or shared caches
+os.environ.setdefault("CONNECTION_REGISTRY_PATH", "")
+os.environ.setdefault("SHARED_CACHE_PATH", "")
+os.environ.setdefault("LOG_LEVEL", "WARNING")
+
+import httpx
+
+import main
+from benchmarks.dataset import SCALES, seed_postgres, seed_sqlite
+from database_manager import DatabaseManager
+from query_generator import QueryGenerator
+from result_visualizer import ResultVisualizer
+
+# Questions the generator answers with each of its query shapes
+QUESTIONS = [
+    "show all wallets",
+    "show me all vccs",
+    "how many vccs are there",
+    "count organizations",
+    "show all organizations where status is active",
+    "find vccs where card_type is virtual",
+    "get me wallets and vccs of organisations",
+    "sort wallets by balance",
+    "group vccs by status",
+    "show wallet with id 42",
+]
+
+# Statements that read a growing share of the dataset as the scale grows
+EXECUTE_CASES = {
+    "limit_100": "SELECT * FROM vccs LIMIT 100",
+    "count": "SELECT COUNT(*) AS count FROM vccs",
+    "group_by": "SELECT status, COUNT(*) AS count FROM vccs GROUP BY status",
+    "join_limit_100": ("SELECT w.*, v.* FROM wallets w JOIN vccs v ON v.funding_wallet_id = w.funding_wallet_id "
+                       "LIMIT 100"),
+    "full_scan": "SELECT * FROM vccs",
+}
+
+# Result sizes handed to the visualizer
+VISUALIZE_ROWS = [100, 1000, 10000]
+
+Stats = Dict[str, Any]
+
+
+def peak_rss_mb() -> float:
+    """Peak resident set size of this process so far"""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Kilobytes on Linux, bytes on macOS
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+
+def percentile(sorted_values: List[float], fraction: float) -> float:
+    index = min(int(round(fraction * (len(sorted_values) - 1))), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(latencies: List[float], wall_seconds: float) -> Stats:
+    latencies = sorted(latencies)
+    return {
+        "iterations": len(latencies),
+        "throughput_per_s": round(len(latencies) / wall_seconds, 1) if wall_seconds else None,
+        "mean_ms": round(statistics.fmean(latencies) * 1000, 3),
+        "p50_ms": round(percentile(latencies, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(latencies, 0.95) * 1000, 3),
+        "p99_ms": round(percentile(latencies, 0.99) * 1000, 3),
+        "peak_rss_mb": peak_rss_mb(),
+    }
+
+
+async def measure(fn: Callable[[int], Awaitable[Any]], iterations: int, concurrency: int = 1,
+                  warmup: int = 3) -> Stats:
+    """Time fn(i) for i in range(iterations), running up to concurrency calls at once"""
+    for i in range(min(warmup, iterations)):
+        await fn(i)
+    latencies: List[float] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def timed(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            await fn(i)
+            latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(timed(i) for i in range(iterations)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def measure_sync(fn: Callable[[int], Any], iterations: int, warmup: int = 3) -> Stats:
+    for i in range(min(warmup, iterations)):
+        fn(i)
+    latencies = []
+    started = time.perf_counter()
+    for i in range(iterations):
+        call_started = time.perf_counter()
+        fn(i)
+        latencies.append(time.perf_counter() - call_started)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def connection_settings(args: argparse.Namespace, scale_name: str) -> Dict[str, Any]:
+    if args.db == "sqlite":
+        path = os.path.join(args.data_dir, f"{scale_name}.db")
+        seed_sqlite(path, SCALES[scale_name])
+        return {"name": f"bench-{scale_name}", "host": "", "port": 0, "username": "", "password": "",
+                "database": path, "db_type": "sqlite"}
+    return {"name": f"bench-{scale_name}", "host": args.pg_host, "port": args.pg_port,
+            "username": args.pg_user, "password": args.pg_password, "database": args.pg_database,
+            "db_type": "postgresql"}
+
+
+async def bench_scale(args: argparse.Namespace, scale_name: str) -> Dict[str, Stats]:
+    """Run every component benchmark against one dataset scale"""
+    if args.db == "postgresql" and args.seed_postgres:
+        await seed_postgres({"host": args.pg_host, "port": args.pg_port, "user": args.pg_user,
+                             "password": args.pg_password, "database": args.pg_database}, SCALES[scale_name])
+    settings = connection_settings(args, scale_name)
+    results: Dict[str, Stats] = {}
+
+    # Components in-process; no row cap so full scans measure the whole result
+    db_manager = DatabaseManager()
+    connection_id = await db_manager.add_connection(**settings, max_rows=0, statement_timeout=0)
+    try:
+        schema_info = await db_manager.get_schema_info(connection_id)
+        generator = QueryGenerator()
+        results["generate_sql"] = measure_sync(
+            lambda i: generator.generate_sql(QUESTIONS[i % len(QUESTIONS)], schema_info), args.iterations * 10
+        )
+        for case, sql in EXECUTE_CASES.items():
+            iterations = args.iterations if case != "full_scan" else max(args.iterations // 10, 3)
+            results[f"execute_query/{case}"] = await measure(
+                lambda i, sql=sql: db_manager.execute_query(connection_id, sql, use_cache=False), iterations
+            )
+        full_scan = await db_manager.execute_query(connection_id, EXECUTE_CASES["full_scan"], use_cache=False)
+        visualizer = ResultVisualizer()
+        for rows in VISUALIZE_ROWS:
+            if rows > full_scan["count"]:
+                continue
+            sample = {**full_scan, "rows": full_scan["rows"][:rows], "count": rows}
+            results[f"create_visualizations/{rows}_rows"] = measure_sync(
+                lambda i: visualizer.create_visualizations(sample), max(args.iterations // 5, 3)
+            )
+    finally:
+        await db_manager.close_all()
+
+    # The full HTTP pipeline in-process, sequentially and under concurrent load. The app's
+    # lifespan is left out: it would shut its executors down after the first scale.
+    transport = httpx.ASGITransport(app=main.app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        response = await client.post("/api/databases", json=settings)
+        response.raise_for_status()
+        chat_connection_id = response.json()["connection_id"]
+
+        async def chat(i: int):
+            response = await client.post("/api/chat", json={
+                "message": QUESTIONS[i % len(QUESTIONS)],
+                "db_connection_id": chat_connection_id,
+                "bypass_cache": True,
+            })
+            response.raise_for_status()
+
+        try:
+            results["api_chat/sequential"] = await measure(chat, args.iterations)
+            results[f"api_chat/concurrency_{args.concurrency}"] = await measure(
+                chat, args.iterations * 2, concurrency=args.concurrency
+            )
+        finally:
+            await client.delete(f"/api/databases/{chat_connection_id}")
+    return results
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                              check=True).stdout.strip()
+    except Exception:
+        return None
+
+
+def compare(results: Dict[str, Stats], baseline: Dict[str, Stats], tolerance: float) -> List[str]:
+    """Benchmarks whose p50/p95 latency rose or throughput fell by more than tolerance"""
+    regressions = []
+    for name, stats in results.items():
+        base = baseline.get(name)
+        if base is None:
+            continue
+        for metric in ("p50_ms", "p95_ms"):
+            if base[metric] and stats[metric] > base[metric] * (1 + tolerance):
+                regressions.append(f"{name}: {metric} {base[metric]} -> {stats[metric]}")
+        if base["throughput_per_s"] and stats["throughput_per_s"] < base["throughput_per_s"] * (1 - tolerance):
+            regressions.append(f"{name}: throughput {base['throughput_per_s']} -> {stats['throughput_per_s']}/s")
+    return regressions
+
+
+def print_table(results: Dict[str, Stats], baseline: Dict[str, Stats]):
+    header = f"{'benchmark':<46} {'ops/s':>10} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9} {'rss MB':>8}"
+    print(header)
+    print("-" * len(header))
+    for name, stats in results.items():
+        line = (f"{name:<46} {stats['throughput_per_s']:>10} {stats['p50_ms']:>9} {stats['p95_ms']:>9} "
+                f"{stats['p99_ms']:>9} {stats['peak_rss_mb']:>8}")
+        base = baseline.get(name)
+        if base and base["p50_ms"]:
+            line += f"  p50 {(stats['p50_ms'] / base['p50_ms'] - 1) * 100:+.0f}%"
+        print(line)
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = argparse.ArgumentParser(description="Benchmark the chat pipeline")
+    parser.add_argument("--db", choices=["sqlite", "postgresql"], default="sqlite")
+    parser.add_argument("--scales", default="small,medium",
+                        help=f"Comma-separated dataset scales ({', '.join(SCALES)})")
+    parser.add_argument("--iterations", type=int, default=50, help="Timed calls per benchmark")
+    parser.add_argument("--concurrency", type=int, default=8, help="Requests in flight in the load test")
+    parser.add_argument("--data-dir", default=os.path.join("benchmarks", "data"),
+                        help="Where SQLite datasets are generated (reused between runs)")
+    parser.add_argument("--pg-host", default=os.getenv("PGHOST", "localhost"))
+    parser.add_argument("--pg-port", type=int, default=int(os.getenv("PGPORT", "5432")))
+    parser.add_argument("--pg-user", default=os.getenv("PGUSER", "postgres"))
+    parser.add_argument("--pg-password", default=os.getenv("PGPASSWORD", ""))
+    parser.add_argument("--pg-database", default=os.getenv("PGDATABASE", "postgres"))
+    parser.add_argument("--seed-postgres", action="store_true",
+                        help="Drop and recreate the dataset tables for each scale")
+    parser.add_argument("--output", help="Write results (and run metadata) to this JSON file")
+    parser.add_argument("--baseline", help="Compare against a JSON file written by an earlier --output")
+    parser.add_argument("--tolerance", type=float, default=0.2,
+                        help="Allowed slowdown before a benchmark counts as regressed (0.2 = 20%%)")
+    return parser.parse_args(argv)
+
+
+async def run(args: argparse.Namespace) -> int:
+    scales = [scale.strip() for scale in args.scales.split(",") if scale.strip()]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        print(f"Unknown scales: {', '.join(unknown)}", file=sys.stderr)
+        return 2
+
+    results: Dict[str, Stats] = {}
+    for scale_name in scales:
+        for name, stats in (await bench_scale(args, scale_name)).items():
+            results[f"{args.db}/{scale_name}/{name}"] = stats
+
+    baseline: Dict[str, Stats] = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+    print_table(results, baseline)
+
+    if args.output:
+        report = {
+            "meta": {
+                "commit": git_commit(),
+                "created_at": datetime.now(timezone.utc).isoformat(),
+                "python": platform.python_version(),
+                "platform": platform.platform(),
+                "cpus": os.cpu_count(),
+                "db": args.db,
+                "scales": scales,
+                "iterations": args.iterations,
+                "concurrency": args.concurrency,
+            },
+            "results": results,
+        }
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"\nWrote {args.output}")
+
+    regressions = compare(results, baseline, args.tolerance)
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) beyond {args.tolerance:.0%}:")
+        for regression in regressions:
+            print(f"  {regression}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(run(parse_args())))
@@ -0,0 +1,176 @@
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from shared_store import SharedStore, run_off_loop
+
+
+class LRUCache:
+    """Least-recently-used cache with an optional TTL and hit/miss counters.
+
+    Entries expire ``ttl_seconds`` after they were stored (overridable per
+    entry); a ``max_entries`` of 0 disables the cache entirely. With
+    ``max_bytes`` set, callers pass each entry's approximate size and the
+    least recently used entries are evicted to stay under the budget.
+    """
+
+    def __init__(self, max_entries: int, ttl_seconds: Optional[float] = None,
+                 max_bytes: Optional[int] = None):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        # key -> (expires_at, size, value)
+        self.entries: "OrderedDict[Hashable, tuple]" = OrderedDict()
+        self.total_bytes = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        """Return the cached value, or None on a miss"""
+        entry = self.entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        expires_at, _, value = entry
+        if expires_at is not None and expires_at <= time.monotonic():
+            self._remove(key)
+            self.expirations += 1
+            self.misses += 1
+            return None
+        self.entries.move_to_end(key)
+        self.hits += 1
+        return value
+
+    def put(self, key: Hashable, value: Any, size: int = 0, ttl_seconds: Optional[float] = None):
+        if not self.enabled:
+            return
+        if self.max_bytes is not None and size > self.max_bytes:
+            # Would evict everything else and still not fit
+            self._remove(key)
+            return
+        ttl_seconds = ttl_seconds or self.ttl_seconds
+        expires_at = time.monotonic() + ttl_seconds if ttl_seconds else None
+        self._remove(key)
+        self.entries[key] = (expires_at, size, value)
+        self.total_bytes += size
+        while len(self.entries) > self.max_entries or (
+                self.max_bytes is not None and self.total_bytes > self.max_bytes):
+            _, (_, evicted_size, _) = self.entries.popitem(last=False)
+            self.total_bytes -= evicted_size
+            self.evictions += 1
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        """get() for async callers; SharedLRUCache also looks in its store"""
+        return self.get(key)
+
+    async def aput(self, key: Hashable, value: Any, size: int = 0, ttl_seconds: Optional[float] = None):
+        """put() for async callers; SharedLRUCache also writes to its store"""
+        self.put(key, value, size, ttl_seconds)
+
+    def _remove(self, key: Hashable):
+        entry = self.entries.pop(key, None)
+        if entry is not None:
+            self.total_bytes -= entry[1]
+
+    def purge(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Drop every entry whose key matches predicate (all entries if None)"""
+        if predicate is None:
+            purged = len(self.entries)
+            self.entries.clear()
+            self.total_bytes = 0
+            return purged
+        keys = [key for key in self.entries if predicate(key)]
+        for key in keys:
+            self._remove(key)
+        return len(keys)
+
+    def purge_group(self, group: Hashable) -> int:
+        """Drop every entry whose key tuple starts with group"""
+        return self.purge(lambda key: key[0] == group)
+    
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "size": len(self.entries),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            "evictions": self.evictions,
+            "expirations": self.expirations
+        }
+
+
+class SharedLRUCache(LRUCache):
+    """LRUCache whose entries are also kept in a SharedStore for other worker processes.
+
+    aget falls back to the store on an in-memory miss and aput writes
+    through to it, both in a thread so the event loop never waits on
+    SQLite; get and put only touch this process's copy. Entries over the
+    store's max_entry_bytes are not shared. Keys are tuples whose first
+    element is the group purged together (a connection id or a schema
+    version); purges reach the other processes' in-memory copies within
+    the store's sync interval.
+    """
+
+    def __init__(self, store: SharedStore, namespace: str, max_entries: int,
+                 ttl_seconds: Optional[float] = None, max_bytes: Optional[int] = None):
+        super().__init__(max_entries, ttl_seconds, max_bytes)
+        self.store = store
+        self.namespace = namespace
+        self.shared_hits = 0
+        store.subscribe(namespace, self._purge_local)
+
+    def _purge_local(self, group: Optional[str]):
+        if group is None:
+            super().purge()
+        else:
+            super().purge(lambda key: key[0] == group)
+
+    async def aget(self, key: Hashable) -> Optional[Any]:
+        await self.store.apoll()
+        value = self.get(key)
+        if value is not None or not self.enabled:
+            return value
+        entry = await asyncio.to_thread(self.store.get, self.namespace, key)
+        if entry is None:
+            return None
+        value, size, expires_at = entry
+        # Already counted as a miss by the in-memory lookup
+        self.misses -= 1
+        self.hits += 1
+        self.shared_hits += 1
+        self.put(key, value, size, ttl_seconds=expires_at - time.time() if expires_at else None)
+        return value
+
+    async def aput(self, key: Hashable, value: Any, size: int = 0, ttl_seconds: Optional[float] = None):
+        self.put(key, value, size, ttl_seconds)
+        if self.enabled and size <= self.store.max_entry_bytes and (
+                self.max_bytes is None or size <= self.max_bytes):
+            await asyncio.to_thread(self.store.put, self.namespace, key, value, key[0], size,
+                                    ttl_seconds or self.ttl_seconds)
+
+    def purge(self, predicate: Optional[Callable[[Hashable], bool]] = None) -> int:
+        """Drop matching entries here; a full purge also clears the store for every process"""
+        purged = super().purge(predicate)
+        if predicate is None:
+            run_off_loop(self.store.purge, self.namespace)
+        return purged
+
+    def purge_group(self, group: Hashable) -> int:
+        purged = super().purge(lambda key: key[0] == group)
+        run_off_loop(self.store.purge, self.namespace, group)
+        return purged
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "shared_hits": self.shared_hits}
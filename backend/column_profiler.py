@@ -0,0 +1,146 @@
+from collections import Counter
+from decimal import Decimal
+from functools import cached_property
+from itertools import compress, islice, repeat
+from operator import itemgetter
+from typing import Any, Dict, List, Optional
+
+# bool is an int subclass and counts as numeric, as it always has in the visualizer
+NUMERIC_TYPES = (int, float, Decimal)
+
+# Group sums use one C-level pass per key below this many distinct keys
+GROUP_SUM_SCAN_LIMIT = 64
+
+
+def _is_numeric_mask(values: List[Any]):
+    """Lazy per-value isinstance check that runs entirely in C"""
+    return map(isinstance, values, repeat(NUMERIC_TYPES))
+
+
+class ColumnProfile:
+    """Lazily computed facts about one result column.
+
+    Each property makes at most one pass over the column and caches its
+    answer, so the charts and the summary share the work. Passes are built
+    from map/compress/Counter so the per-row loop stays in C.
+    """
+
+    def __init__(self, name: str, values: List[Any], row_count: int):
+        self.name = name
+        self.values = values
+        self.row_count = row_count
+
+    @cached_property
+    def types(self) -> set:
+        """Distinct Python types in the column (one C-level pass)"""
+        return set(map(type, self.values))
+
+    @cached_property
+    def is_numeric(self) -> bool:
+        return any(issubclass(t, NUMERIC_TYPES) for t in self.types)
+
+    @cached_property
+    def looks_numeric(self) -> bool:
+        """Summary statistics only cover columns with a non-zero number in the first rows"""
+        return any(v and isinstance(v, NUMERIC_TYPES) for v in islice(self.values, 5))
+
+    @cached_property
+    def is_categorical(self) -> bool:
+        """Few distinct values in the first rows relative to the row count"""
+        sample = {str(v) for v in islice(self.values, 10) if v is not None}
+        return self.row_count > 0 and len(sample) < self.row_count / 2
+
+    @cached_property
+    def numbers(self) -> List[Any]:
+        """Numeric values in row order; Decimals (e.g. PostgreSQL numeric) become floats"""
+        types = self.types
+        if all(issubclass(t, NUMERIC_TYPES) for t in types):
+            numbers = self.values
+        else:
+            numbers = list(compress(self.values, _is_numeric_mask(self.values)))
+        if any(issubclass(t, Decimal) for t in types):
+            numbers = list(map(float, numbers))
+        return numbers
+
+    @cached_property
+    def aligned_numbers(self) -> List[Any]:
+        """Row-aligned numbers with anything non-numeric as 0"""
+        if len(self.numbers) == self.row_count:
+            return self.numbers
+        return [float(v) if isinstance(v, Decimal) else v if isinstance(v, NUMERIC_TYPES) else 0
+                for v in self.values]
+
+    @cached_property
+    def labels(self) -> List[str]:
+        """String form of every value, as used for chart labels"""
+        return list(map(str, self.values))
+
+    @cached_property
+    def value_counts(self) -> Dict[str, int]:
+        """Occurrences of each label, in first-seen order"""
+        return Counter(self.labels)
+
+    def summary(self) -> Optional[Dict[str, Any]]:
+        """count/min/max/avg for columns that look numeric"""
+        if not self.looks_numeric:
+            return None
+        numbers = self.numbers
+        if not numbers:
+            return None
+        return {
+            "column": self.name,
+            "count": len(numbers),
+            "min": min(numbers),
+            "max": max(numbers),
+            "avg": sum(numbers) / len(numbers)
+        }
+
+
+class ResultProfile:
+    """Column-wise view of a query result, transposed once"""
+
+    def __init__(self, results: Dict[str, Any]):
+        self.column_names: List[str] = results.get("columns", [])
+        rows = results.get("rows", [])
+        self.row_count = len(rows)
+
+        if results.get("format") == "columnar":
+            column_values = [list(map(itemgetter(i), rows)) for i in range(len(self.column_names))]
+        else:
+            column_values = [self._dict_column(rows, col) for col in self.column_names]
+
+        self.columns = [
+            ColumnProfile(name, values, self.row_count)
+            for name, values in zip(self.column_names, column_values)
+        ]
+
+    @staticmethod
+    def _dict_column(rows: List[Dict[str, Any]], col: str) -> List[Any]:
+        try:
+            return list(map(itemgetter(col), rows))
+        except KeyError:
+            # Ragged rows - fall back to treating missing keys as NULL
+            return [row.get(col) for row in rows]
+
+    def categorical(self) -> List[ColumnProfile]:
+        return [column for column in self.columns if column.is_categorical]
+
+    def numeric(self) -> List[ColumnProfile]:
+        return [column for column in self.columns if column.is_numeric]
+
+    def group_sum(self, key: ColumnProfile, value: ColumnProfile) -> Dict[str, Any]:
+        """SUM(value) GROUP BY label(key), in first-seen key order"""
+        labels = key.labels
+        numbers = value.aligned_numbers
+        distinct = key.value_counts
+        if len(distinct) <= GROUP_SUM_SCAN_LIMIT:
+            # A few C-level masked sums beat one interpreted loop over every row
+            return {
+                label: sum(compress(numbers, map(label.__eq__, labels)))
+                for label in distinct
+            }
+        sums: Dict[str, Any] = {}
+        get = sums.get
+        for label, number in zip(labels, numbers):
+            sums[label] = get(label, 0) + number
+        return sums
@@ -0,0 +1,190 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from cryptography.fernet import Fernet, InvalidToken, MultiFernet
+
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+REGISTRY_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS connections (
+        connection_id TEXT PRIMARY KEY,
+        settings TEXT NOT NULL,
+        password BLOB NOT NULL,
+        created_at REAL NOT NULL,
+        use_count INTEGER NOT NULL DEFAULT 0,
+        last_used_at REAL
+    )
+"""
+
+
+class ConnectionRegistry:
+    """Where connection settings live between restarts.
+
+    The base class keeps nothing, so connections only exist in the memory
+    of the process that added them; subclasses persist them.
+    """
+
+    persistent = False
+
+    def load(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        """Settings of one connection, password decrypted, or None"""
+        return None
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        """Every registered connection, oldest first"""
+        return {}
+
+    def connection_ids(self) -> List[str]:
+        return []
+
+    def save(self, connection_id: str, settings: Dict[str, Any]):
+        pass
+
+    def delete(self, connection_id: str):
+        pass
+
+    def record_usage(self, counts: Dict[str, int]):
+        """Add query counts gathered since the last call"""
+
+    def most_used(self, limit: int) -> List[str]:
+        """Connection ids by descending use, most recently used first on ties"""
+        return []
+
+    def close(self):
+        pass
+
+
+def load_fernet(key_spec: Optional[str], key_file: str) -> MultiFernet:
+    """Fernet keys from a comma-separated list (newest first), or a key file created on demand.
+
+    Extra keys in the list only decrypt, which allows rotating the key
+    without re-adding every connection.
+    """
+    if key_spec:
+        keys = [key.strip() for key in key_spec.split(",") if key.strip()]
+    else:
+        keys = [read_or_create_key(key_file, "CONNECTION_REGISTRY_KEY")]
+    return MultiFernet([Fernet(key) for key in keys])
+
+
+def read_or_create_key(key_file: str, setting: str) -> str:
+    """The key in key_file, generating it first if the file does not exist yet"""
+    if not os.path.exists(key_file):
+        # Write the key aside and link it into place, so concurrently starting
+        # workers agree on one key and never read a half-written file
+        temp_file = f"{key_file}.{os.getpid()}.tmp"
+        descriptor = os.open(temp_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(descriptor, "wb") as f:
+            f.write(Fernet.generate_key())
+        try:
+            os.link(temp_file, key_file)
+            logger.warning("Generated key file %s; back it up or set %s", key_file, setting)
+        except FileExistsError:
+            pass
+        finally:
+            os.unlink(temp_file)
+    with open(key_file, "rb") as f:
+        return f.read().strip().decode("ascii")
+
+
+class SQLiteConnectionRegistry(ConnectionRegistry):
+    """Connections stored in a local SQLite file shared by every worker on the host.
+
+    Passwords are encrypted with Fernet; everything else is stored as JSON.
+    """
+
+    persistent = True
+
+    def __init__(self, path: str, fernet: MultiFernet):
+        self.path = path
+        self.fernet = fernet
+        # Called from the event loop and from worker threads, one at a time
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        # Readers in one worker never wait for another worker's write
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute(REGISTRY_SCHEMA)
+
+    def _decode(self, connection_id: str, settings: str, password: bytes) -> Optional[Dict[str, Any]]:
+        try:
+            return {**json.loads(settings), "password": self.fernet.decrypt(password).decode("utf-8")}
+        except InvalidToken:
+            logger.warning("Cannot decrypt the password of %s with the configured key; skipping it",
+                           connection_id)
+            return None
+
+    def load(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT settings, password FROM connections WHERE connection_id = ?", (connection_id,)
+            ).fetchone()
+        return self._decode(connection_id, *row) if row else None
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT connection_id, settings, password FROM connections ORDER BY created_at"
+            ).fetchall()
+        connections = {}
+        for connection_id, settings, password in rows:
+            info = self._decode(connection_id, settings, password)
+            if info is not None:
+                connections[connection_id] = info
+        return connections
+
+    def connection_ids(self) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute("SELECT connection_id FROM connections ORDER BY created_at").fetchall()
+        return [row[0] for row in rows]
+
+    def save(self, connection_id: str, settings: Dict[str, Any]):
+        public = {key: value for key, value in settings.items() if key != "password"}
+        password = self.fernet.encrypt(settings.get("password", "").encode("utf-8"))
+        with self._lock:
+            self._conn.execute(
+                """INSERT INTO connections (connection_id, settings, password, created_at)
+                   VALUES (?, ?, ?, ?)
+                   ON CONFLICT (connection_id) DO UPDATE SET settings = excluded.settings,
+                                                            password = excluded.password""",
+                (connection_id, json.dumps(public), password, time.time())
+            )
+
+    def delete(self, connection_id: str):
+        with self._lock:
+            self._conn.execute("DELETE FROM connections WHERE connection_id = ?", (connection_id,))
+
+    def record_usage(self, counts: Dict[str, int]):
+        if not counts:
+            return
+        now = time.time()
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                self._conn.executemany(
+                    "UPDATE connections SET use_count = use_count + ?, last_used_at = ? WHERE connection_id = ?",
+                    [(count, now, connection_id) for connection_id, count in counts.items()]
+                )
+                self._conn.execute("COMMIT")
+            except Exception:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def most_used(self, limit: int) -> List[str]:
+        with self._lock:
+            rows = self._conn.execute(
+                """SELECT connection_id FROM connections
+                   ORDER BY use_count DESC, last_used_at DESC LIMIT ?""",
+                (limit,)
+            ).fetchall()
+        return [row[0] for row in rows]
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
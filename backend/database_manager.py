@@ -1,47 +1,342 @@
+import asyncio
+import os
+import re
 import asyncpg
 import pymysql
 import sqlite3
-from typing import Dict, List, Any, Optional
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Any, Optional, Tuple
 import json
-from datetime import datetime
+import time
+import warnings
+from datetime import date, datetime, time as time_of_day
+from cache import LRUCache, SharedLRUCache
+from connection_registry import ConnectionRegistry, SQLiteConnectionRegistry, load_fernet
+from metrics import POOL_ACQUIRE_SECONDS
+from pagination import InvalidCursor, create_cursor_codec, plan_keyset, query_fingerprint
+from result_cache import estimate_result_bytes, is_cacheable_query, normalize_sql
+from schema_cache import SchemaCache
+from shared_store import SharedStore
+from structured_logging import get_logger
+from threaded_pool import MySQLThreadPool, PoolTimeout, SQLiteThreadPool, ThreadedConnectionPool
+
+logger = get_logger(__name__)
+
+
+# Connections persist in this SQLite file, shared by every worker on the host;
+# by default they are kept in this process's memory only
+CONNECTION_REGISTRY_PATH = os.getenv("CONNECTION_REGISTRY_PATH", "")
+# Comma-separated Fernet keys for stored passwords, newest first; when unset a
+# key file is generated next to the registry, which then decrypts it on its own
+CONNECTION_REGISTRY_KEY = os.getenv("CONNECTION_REGISTRY_KEY", "")
+# Pools and schemas of this many most-used connections are opened in the background at startup
+REGISTRY_PREWARM_POOLS = int(os.getenv("REGISTRY_PREWARM_POOLS", "5"))
+
+# Pool sizing and recycling, overridable per connection via add_connection()
+POOL_MIN_SIZE = int(os.getenv("DB_POOL_MIN_SIZE", "1"))
+POOL_MAX_SIZE = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+# Idle connections above min_size are closed after this many seconds
+POOL_MAX_IDLE_SECONDS = float(os.getenv("DB_POOL_MAX_IDLE_SECONDS", "300"))
+# Connections are recycled after serving this many queries
+POOL_MAX_QUERIES = int(os.getenv("DB_POOL_MAX_QUERIES", "50000"))
+POOL_CONNECT_TIMEOUT = float(os.getenv("DB_POOL_CONNECT_TIMEOUT", "30"))  # Increased for Azure
+POOL_HEALTH_CHECK_SECONDS = float(os.getenv("DB_POOL_HEALTH_CHECK_SECONDS", "30"))
+
+# SQLite files are opened through file: URIs; read-only mode also skips the WAL switch
+SQLITE_READ_ONLY = os.getenv("SQLITE_READ_ONLY", "0") == "1"
+SQLITE_WAL = os.getenv("SQLITE_WAL", "1") == "1"
+SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", str(256 * 1024 * 1024)))
+
+# Prepared statements kept per connection, keyed by SQL text. Generated SQL takes its
+# values as parameters, so repeated question shapes skip parsing and planning
+STATEMENT_CACHE_SIZE = int(os.getenv("DB_STATEMENT_CACHE_SIZE", "256"))
+
+# Rows fetched per server-side cursor round trip when streaming results
+STREAM_BATCH_SIZE = int(os.getenv("STREAM_BATCH_SIZE", "500"))
+
+# Statement timeout and row cap for /api/chat queries; connections may override them
+# and requests may only tighten them (0 = unlimited)
+QUERY_TIMEOUT_SECONDS = float(os.getenv("QUERY_TIMEOUT_SECONDS", "30"))
+QUERY_MAX_ROWS = int(os.getenv("QUERY_MAX_ROWS", "100000"))
+# Server-side timeouts fire first; the client-side one only catches a hung connection
+CLIENT_TIMEOUT_GRACE_SECONDS = 2
+# SQLite checks its deadline every this many virtual machine instructions
+SQLITE_PROGRESS_STEPS = 10000
+
+# Rows per page when a paginated request does not say (never more than the row cap)
+DEFAULT_PAGE_SIZE = int(os.getenv("DEFAULT_PAGE_SIZE", "100"))
+
+# Introspected schemas are reused for this long before being revalidated
+SCHEMA_CACHE_TTL_SECONDS = float(os.getenv("SCHEMA_CACHE_TTL_SECONDS", "300"))
+# On expiry, compare a cheap catalog fingerprint and only rebuild when DDL changed
+SCHEMA_CACHE_CHECK_FINGERPRINT = os.getenv("SCHEMA_CACHE_CHECK_FINGERPRINT", "1") == "1"
+
+# Opt-in cache of read-only query results; connections default to this TTL (0 = off)
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "0"))
+RESULT_CACHE_MAX_BYTES = int(os.getenv("RESULT_CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+RESULT_CACHE_MAX_ENTRIES = int(os.getenv("RESULT_CACHE_MAX_ENTRIES", "1000"))
+
+# One round trip returns every column, key and index in the public schema as
+# (kind, table, name, detail, nullable, position, ref_table, ref_column) rows
+POSTGRES_SCHEMA_QUERY = """
+    SELECT 'column' AS kind, c.table_name::text, c.column_name::text, c.data_type::text,
+           c.is_nullable::text, c.ordinal_position::int, NULL::text, NULL::text
+    FROM information_schema.columns c
+    JOIN information_schema.tables t
+      ON t.table_schema = c.table_schema AND t.table_name = c.table_name
+    WHERE c.table_schema = 'public'
+    UNION ALL
+    SELECT CASE con.contype WHEN 'p' THEN 'primary_key' ELSE 'foreign_key' END,
+           cls.relname::text, att.attname::text, con.conname::text,
+           NULL, k.ord::int, fcls.relname::text, fatt.attname::text
+    FROM pg_catalog.pg_constraint con
+    JOIN pg_catalog.pg_class cls ON cls.oid = con.conrelid
+    JOIN pg_catalog.pg_namespace ns ON ns.oid = cls.relnamespace
+    CROSS JOIN LATERAL unnest(con.conkey, con.confkey) WITH ORDINALITY AS k(attnum, fattnum, ord)
+    JOIN pg_catalog.pg_attribute att ON att.attrelid = con.conrelid AND att.attnum = k.attnum
+    LEFT JOIN pg_catalog.pg_class fcls ON fcls.oid = con.confrelid
+    LEFT JOIN pg_catalog.pg_attribute fatt ON fatt.attrelid = con.confrelid AND fatt.attnum = k.fattnum
+    WHERE ns.nspname = 'public' AND con.contype IN ('p', 'f')
+    UNION ALL
+    SELECT 'index', tcls.relname::text, att.attname::text, icls.relname::text,
+           CASE WHEN ix.indisunique THEN 'unique' END, k.ord::int, NULL, NULL
+    FROM pg_catalog.pg_index ix
+    JOIN pg_catalog.pg_class icls ON icls.oid = ix.indexrelid
+    JOIN pg_catalog.pg_class tcls ON tcls.oid = ix.indrelid
+    JOIN pg_catalog.pg_namespace ns ON ns.oid = tcls.relnamespace
+    CROSS JOIN LATERAL unnest(ix.indkey::int2[]) WITH ORDINALITY AS k(attnum, ord)
+    JOIN pg_catalog.pg_attribute att ON att.attrelid = ix.indrelid AND att.attnum = k.attnum
+    WHERE ns.nspname = 'public'
+"""
+
+MYSQL_SCHEMA_QUERY = """
+    SELECT 'column' AS kind, c.TABLE_NAME, c.COLUMN_NAME, c.COLUMN_TYPE,
+           c.IS_NULLABLE, c.ORDINAL_POSITION, NULL, NULL
+    FROM information_schema.columns c
+    WHERE c.TABLE_SCHEMA = DATABASE()
+    UNION ALL
+    SELECT CASE WHEN k.CONSTRAINT_NAME = 'PRIMARY' THEN 'primary_key' ELSE 'foreign_key' END,
+           k.TABLE_NAME, k.COLUMN_NAME, k.CONSTRAINT_NAME,
+           NULL, k.ORDINAL_POSITION, k.REFERENCED_TABLE_NAME, k.REFERENCED_COLUMN_NAME
+    FROM information_schema.key_column_usage k
+    WHERE k.TABLE_SCHEMA = DATABASE()
+      AND (k.CONSTRAINT_NAME = 'PRIMARY' OR k.REFERENCED_TABLE_NAME IS NOT NULL)
+    UNION ALL
+    SELECT 'index', s.TABLE_NAME, s.COLUMN_NAME, s.INDEX_NAME,
+           CASE WHEN s.NON_UNIQUE = 0 THEN 'unique' END, s.SEQ_IN_INDEX, NULL, NULL
+    FROM information_schema.statistics s
+    WHERE s.TABLE_SCHEMA = DATABASE()
+"""
+
+SQLITE_SCHEMA_QUERY = """
+    SELECT 'column' AS kind, m.name, p.name, p.type,
+           CASE WHEN p."notnull" THEN 'NO' ELSE 'YES' END, p.cid + 1, NULL, NULL
+    FROM sqlite_master m JOIN pragma_table_info(m.name) p
+    WHERE m.type IN ('table', 'view') AND m.name NOT LIKE 'sqlite_%'
+    UNION ALL
+    SELECT 'primary_key', m.name, p.name, NULL, NULL, p.pk, NULL, NULL
+    FROM sqlite_master m JOIN pragma_table_info(m.name) p
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%' AND p.pk > 0
+    UNION ALL
+    SELECT 'foreign_key', m.name, f."from", NULL, NULL, f.seq + 1, f."table", f."to"
+    FROM sqlite_master m JOIN pragma_foreign_key_list(m.name) f
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+    UNION ALL
+    SELECT 'index', m.name, ii.name, il.name,
+           CASE WHEN il."unique" THEN 'unique' END, ii.seqno + 1, NULL, NULL
+    FROM sqlite_master m
+    JOIN pragma_index_list(m.name) il
+    JOIN pragma_index_info(il.name) ii
+    WHERE m.type = 'table' AND m.name NOT LIKE 'sqlite_%'
+"""
+
+# A trailing LIMIT no larger than the row cap makes the cursor-based cap unnecessary
+TRAILING_LIMIT = re.compile(r"\blimit\s+(\d+)\s*;?\s*$", re.IGNORECASE)
+ROW_RETURNING_START = re.compile(r"^\s*(select|with|values|table)\b", re.IGNORECASE)
+
+# Generated SQL uses PostgreSQL's $n placeholders and ILIKE
+PLACEHOLDER = re.compile(r"\$(\d+)")
+ILIKE = re.compile(r"\bilike\b", re.IGNORECASE)
+
+# Error fragments that mean the pooled connection is gone, not that the query is bad
+CONNECTION_LOST_ERRORS = ["closed", "reset", "terminated", "connection was closed"]
+
+
+def create_registry() -> ConnectionRegistry:
+    """The connection registry selected by CONNECTION_REGISTRY_PATH"""
+    if not CONNECTION_REGISTRY_PATH:
+        return ConnectionRegistry()
+    fernet = load_fernet(CONNECTION_REGISTRY_KEY, f"{CONNECTION_REGISTRY_PATH}.key")
+    return SQLiteConnectionRegistry(CONNECTION_REGISTRY_PATH, fernet)
+
+
+def tightest_limit(*limits):
+    """Smallest of the given limits, ignoring unset (None, 0 or negative) ones"""
+    return min((limit for limit in limits if limit is not None and limit > 0), default=None)
+
+
+def timeout_message(timeout: Optional[float]) -> str:
+    """Error text for a statement that ran out of time"""
+    return f"timed out after {timeout:g} seconds" if timeout else "timed out"
+
+
+@asynccontextmanager
+async def pg_connection(pool: asyncpg.Pool):
+    """A pooled PostgreSQL connection; failing to open one in time raises PoolTimeout"""
+    try:
+        conn = await pool.acquire()
+    except asyncio.TimeoutError:
+        raise PoolTimeout(f"could not connect to the database within {POOL_CONNECT_TIMEOUT:g} seconds")
+    try:
+        yield conn
+    finally:
+        await pool.release(conn)
+
+
+def to_dialect(query: str, params: Optional[List[Any]], db_type: str) -> Tuple[str, Optional[List[Any]]]:
+    """Rewrite generated SQL and its parameters for a driver's placeholder style.
+    
+    SQLite takes numbered ?n placeholders; PyMySQL interpolates %s in order,
+    so literal percent signs are doubled. Both lack ILIKE, but their LIKE is
+    already case-insensitive (for ASCII in SQLite, by default collation in MySQL).
+    """
+    if db_type == "postgresql":
+        return query, params
+    query = ILIKE.sub("LIKE", query)
+    if not params:
+        return query, None
+    if db_type == "sqlite":
+        return PLACEHOLDER.sub(r"?\1", query), [sqlite_value(value) for value in params]
+    if db_type == "mysql":
+        order = [int(position) - 1 for position in PLACEHOLDER.findall(query)]
+        return PLACEHOLDER.sub("%s", query.replace("%", "%%")), [params[i] for i in order]
+    return query, params
+
+
+def sqlite_value(value: Any) -> Any:
+    """A parameter as SQLite stores it: dates and times as ISO 8601 text (sqlite3's
+    own date adapters are deprecated)"""
+    if isinstance(value, datetime):
+        return value.isoformat(" ")
+    if isinstance(value, (date, time_of_day)):
+        return value.isoformat()
+    return value
+
+
+def needs_row_cap(query: str, max_rows: Optional[int]) -> bool:
+    """Whether a query could return more than max_rows rows"""
+    if not max_rows or not ROW_RETURNING_START.match(query):
+        return False
+    limit = TRAILING_LIMIT.search(query)
+    return limit is None or int(limit.group(1)) > max_rows
 
 
 class DatabaseManager:
-    def __init__(self):
+    def __init__(self, registry: Optional[ConnectionRegistry] = None,
+                 shared_store: Optional[SharedStore] = None):
+        # Connections are read from the registry on first use and kept here
+        self.registry = registry if registry is not None else create_registry()
         self.connections: Dict[str, dict] = {}
-        self.active_connections: Dict[str, Any] = {}
+        # Whether self.connections has been filled from the registry yet
+        self._registry_loaded = False
+        # Queries per connection since the counts were last written to the registry
+        self._use_counts: Dict[str, int] = {}
+        # asyncpg.Pool for PostgreSQL, ThreadedConnectionPool for blocking drivers
+        self.pools: Dict[str, Any] = {}
+        self._pool_locks: Dict[str, asyncio.Lock] = {}
+        # With a shared store, schemas and results are reused across worker processes
+        self.schema_cache = SchemaCache(ttl_seconds=SCHEMA_CACHE_TTL_SECONDS, store=shared_store)
+        self._schema_locks: Dict[str, asyncio.Lock] = {}
+        # (connection_id, normalized SQL, parameters, columnar, max_rows) -> results
+        if shared_store is not None:
+            self.result_cache = SharedLRUCache(shared_store, "results", RESULT_CACHE_MAX_ENTRIES,
+                                               max_bytes=RESULT_CACHE_MAX_BYTES)
+        else:
+            self.result_cache = LRUCache(RESULT_CACHE_MAX_ENTRIES, max_bytes=RESULT_CACHE_MAX_BYTES)
+        self.schema_cache.listeners.append(self._on_schema_change)
+        # Signs page cursors; the key file is shared by the workers like the registry
+        self.cursor_codec = create_cursor_codec(
+            f"{CONNECTION_REGISTRY_PATH}.cursor.key" if CONNECTION_REGISTRY_PATH else None
+        )
     
-    def add_connection(self, name: str, host: str, port: int, username: str, 
-                      password: str, database: str, db_type: str = "postgresql") -> str:
-        """Add a database connection"""
+    async def add_connection(self, name: str, host: str, port: int, username: str, 
+                      password: str, database: str, db_type: str = "postgresql",
+                      pool_min_size: Optional[int] = None,
+                      pool_max_size: Optional[int] = None,
+                      result_cache_ttl: Optional[float] = None,
+                      statement_timeout: Optional[float] = None,
+                      max_rows: Optional[int] = None,
+                      allow_unbounded_stream: bool = False) -> str:
+        """Add a database connection (stored in the registry off the event loop)"""
         connection_id = f"{db_type}_{name}_{datetime.now().timestamp()}"
         
-        self.connections[connection_id] = {
+        conn_info = {
             "name": name,
             "host": host,
             "port": port,
             "username": username,
             "password": password,
             "database": database,
-            "db_type": db_type
+            "db_type": db_type,
+            "pool_min_size": pool_min_size if pool_min_size is not None else POOL_MIN_SIZE,
+            "pool_max_size": pool_max_size if pool_max_size is not None else POOL_MAX_SIZE,
+            "result_cache_ttl": result_cache_ttl if result_cache_ttl is not None else RESULT_CACHE_TTL,
+            "statement_timeout": statement_timeout if statement_timeout is not None else QUERY_TIMEOUT_SECONDS,
+            "max_rows": max_rows if max_rows is not None else QUERY_MAX_ROWS,
+            # Whether streams may ask to lift max_rows, e.g. for exports
+            "allow_unbounded_stream": allow_unbounded_stream
         }
+        await asyncio.to_thread(self.registry.save, connection_id, conn_info)
+        self.connections[connection_id] = conn_info
         
         return connection_id
     
-    def remove_connection(self, connection_id: str):
+    async def get_connection_info(self, connection_id: str) -> Optional[dict]:
+        """Settings of a connection, loaded from the registry the first time it is used"""
+        conn_info = self.connections.get(connection_id)
+        if conn_info is None and self.registry.persistent:
+            # Possibly added by another worker or before a restart
+            conn_info = await asyncio.to_thread(self.registry.load, connection_id)
+            if conn_info is not None:
+                self.connections[connection_id] = conn_info
+        return conn_info
+    
+    async def get_connection(self, connection_id: str):
+        """Deprecated: returns the connection's pool, which hands out connections.
+        
+        Use get_connection_info for a connection's settings, or execute_query.
+        """
+        warnings.warn("DatabaseManager.get_connection is deprecated; use get_pool or get_connection_info",
+                      DeprecationWarning, stacklevel=2)
+        if await self.get_connection_info(connection_id) is None:
+            raise ValueError(f"Connection {connection_id} not found")
+        return await self.get_pool(connection_id)
+    
+    async def remove_connection(self, connection_id: str):
         """Remove a database connection"""
-        if connection_id not in self.connections:
+        if await self.get_connection_info(connection_id) is None:
             raise ValueError(f"Connection {connection_id} not found")
         
-        # Close active connection if exists
-        if connection_id in self.active_connections:
-            # Close connection based on type
-            del self.active_connections[connection_id]
-        
-        del self.connections[connection_id]
+        await asyncio.to_thread(self.registry.delete, connection_id)
+        await self._forget_connection(connection_id)
     
-    def list_connections(self) -> Dict[str, dict]:
-        """List all database connections (without passwords)"""
+    async def _forget_connection(self, connection_id: str):
+        """Drop a connection's pool, caches and settings from this process"""
+        await self.close_pool(connection_id)
+        self.purge_result_cache(connection_id)
+        self.schema_cache.invalidate(connection_id)
+        self._schema_locks.pop(connection_id, None)
+        self._use_counts.pop(connection_id, None)
+        self.connections.pop(connection_id, None)
+    
+    async def list_connections(self, refresh: bool = False) -> Dict[str, dict]:
+        """List all database connections (without passwords).
+        
+        The registry is read the first time (or with refresh); connections
+        other workers add or remove show up after the next sync_registry.
+        """
+        if self.registry.persistent and (refresh or not self._registry_loaded):
+            await self.sync_registry()
         return {
             conn_id: {
                 **conn,
@@ -50,85 +345,380 @@ class DatabaseManager:
             for conn_id, conn in self.connections.items()
         }
     
-    def has_connection(self, connection_id: str) -> bool:
+    async def has_connection(self, connection_id: str) -> bool:
         """Check if connection exists"""
-        return connection_id in self.connections
+        return await self.get_connection_info(connection_id) is not None
     
-    async def get_connection(self, connection_id: str):
-        """Get or create database connection"""
-        if connection_id not in self.connections:
+    async def get_pool(self, connection_id: str):
+        """Get or create the connection pool for a connection"""
+        if await self.get_connection_info(connection_id) is None:
             raise ValueError(f"Connection {connection_id} not found")
         
-        conn_info = self.connections[connection_id]
+        pool = self.pools.get(connection_id)
+        if pool is not None and not pool.is_closing():
+            return pool
         
-        # Return existing connection if available
-        if connection_id in self.active_connections:
-            existing = self.active_connections[connection_id]
+        # Only one coroutine creates the pool; the rest wait and reuse it
+        lock = self._pool_locks.setdefault(connection_id, asyncio.Lock())
+        async with lock:
+            pool = self.pools.get(connection_id)
+            if pool is not None and not pool.is_closing():
+                return pool
+            
+            conn_info = self.connections[connection_id]
             db_type = conn_info["db_type"]
-            # Reopen if the connection was closed/idled out
+            if db_type == "postgresql":
+                # The connection's timeout is the session default; requests tighten it with SET LOCAL
+                server_settings = {}
+                if conn_info.get("statement_timeout"):
+                    server_settings["statement_timeout"] = str(int(conn_info["statement_timeout"] * 1000))
+                create_pool = asyncpg.create_pool(
+                    host=conn_info["host"],
+                    port=conn_info["port"],
+                    user=conn_info["username"],
+                    password=conn_info["password"],
+                    database=conn_info["database"],
+                    min_size=conn_info.get("pool_min_size", POOL_MIN_SIZE),
+                    max_size=conn_info.get("pool_max_size", POOL_MAX_SIZE),
+                    max_queries=POOL_MAX_QUERIES,
+                    max_inactive_connection_lifetime=POOL_MAX_IDLE_SECONDS,
+                    timeout=POOL_CONNECT_TIMEOUT,
+                    statement_cache_size=STATEMENT_CACHE_SIZE,
+                    server_settings=server_settings
+                )
+                try:
+                    pool = await create_pool
+                except asyncio.TimeoutError:
+                    raise PoolTimeout(f"could not connect to the database within {POOL_CONNECT_TIMEOUT:g} seconds")
+            elif db_type == "mysql":
+                # PyMySQL is blocking, so queries run on a bounded executor
+                pool = MySQLThreadPool(
+                    conn_info,
+                    max_size=conn_info.get("pool_max_size", POOL_MAX_SIZE),
+                    max_idle_seconds=POOL_MAX_IDLE_SECONDS,
+                    connect_timeout=POOL_CONNECT_TIMEOUT
+                )
+            elif db_type == "sqlite":
+                pool = SQLiteThreadPool(
+                    conn_info["database"],
+                    max_size=conn_info.get("pool_max_size", POOL_MAX_SIZE),
+                    max_idle_seconds=POOL_MAX_IDLE_SECONDS,
+                    read_only=SQLITE_READ_ONLY,
+                    wal=SQLITE_WAL,
+                    mmap_size=SQLITE_MMAP_SIZE,
+                    cached_statements=STATEMENT_CACHE_SIZE
+                )
+            else:
+                raise ValueError(f"Pooling is not supported for database type: {db_type}")
+            if isinstance(pool, ThreadedConnectionPool):
+                pool.on_acquire = lambda seconds: POOL_ACQUIRE_SECONDS.observe(seconds, db_type=db_type)
+            self.pools[connection_id] = pool
+            return pool
+    
+    async def close_pool(self, connection_id: str):
+        """Close the pool for a connection, waiting for in-flight queries"""
+        pool = self.pools.pop(connection_id, None)
+        self._pool_locks.pop(connection_id, None)
+        if pool is None:
+            return
+        try:
+            await asyncio.wait_for(pool.close(), timeout=POOL_CONNECT_TIMEOUT)
+        except Exception:
+            # Graceful close timed out or failed - drop the connections
+            pool.terminate()
+    
+    async def close_all(self):
+        """Close every pool (called on application shutdown)"""
+        try:
+            await self.flush_usage()
+        except Exception as e:
+            logger.warning("Could not record connection usage: %s", e)
+        await asyncio.gather(
+            *(self.close_pool(connection_id) for connection_id in list(self.pools)),
+            return_exceptions=True
+        )
+    
+    async def check_pools(self):
+        """Ping every pool and drop the ones whose server went away"""
+        for connection_id, pool in list(self.pools.items()):
             try:
-                if db_type == "postgresql":
-                    # asyncpg connection exposes .is_closed()
-                    if getattr(existing, "is_closed", lambda: False)():
-                        del self.active_connections[connection_id]
-                    else:
-                        return existing
-                elif db_type == "mysql":
-                    # PyMySQL: ping will raise if closed; reconnect=True to reopen
-                    try:
-                        existing.ping(reconnect=True)
-                        return existing
-                    except Exception:
-                        del self.active_connections[connection_id]
-                elif db_type == "sqlite":
-                    return existing
+                if isinstance(pool, ThreadedConnectionPool):
+                    await asyncio.wait_for(pool.ping(), timeout=POOL_CONNECT_TIMEOUT)
+                else:
+                    await pool.fetchval("SELECT 1", timeout=POOL_CONNECT_TIMEOUT)
             except Exception:
-                # Fallback to recreate connection
-                if connection_id in self.active_connections:
-                    del self.active_connections[connection_id]
+                # Recreated lazily by the next get_pool() call
+                if self.pools.get(connection_id) is pool:
+                    del self.pools[connection_id]
+                pool.terminate()
+    
+    async def run_health_checks(self, interval: float = POOL_HEALTH_CHECK_SECONDS):
+        """Periodically health-check pools and sync with the registry until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            await self.check_pools()
+            try:
+                await self.sync_registry()
+            except Exception as e:
+                logger.warning("Connection registry sync failed: %s", e)
+    
+    async def flush_usage(self):
+        """Write query counts gathered since the last flush to the registry"""
+        counts, self._use_counts = self._use_counts, {}
+        await asyncio.to_thread(self.registry.record_usage, counts)
+    
+    async def sync_registry(self):
+        """Record usage, pick up connections other workers added and forget the ones they removed"""
+        if not self.registry.persistent:
+            return
+        await self.flush_usage()
+        # Decrypting every stored password is done off the event loop
+        registered = await asyncio.to_thread(self.registry.load_all)
+        for connection_id in [cid for cid in self.connections if cid not in registered]:
+            await self._forget_connection(connection_id)
+        for connection_id, conn_info in registered.items():
+            self.connections.setdefault(connection_id, conn_info)
+        self._registry_loaded = True
+    
+    async def prewarm(self, limit: int = REGISTRY_PREWARM_POOLS):
+        """Open pools and load schemas for the most-used registered connections"""
+        if limit <= 0:
+            return
+        connection_ids = await asyncio.to_thread(self.registry.most_used, limit)
         
-        # Create new connection based on database type
-        db_type = conn_info["db_type"]
+        async def warm(connection_id: str):
+            try:
+                if await self.get_connection_info(connection_id) is None:
+                    return
+                await self.get_pool(connection_id)
+                await self.get_schema_info(connection_id)
+            except Exception as e:
+                logger.warning("Could not pre-warm %s: %s", connection_id, e)
         
-        if db_type == "postgresql":
-            # Close old connection if exists
-            if connection_id in self.active_connections:
-                try:
-                    await self.active_connections[connection_id].close()
-                except Exception:
-                    pass
-                del self.active_connections[connection_id]
-            
-            conn = await asyncpg.connect(
-                host=conn_info["host"],
-                port=conn_info["port"],
-                user=conn_info["username"],
-                password=conn_info["password"],
-                database=conn_info["database"],
-                timeout=30  # Increased for Azure
-            )
-            self.active_connections[connection_id] = conn
-            return conn
+        await asyncio.gather(*(warm(connection_id) for connection_id in connection_ids))
+        logger.info("Pre-warmed %d connection pools", len(connection_ids))
+    
+    def pool_stats(self) -> Dict[str, Dict[str, int]]:
+        """Current size and idle count of each pool"""
+        return {
+            connection_id: {
+                "size": pool.get_size(),
+                "idle": pool.get_idle_size(),
+                "min_size": pool.get_min_size(),
+                "max_size": pool.get_max_size()
+            }
+            for connection_id, pool in self.pools.items()
+        }
+    
+    async def _pg_fetch(self, connection_id: str, query: str, params: Optional[List[Any]] = None,
+                        max_rows: Optional[int] = None, timeout: Optional[float] = None,
+                        client_timeout: Optional[float] = None) -> List[asyncpg.Record]:
+        """Run a query on a pooled PostgreSQL connection, retrying once if the connection was lost.
         
-        elif db_type == "mysql":
-            # For MySQL, we'll use synchronous PyMySQL for now
-            # In production, use aiomysql
-            import pymysql
-            conn = pymysql.connect(
-                host=conn_info["host"],
-                port=conn_info["port"],
-                user=conn_info["username"],
-                password=conn_info["password"],
-                database=conn_info["database"]
-            )
-            return conn
+        With max_rows, at most max_rows + 1 rows are read through a cursor so
+        the caller can tell the result was cut short. A timeout tighter than
+        the connection's default is applied with SET LOCAL statement_timeout;
+        client_timeout bounds each round trip on our side.
+        """
+        default_timeout = self.connections[connection_id].get("statement_timeout")
+        local_timeout = timeout if timeout and timeout != default_timeout else None
+        capped = needs_row_cap(query, max_rows)
+        args = params or ()
         
-        elif db_type == "sqlite":
-            conn = sqlite3.connect(conn_info["database"])
-            return conn
+        async def fetch(conn):
+            if local_timeout is None and not capped:
+                return await conn.fetch(query, *args, timeout=client_timeout)
+            # SET LOCAL and cursors only live inside a transaction
+            async with conn.transaction():
+                if local_timeout is not None:
+                    await conn.execute(f"SET LOCAL statement_timeout = {int(local_timeout * 1000)}")
+                if not capped:
+                    return await conn.fetch(query, *args, timeout=client_timeout)
+                cursor = await conn.cursor(query, *args, timeout=client_timeout)
+                return await cursor.fetch(max_rows + 1, timeout=client_timeout)
         
+        started = time.perf_counter()
+        pool = await self.get_pool(connection_id)
+        try:
+            async with pg_connection(pool) as conn:
+                POOL_ACQUIRE_SECONDS.observe(time.perf_counter() - started, db_type="postgresql")
+                return await fetch(conn)
+        except Exception as e:
+            message = str(e).lower()
+            if not any(x in message for x in CONNECTION_LOST_ERRORS):
+                raise
+            # The server dropped our connections - rebuild the pool and retry once
+            await self.close_pool(connection_id)
+            pool = await self.get_pool(connection_id)
+            async with pg_connection(pool) as conn:
+                return await fetch(conn)
+    
+    @staticmethod
+    def _build_result(columns: List[str], rows, columnar: bool, max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Shape fetched rows into a result, flagging it when more than max_rows came back"""
+        truncated = bool(max_rows) and len(rows) > max_rows
+        if truncated:
+            rows = rows[:max_rows]
+        if columnar:
+            results = {
+                "format": "columnar",
+                "columns": columns,
+                "rows": [list(row) for row in rows],
+                "count": len(rows)
+            }
         else:
-            raise ValueError(f"Unsupported database type: {db_type}")
+            results = {
+                "columns": columns,
+                "rows": [dict(zip(columns, row)) for row in rows],
+                "count": len(rows)
+            }
+        if truncated:
+            results["truncated"] = True
+            results["max_rows"] = max_rows
+        return results
+    
+    @staticmethod
+    def _mysql_session_limits(conn, max_rows: Optional[int], timeout: Optional[float]):
+        """Enforce a row cap and timeout server-side through session variables.
+        
+        The variables stick to the connection, so the SET round trip is
+        skipped while the limits stay the same.
+        """
+        limits = (max_rows, timeout)
+        if getattr(conn, "query_limits", (None, None)) == limits:
+            return
+        select_limit = max_rows + 1 if max_rows else "DEFAULT"
+        with conn.cursor() as cursor:
+            if "mariadb" in conn.get_server_info().lower():
+                cursor.execute(f"SET SESSION sql_select_limit = {select_limit}, "
+                               f"max_statement_time = {float(timeout or 0)}")
+            else:
+                cursor.execute(f"SET SESSION sql_select_limit = {select_limit}, "
+                               f"max_execution_time = {int((timeout or 0) * 1000)}")
+        conn.query_limits = limits
+    
+    @staticmethod
+    def _dbapi_fetch(conn, query: str, params: Optional[List[Any]] = None, columnar: bool = False,
+                     max_rows: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run a query on a DB-API connection (called on a pool worker thread)"""
+        is_sqlite = isinstance(conn, sqlite3.Connection)
+        if not is_sqlite:
+            DatabaseManager._mysql_session_limits(conn, max_rows, timeout)
+        elif timeout:
+            # SQLite has no statement timeout; abort from its progress handler instead
+            deadline = time.monotonic() + timeout
+            conn.set_progress_handler(lambda: time.monotonic() > deadline, SQLITE_PROGRESS_STEPS)
+        cursor = conn.cursor()
+        try:
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            # One extra row tells a capped result from one that fits exactly
+            rows = cursor.fetchmany(max_rows + 1) if max_rows else cursor.fetchall()
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+        except sqlite3.OperationalError as e:
+            # The progress handler aborts with "interrupted"; report it like a server timeout
+            if timeout and time.monotonic() > deadline:
+                raise TimeoutError(timeout_message(timeout)) from e
+            raise
+        finally:
+            cursor.close()
+            if is_sqlite and timeout:
+                conn.set_progress_handler(None, 0)
+        return DatabaseManager._build_result(columns, rows, columnar, max_rows)
+    
+    @staticmethod
+    def _dbapi_stream(conn, emit, query: str, params: Optional[List[Any]], batch_size: int, unbuffered: bool,
+                      max_rows: Optional[int] = None, timeout: Optional[float] = None):
+        """Emit (columns, rows) batches from a DB-API cursor (called on a pool worker thread).
+        
+        At most max_rows + 1 rows are emitted. On SQLite the timeout bounds
+        each fetch, not the time spent waiting for the client to read.
+        """
+        is_sqlite = isinstance(conn, sqlite3.Connection)
+        deadline = [0.0]
+        if not is_sqlite:
+            DatabaseManager._mysql_session_limits(conn, max_rows, timeout)
+        elif timeout:
+            conn.set_progress_handler(lambda: time.monotonic() > deadline[0], SQLITE_PROGRESS_STEPS)
+        # PyMySQL's SSCursor reads rows off the socket as they are fetched
+        cursor = conn.cursor(pymysql.cursors.SSCursor) if unbuffered else conn.cursor()
+        remaining = max_rows + 1 if max_rows else None
+        try:
+            deadline[0] = time.monotonic() + (timeout or 0)
+            if params:
+                cursor.execute(query, params)
+            else:
+                cursor.execute(query)
+            columns = [desc[0] for desc in cursor.description] if cursor.description else []
+            emit((columns, []))
+            while remaining is None or remaining > 0:
+                deadline[0] = time.monotonic() + (timeout or 0)
+                rows = cursor.fetchmany(batch_size if remaining is None else min(batch_size, remaining))
+                if not rows:
+                    break
+                if remaining is not None:
+                    remaining -= len(rows)
+                emit((columns, [tuple(row) for row in rows]))
+        except sqlite3.OperationalError as e:
+            if timeout and time.monotonic() > deadline[0]:
+                raise TimeoutError(timeout_message(timeout)) from e
+            raise
+        finally:
+            cursor.close()
+            if is_sqlite and timeout:
+                conn.set_progress_handler(None, 0)
+    
+    @staticmethod
+    def _mysql_schema(conn) -> Dict[str, Any]:
+        """Introspect the schema on a PyMySQL connection (called on a pool worker thread)"""
+        DatabaseManager._mysql_session_limits(conn, None, None)
+        with conn.cursor() as cursor:
+            cursor.execute(MYSQL_SCHEMA_QUERY)
+            rows = cursor.fetchall()
+        return DatabaseManager._group_schema_rows(rows)
+    
+    @staticmethod
+    def _sqlite_schema(conn) -> Dict[str, Any]:
+        """Introspect the schema on a sqlite3 connection (called on a pool worker thread)"""
+        rows = conn.execute(SQLITE_SCHEMA_QUERY).fetchall()
+        return DatabaseManager._group_schema_rows(rows)
+    
+    @staticmethod
+    def _group_schema_rows(rows) -> Dict[str, Any]:
+        """Group catalog rows into {table: [{name, type, nullable, ...key metadata}]}"""
+        schema: Dict[str, List[Dict[str, Any]]] = {}
+        columns: Dict[tuple, Dict[str, Any]] = {}
+        # Columns first (in ordinal order) so key and index rows can attach to them
+        rows = sorted((tuple(row) for row in rows), key=lambda r: (r[0] != "column", r[1], r[5] or 0))
+        
+        for kind, table, name, detail, nullable, position, ref_table, ref_column in rows:
+            if kind == "column":
+                column = {
+                    "name": name,
+                    "type": detail,
+                    "nullable": nullable,
+                    "primary_key": False,
+                    "foreign_key": None,
+                    "indexes": []
+                }
+                schema.setdefault(table, []).append(column)
+                columns[(table, name)] = column
+                continue
+            
+            column = columns.get((table, name))
+            if column is None:
+                # Expression index or a relation outside the introspected set
+                continue
+            if kind == "primary_key":
+                column["primary_key"] = True
+            elif kind == "foreign_key":
+                column["foreign_key"] = {"table": ref_table, "column": ref_column}
+            elif kind == "index" and detail not in column["indexes"]:
+                column["indexes"].append(detail)
+        
+        return schema
     
     async def test_connection(self, host: str, port: int, username: str, 
                              password: str, database: str, db_type: str = "postgresql") -> tuple[bool, str]:
@@ -146,8 +736,9 @@ class DatabaseManager:
                 await conn.close()
                 return (True, "Connection successful")
             elif db_type == "mysql":
-                import pymysql
-                conn = pymysql.connect(
+                # Connect on a worker thread so the event loop keeps serving
+                conn = await asyncio.to_thread(
+                    pymysql.connect,
                     host=host,
                     port=port,
                     user=username,
@@ -158,7 +749,15 @@ class DatabaseManager:
                 conn.close()
                 return (True, "Connection successful")
             elif db_type == "sqlite":
-                # For SQLite, just check if file exists or can be created
+                # Opening the file creates it if missing; reading the header
+                # rejects files that are not SQLite databases
+                def check_sqlite():
+                    conn = sqlite3.connect(database)
+                    try:
+                        conn.execute("PRAGMA schema_version").fetchone()
+                    finally:
+                        conn.close()
+                await asyncio.to_thread(check_sqlite)
                 return (True, "Connection successful")
             return (False, "Unsupported database type")
         except asyncpg.exceptions.InvalidPasswordError as e:
@@ -189,146 +788,372 @@ class DatabaseManager:
             else:
                 return (False, f"Connection failed: {error_msg}")
     
-    async def get_schema_info(self, connection_id: str) -> Dict[str, Any]:
-        """Get database schema information"""
-        conn = None
-        try:
-            conn = await self.get_connection(connection_id)
-            conn_info = self.connections[connection_id]
-            db_type = conn_info["db_type"]
-            
-            if db_type == "postgresql":
-                # Get tables
-                tables_query = """
-                    SELECT table_name 
-                    FROM information_schema.tables 
-                    WHERE table_schema = 'public'
-                """
-                tables = await conn.fetch(tables_query)
-                table_names = [table['table_name'] for table in tables]
-                
-                # Get columns for each table
-                schema = {}
-                for table in table_names:
-                    columns_query = f"""
-                        SELECT column_name, data_type, is_nullable
-                        FROM information_schema.columns
-                        WHERE table_name = '{table}'
-                        ORDER BY ordinal_position
-                    """
-                    columns = await conn.fetch(columns_query)
-                    schema[table] = [
-                        {
-                            "name": col['column_name'],
-                            "type": col['data_type'],
-                            "nullable": col['is_nullable']
-                        }
-                        for col in columns
-                    ]
-                
-                # Close connection after use
-                if conn and connection_id in self.active_connections:
-                    await conn.close()
-                    del self.active_connections[connection_id]
-                
-                return schema
+    async def get_schema_info(self, connection_id: str, refresh: bool = False) -> Dict[str, Any]:
+        """Get database schema information, served from the schema cache when fresh"""
+        entry = await self.schema_cache.get(connection_id)
+        if not refresh and self.schema_cache.is_fresh(entry):
+            return entry["schema"]
+        
+        # Concurrent requests for a cold or expired schema share one rebuild
+        lock = self._schema_locks.setdefault(connection_id, asyncio.Lock())
+        async with lock:
+            entry = await self.schema_cache.get(connection_id)
+            if not refresh and self.schema_cache.is_fresh(entry):
+                return entry["schema"]
             
-            elif db_type == "mysql":
-                cursor = conn.cursor()
-                # Get tables
-                cursor.execute("SHOW TABLES")
-                tables = cursor.fetchall()
-                table_names = [table[0] for table in tables]
-                
-                # Get columns for each table
-                schema = {}
-                for table in table_names:
-                    cursor.execute(f"DESCRIBE {table}")
-                    columns = cursor.fetchall()
-                    schema[table] = [
-                        {
-                            "name": col[0],
-                            "type": col[1],
-                            "nullable": col[2]
-                        }
-                        for col in columns
-                    ]
+            try:
+                fingerprint = None
+                if SCHEMA_CACHE_CHECK_FINGERPRINT:
+                    fingerprint = await self._schema_fingerprint(connection_id)
+                    if (not refresh and entry is not None and fingerprint is not None
+                            and fingerprint == entry["fingerprint"]):
+                        # DDL unchanged since the last build - keep the cached schema
+                        self.schema_cache.touch(connection_id)
+                        return entry["schema"]
                 
+                schema = await self._load_schema(connection_id)
+                await self.schema_cache.put(connection_id, schema, fingerprint)
                 return schema
-            
-            else:
-                return {}
-        except Exception as e:
-            print(f"Error getting schema: {e}")
+            except Exception as e:
+                logger.warning("Error getting schema for %s: %s", connection_id, e)
+                # A stale schema is more useful than none
+                return entry["schema"] if entry else {}
+    
+    def get_schema_version(self, connection_id: str) -> Optional[str]:
+        """Content hash of the cached schema for a connection, if loaded"""
+        return self.schema_cache.version(connection_id)
+    
+    async def refresh_schema(self, connection_id: str) -> Dict[str, Any]:
+        """Rebuild the cached schema for a connection, bypassing the TTL"""
+        if await self.get_connection_info(connection_id) is None:
+            raise ValueError(f"Connection {connection_id} not found")
+        schema = await self.get_schema_info(connection_id, refresh=True)
+        entry = await self.schema_cache.get(connection_id) or {}
+        return {
+            "tables": len(schema),
+            "version": entry.get("version"),
+            "fingerprint": entry.get("fingerprint")
+        }
+    
+    async def _schema_fingerprint(self, connection_id: str) -> Optional[str]:
+        """Cheap single-query digest of the catalog that changes whenever DDL does"""
+        db_type = self.connections[connection_id]["db_type"]
+        
+        if db_type == "postgresql":
+            pool = await self.get_pool(connection_id)
+            return await pool.fetchval("""
+                SELECT md5(
+                    coalesce((
+                        SELECT string_agg(
+                            c.relname || '.' || a.attname || ':' || a.atttypid || ':' || a.attnotnull,
+                            ',' ORDER BY c.relname, a.attnum)
+                        FROM pg_catalog.pg_attribute a
+                        JOIN pg_catalog.pg_class c ON c.oid = a.attrelid
+                        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'public'
+                          AND c.relkind IN ('r', 'v', 'm', 'p', 'f')
+                          AND a.attnum > 0
+                          AND NOT a.attisdropped
+                    ), '') || '|' ||
+                    -- Constraint and index OIDs change whenever keys or indexes are (re)created
+                    coalesce((
+                        SELECT string_agg(con.oid::text, ',' ORDER BY con.oid)
+                        FROM pg_catalog.pg_constraint con
+                        JOIN pg_catalog.pg_namespace n ON n.oid = con.connamespace
+                        WHERE n.nspname = 'public' AND con.contype IN ('p', 'f')
+                    ), '') || '|' ||
+                    coalesce((
+                        SELECT string_agg(ix.indexrelid::text, ',' ORDER BY ix.indexrelid)
+                        FROM pg_catalog.pg_index ix
+                        JOIN pg_catalog.pg_class c ON c.oid = ix.indrelid
+                        JOIN pg_catalog.pg_namespace n ON n.oid = c.relnamespace
+                        WHERE n.nspname = 'public'
+                    ), '')
+                )
+            """)
+        
+        elif db_type == "mysql":
+            def fingerprint(conn):
+                self._mysql_session_limits(conn, None, None)
+                with conn.cursor() as cursor:
+                    cursor.execute("""
+                        SELECT
+                            (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME,
+                                COLUMN_TYPE, IS_NULLABLE, ORDINAL_POSITION))), 0)
+                             FROM information_schema.columns
+                             WHERE TABLE_SCHEMA = DATABASE()),
+                            (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, COLUMN_NAME,
+                                CONSTRAINT_NAME, REFERENCED_TABLE_NAME))), 0)
+                             FROM information_schema.key_column_usage
+                             WHERE TABLE_SCHEMA = DATABASE()),
+                            (SELECT COALESCE(SUM(CRC32(CONCAT_WS(':', TABLE_NAME, INDEX_NAME,
+                                COLUMN_NAME, SEQ_IN_INDEX))), 0)
+                             FROM information_schema.statistics
+                             WHERE TABLE_SCHEMA = DATABASE())
+                    """)
+                    return ":".join(str(part) for part in cursor.fetchone())
+            pool = await self.get_pool(connection_id)
+            return await pool.run(fingerprint)
+        
+        elif db_type == "sqlite":
+            # SQLite bumps schema_version on every schema change
+            pool = await self.get_pool(connection_id)
+            version = await pool.run(lambda conn: conn.execute("PRAGMA schema_version").fetchone()[0])
+            return str(version)
+        
+        return None
+    
+    async def _load_schema(self, connection_id: str) -> Dict[str, Any]:
+        """Introspect tables, columns, keys and indexes in a single catalog query"""
+        conn_info = self.connections[connection_id]
+        db_type = conn_info["db_type"]
+        
+        if db_type == "postgresql":
+            pool = await self.get_pool(connection_id)
+            rows = await pool.fetch(POSTGRES_SCHEMA_QUERY)
+            return self._group_schema_rows(rows)
+        
+        elif db_type == "mysql":
+            pool = await self.get_pool(connection_id)
+            return await pool.run(self._mysql_schema)
+        
+        elif db_type == "sqlite":
+            pool = await self.get_pool(connection_id)
+            return await pool.run(self._sqlite_schema)
+        
+        else:
             return {}
     
-    async def execute_query(self, connection_id: str, query: str) -> Dict[str, Any]:
-        """Execute a SQL query and return results"""
+    async def stream_query(self, connection_id: str, query: str, params: Optional[List[Any]] = None,
+                           batch_size: int = STREAM_BATCH_SIZE, timeout: Optional[float] = None,
+                           max_rows: Optional[int] = None,
+                           unbounded: bool = False) -> AsyncIterator[Tuple[List[str], Optional[List[tuple]]]]:
+        """Stream a query's results through a server-side cursor.
+        
+        Yields (columns, rows) pairs: first with no rows as soon as the columns
+        are known, then one batch of at most batch_size row tuples at a time.
+        
+        timeout and max_rows tighten the connection's statement_timeout and
+        max_rows as in execute_query. The timeout bounds each statement or
+        fetch, so a slow reader does not time the stream out. A result cut off
+        at the row cap ends with (columns, None). unbounded=True drops the row
+        cap (but not the timeout) only on connections added with
+        allow_unbounded_stream; elsewhere the cap still applies.
+        """
+        conn_info = await self.get_connection_info(connection_id)
+        if conn_info is None:
+            raise ValueError(f"Connection {connection_id} not found")
+        self._use_counts[connection_id] = self._use_counts.get(connection_id, 0) + 1
+        timeout = tightest_limit(timeout, conn_info.get("statement_timeout"))
+        if unbounded and conn_info.get("allow_unbounded_stream"):
+            max_rows = None
+        else:
+            max_rows = tightest_limit(max_rows, conn_info.get("max_rows"))
+        query, params = to_dialect(query, params, conn_info["db_type"])
+        
+        # The drivers are asked for one row past the cap, which is dropped here
+        remaining = max_rows
+        batches = self._stream_batches(connection_id, conn_info, query, params, batch_size, timeout, max_rows)
         try:
-            conn = await self.get_connection(connection_id)
-            conn_info = self.connections[connection_id]
+            async for columns, rows in batches:
+                if remaining is not None and len(rows) > remaining:
+                    yield columns, rows[:remaining]
+                    yield columns, None
+                    return
+                if remaining is not None:
+                    remaining -= len(rows)
+                yield columns, rows
+        finally:
+            await batches.aclose()
+    
+    async def _stream_batches(self, connection_id: str, conn_info: dict, query: str,
+                              params: Optional[List[Any]], batch_size: int, timeout: Optional[float],
+                              max_rows: Optional[int]) -> AsyncIterator[Tuple[List[str], List[tuple]]]:
+        """(columns, rows) batches of at most max_rows + 1 rows in all"""
+        db_type = conn_info["db_type"]
+        pool = await self.get_pool(connection_id)
+        
+        if db_type == "postgresql":
+            client_timeout = timeout + CLIENT_TIMEOUT_GRACE_SECONDS if timeout else None
+            remaining = max_rows + 1 if max_rows else None
+            try:
+                async with pg_connection(pool) as conn:
+                    # asyncpg cursors only live inside a transaction
+                    async with conn.transaction():
+                        if timeout and timeout != conn_info.get("statement_timeout"):
+                            await conn.execute(f"SET LOCAL statement_timeout = {int(timeout * 1000)}")
+                        statement = await conn.prepare(query, timeout=client_timeout)
+                        columns = [attr.name for attr in statement.get_attributes()]
+                        yield columns, []
+                        cursor = await statement.cursor(*(params or ()), timeout=client_timeout)
+                        while remaining is None or remaining > 0:
+                            size = batch_size if remaining is None else min(batch_size, remaining)
+                            rows = await cursor.fetch(size, timeout=client_timeout)
+                            if not rows:
+                                break
+                            if remaining is not None:
+                                remaining -= len(rows)
+                            yield columns, [tuple(row) for row in rows]
+            except asyncio.TimeoutError:
+                raise TimeoutError(timeout_message(timeout))
+        
+        elif db_type in ("mysql", "sqlite"):
+            batches = pool.stream(self._dbapi_stream, query, params, batch_size, db_type == "mysql",
+                                  max_rows, timeout)
+            try:
+                async for batch in batches:
+                    yield batch
+            finally:
+                # Stop the worker now rather than whenever the generator is collected
+                await batches.aclose()
+        
+        else:
+            raise ValueError(f"Unsupported database type: {db_type}")
+    
+    async def execute_query(self, connection_id: str, query: str, params: Optional[List[Any]] = None,
+                            columnar: bool = False, use_cache: bool = True, timeout: Optional[float] = None,
+                            max_rows: Optional[int] = None) -> Dict[str, Any]:
+        """Execute a SQL query and return results.
+        
+        params are bound to the query's $1, $2, ... placeholders (rewritten
+        for MySQL and SQLite).
+        
+        Rows are dicts keyed by column name, or with columnar=True, lists of
+        values in column order (the result then carries "format": "columnar").
+        Read-only queries on connections with a result_cache_ttl are served
+        from the result cache; use_cache=False skips the lookup but still
+        stores the fresh result.
+        
+        timeout (seconds) and max_rows can only tighten the connection's
+        statement_timeout and max_rows. A result cut off at the row cap
+        carries "truncated": True and "max_rows".
+        """
+        conn_info = await self.get_connection_info(connection_id)
+        ttl = conn_info["result_cache_ttl"] if conn_info else 0
+        if conn_info:
+            self._use_counts[connection_id] = self._use_counts.get(connection_id, 0) + 1
+            timeout = tightest_limit(timeout, conn_info.get("statement_timeout"))
+            max_rows = tightest_limit(max_rows, conn_info.get("max_rows"))
+        if not ttl or not is_cacheable_query(query):
+            return await self._execute_query(connection_id, query, params, columnar, max_rows, timeout)
+        
+        key = (connection_id, normalize_sql(query), tuple(params or ()), columnar, max_rows)
+        if use_cache:
+            results = await self.result_cache.aget(key)
+            if results is not None:
+                return results
+        results = await self._execute_query(connection_id, query, params, columnar, max_rows, timeout)
+        await self.result_cache.aput(key, results, size=estimate_result_bytes(results), ttl_seconds=ttl)
+        return results
+    
+    async def execute_page(self, connection_id: str, query: str, params: Optional[List[Any]] = None,
+                           page_size: Optional[int] = None, cursor: Optional[str] = None,
+                           columnar: bool = False, use_cache: bool = True,
+                           timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Fetch one page of a query's results.
+        
+        Pages are fetched by keyset: ordered by the query's ORDER BY column and
+        the selected tables' primary keys, each page starting after the last key
+        of the previous one, so page N costs the same as page 1. A result with
+        more rows carries "next_cursor"; passing it back with the same query
+        fetches the next page. Queries with no usable key (aggregates, tables
+        without a primary key) come back as a single page. The page size is
+        capped by the connection's max_rows.
+        """
+        if page_size is not None and page_size <= 0:
+            raise ValueError(f"page_size must be positive, got {page_size}")
+        params = list(params or [])
+        schema = await self.get_schema_info(connection_id)
+        fingerprint = query_fingerprint(connection_id, self.get_schema_version(connection_id), query, params)
+        last_key = None
+        if cursor:
+            last_key, cursor_page_size = self.cursor_codec.decode(cursor, fingerprint)
+            page_size = page_size or cursor_page_size
+        conn_info = await self.get_connection_info(connection_id) or {}
+        page_size = tightest_limit(page_size or DEFAULT_PAGE_SIZE, conn_info.get("max_rows"))
+        
+        plan = plan_keyset(query, schema)
+        if plan is None:
+            if cursor:
+                raise InvalidCursor("This query cannot be paginated")
+            results = await self.execute_query(connection_id, query, params, columnar, use_cache, timeout,
+                                               max_rows=page_size)
+            return {**results, "page_size": page_size, "next_cursor": None}
+        
+        # One row past the page tells whether another page follows
+        page_query, page_params = plan.page_sql(params, last_key, page_size + 1)
+        results = await self.execute_query(connection_id, page_query, page_params, columnar=True,
+                                           use_cache=use_cache, timeout=timeout)
+        rows = results["rows"]
+        if rows and len(results["columns"]) != plan.column_count:
+            raise InvalidCursor("The schema changed while paging; start again from the first page")
+        has_more = len(rows) > page_size or results.get("truncated", False)
+        rows = rows[:page_size]
+        page = self._build_result(results["columns"], rows, columnar)
+        page["page_size"] = page_size
+        page["next_cursor"] = (self.cursor_codec.encode(fingerprint, plan.last_key(rows[-1]), page_size)
+                               if has_more and rows else None)
+        return page
+    
+    async def execute_aggregate(self, connection_id: str, aggregate: Optional[Dict[str, Any]],
+                                use_cache: bool = True, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """Run a chart aggregate query ({"sql", "params", ...}) alongside the main query.
+        
+        Returns the aggregate with its columnar "results" added, or None if
+        there is none or it failed; charts are then built from the rows.
+        """
+        if aggregate is None:
+            return None
+        try:
+            results = await self.execute_query(connection_id, aggregate["sql"], aggregate["params"],
+                                               columnar=True, use_cache=use_cache, timeout=timeout)
+        except Exception as e:
+            logger.warning("Chart aggregate query failed for %s: %s", connection_id, e)
+            return None
+        return {**aggregate, "results": results}
+    
+    def purge_result_cache(self, connection_id: Optional[str] = None) -> int:
+        """Drop cached results for one connection, or for all of them"""
+        if connection_id is None:
+            return self.result_cache.purge()
+        return self.result_cache.purge_group(connection_id)
+    
+    def _on_schema_change(self, connection_id: str, old_version: Optional[str], new_version: Optional[str]):
+        """Cached results may no longer match the tables once DDL changes"""
+        # A first load (no old version) has nothing stale to drop, and must not
+        # wipe results other workers cached for the connection
+        if old_version is not None:
+            self.purge_result_cache(connection_id)
+    
+    async def _execute_query(self, connection_id: str, query: str, params: Optional[List[Any]], columnar: bool,
+                             max_rows: Optional[int] = None, timeout: Optional[float] = None) -> Dict[str, Any]:
+        """Run a query against the database, bypassing the result cache"""
+        # Cancelling the wait cancels the statement too (asyncpg sends a cancel
+        # request, the thread pools interrupt or KILL QUERY it)
+        client_timeout = timeout + CLIENT_TIMEOUT_GRACE_SECONDS if timeout else None
+        try:
+            conn_info = await self.get_connection_info(connection_id)
+            if conn_info is None:
+                raise ValueError(f"Connection {connection_id} not found")
             db_type = conn_info["db_type"]
+            query, params = to_dialect(query, params, db_type)
             
             if db_type == "postgresql":
-                try:
-                    rows = await conn.fetch(query)
-                except Exception as e:
-                    # Retry once on connection closed errors
-                    message = str(e).lower()
-                    if any(x in message for x in ["closed", "reset", "terminated", "connection was closed"]):
-                        # Reconnect and retry once
-                        if connection_id in self.active_connections:
-                            try:
-                                await self.active_connections[connection_id].close()
-                            except Exception:
-                                pass
-                            del self.active_connections[connection_id]
-                        conn = await self.get_connection(connection_id)
-                        rows = await conn.fetch(query)
-                    else:
-                        raise
-                # Convert to list of dicts
-                results = [dict(row) for row in rows]
-                result = {
-                    "columns": list(results[0].keys()) if results else [],
-                    "rows": results,
-                    "count": len(results)
-                }
-                
-                # Close connection after use
-                try:
-                    await conn.close()
-                    if connection_id in self.active_connections:
-                        del self.active_connections[connection_id]
-                except Exception:
-                    pass
-                
-                return result
+                # asyncpg's own timeouts avoid wrapping every query in a task
+                rows = await self._pg_fetch(connection_id, query, params, max_rows, timeout, client_timeout)
+                columns = list(rows[0].keys()) if rows else []
+                return self._build_result(columns, rows, columnar, max_rows)
             
-            elif db_type == "mysql":
-                cursor = conn.cursor()
-                try:
-                    cursor.execute(query)
-                except Exception:
-                    # attempt reconnect once
-                    try:
-                        conn.ping(reconnect=True)
-                        cursor = conn.cursor()
-                        cursor.execute(query)
-                    except Exception as e:
-                        raise e
-                rows = cursor.fetchall()
-                columns = [desc[0] for desc in cursor.description]
-                results = [dict(zip(columns, row)) for row in rows]
-                return {
-                    "columns": columns,
-                    "rows": results,
-                    "count": len(results)
-                }
+            elif db_type in ("mysql", "sqlite"):
+                # Blocking drivers run on the pool's worker threads
+                pool = await self.get_pool(connection_id)
+                return await pool.run(self._dbapi_fetch, query, params, columnar, max_rows, timeout,
+                                      timeout=client_timeout)
             
             else:
                 return {"columns": [], "rows": [], "count": 0}
         
+        except asyncio.TimeoutError:
+            raise Exception(f"Query execution error: {timeout_message(timeout)}")
         except Exception as e:
             raise Exception(f"Query execution error: {str(e)}")
-
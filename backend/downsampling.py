@@ -0,0 +1,64 @@
+import heapq
+from typing import Any, Dict, List, Tuple
+
+# Label of the bucket that absorbs categories beyond the top K
+OTHER_LABEL = "Other"
+
+
+def lttb(values: List[Any], threshold: int) -> List[Tuple[int, Any]]:
+    """Largest-Triangle-Three-Buckets downsampling of an evenly spaced series.
+
+    Returns at most ``threshold`` (index, value) pairs. The first and last
+    points are always kept; every bucket in between contributes the point
+    forming the largest triangle with the previously kept point and the
+    average of the next bucket, which preserves peaks and troughs.
+    """
+    count = len(values)
+    if threshold >= count:
+        return list(enumerate(values))
+    if threshold < 3:
+        return [(0, values[0]), (count - 1, values[-1])][:max(threshold, 0)]
+
+    sampled = [(0, values[0])]
+    bucket_size = (count - 2) / (threshold - 2)
+    a = 0
+    for bucket in range(threshold - 2):
+        start = int(bucket * bucket_size) + 1
+        end = int((bucket + 1) * bucket_size) + 1
+
+        # Average of the next bucket (the last point for the final bucket)
+        next_start = end
+        next_end = min(int((bucket + 2) * bucket_size) + 1, count)
+        next_avg_x = (next_start + next_end - 1) / 2
+        next_avg_y = sum(values[next_start:next_end]) / (next_end - next_start)
+
+        # Twice the triangle area is |dx * (y - ay) - (ax - x) * dy|, linear in (x, y)
+        ax, ay = a, values[a]
+        dx = ax - next_avg_x
+        dy = next_avg_y - ay
+        offset = -dx * ay - dy * ax
+        a = max(range(start, end), key=lambda i: abs(dx * values[i] + dy * i + offset))
+        sampled.append((a, values[a]))
+
+    sampled.append((count - 1, values[-1]))
+    return sampled
+
+
+def top_k(counts: Dict[str, Any], k: int, other_label: str = OTHER_LABEL) -> Dict[str, Any]:
+    """Keep the ``k - 1`` largest entries and fold the rest into an "Other" entry.
+
+    Maps that already fit in ``k`` entries are returned unchanged, in their
+    original order.
+    """
+    if len(counts) <= k:
+        return counts
+    keep = max(k - 1, 0)
+    largest = heapq.nlargest(keep, counts.items(), key=lambda item: item[1])
+    reduced = dict(largest)
+    rest = sum(counts.values()) - sum(reduced.values())
+    # Avoid clobbering a real category that happens to be called "Other"
+    label = other_label
+    while label in reduced:
+        label = f"{label} "
+    reduced[label] = rest
+    return reduced
@@ -0,0 +1,100 @@
+import re
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# The shapes of SQL the query generator emits: one SELECT over tables joined
+# with INNER JOIN, optionally filtered, ordered by one column and limited
+GENERATED_QUERY = re.compile(
+    r"^\s*SELECT\s+(?P<select>.+?)\s+FROM\s+(?P<from>.+?)"
+    r"(?:\s+WHERE\s+(?P<where>.+?))?"
+    r"(?:\s+ORDER\s+BY\s+(?P<order>[\w.]+)(?:\s+(?P<direction>ASC|DESC))?)?"
+    r"(?:\s+LIMIT\s+\d+)?\s*;?\s*$",
+    re.IGNORECASE | re.DOTALL
+)
+# A table and its alias, which is never a keyword (a dangling "WHERE" is not an alias)
+TABLE_REF = re.compile(r"^(\w+)(?:\s+(?:AS\s+)?(?!(?:INNER|JOIN|ON|WHERE|ORDER|GROUP|LIMIT)\b)(\w+))?",
+                       re.IGNORECASE)
+INNER_JOIN = re.compile(r"\s+(?:INNER\s+)?JOIN\s+", re.IGNORECASE)
+JOIN_CONDITION = re.compile(r"\s+ON\s+", re.IGNORECASE)
+# Queries whose rows are not table rows (or may repeat) are left alone
+NOT_TABLE_ROWS = re.compile(
+    r"\b(group\s+by|having|distinct|union|intersect|except|left|right|full|cross|count|sum|avg|min|max)\b",
+    re.IGNORECASE
+)
+
+
+class GeneratedQuery:
+    """A generated SELECT of whole table rows, split into its clauses.
+
+    tables holds (alias, schema columns, offset) in join order, where offset
+    is the position of the table's first column in the result, or None for
+    a table only joined to connect others.
+    """
+
+    def __init__(self, select: str, source: str, where: Optional[str], order: Optional[str],
+                 descending: bool, tables: List[Tuple[str, List[Any], Optional[int]]], column_count: int):
+        self.select = select
+        self.source = source
+        self.where = where
+        self.order = order
+        self.descending = descending
+        self.tables = tables
+        self.column_count = column_count
+
+    def selected_columns(self) -> Iterator[Tuple[str, Dict[str, Any], int]]:
+        """(alias, schema column, result position) of every selected column, in result order"""
+        for alias, table_columns, offset in self.tables:
+            if offset is None:
+                continue
+            for position, column in enumerate(table_columns, offset):
+                if isinstance(column, dict):
+                    yield alias, column, position
+
+    def column(self, reference: str) -> Optional[Tuple[str, Dict[str, Any], Optional[int]]]:
+        """(alias, schema column, result position or None) of a reference such as "w.status" """
+        alias, _, name = reference.rpartition(".")
+        for ref_alias, table_columns, offset in self.tables:
+            if alias and ref_alias.lower() != alias.lower():
+                continue
+            for index, column in enumerate(table_columns):
+                if isinstance(column, dict) and column["name"].lower() == name.lower():
+                    return ref_alias, column, None if offset is None else offset + index
+        return None
+
+
+def parse_generated_query(query: str, schema: Dict[str, Any]) -> Optional[GeneratedQuery]:
+    """Split a generated query into its clauses, or None unless it selects
+    whole rows (`*` or `alias.*`) of tables in the schema"""
+    match = GENERATED_QUERY.match(query)
+    if match is None or NOT_TABLE_ROWS.search(match.group("select")) or NOT_TABLE_ROWS.search(match.group("from")):
+        return None
+    columns = {table.lower(): table_columns for table, table_columns in schema.items()}
+
+    # (alias, table columns) of every table in FROM, in join order
+    refs = []
+    for part in INNER_JOIN.split(match.group("from").strip()):
+        ref = TABLE_REF.fullmatch(JOIN_CONDITION.split(part, maxsplit=1)[0].strip())
+        if ref is None or ref.group(1).lower() not in columns:
+            return None
+        refs.append((ref.group(2) or ref.group(1), columns[ref.group(1).lower()]))
+
+    # Where each selected table's columns start in the result
+    select = [item.strip() for item in match.group("select").split(",")]
+    offsets: Dict[str, int] = {}
+    position = 0
+    if select == ["*"]:
+        for alias, table_columns in refs:
+            offsets[alias.lower()] = position
+            position += len(table_columns)
+    else:
+        by_alias = {alias.lower(): table_columns for alias, table_columns in refs}
+        for item in select:
+            alias = item[:-2].lower() if item.endswith(".*") else None
+            if alias not in by_alias:
+                return None
+            offsets[alias] = position
+            position += len(by_alias[alias])
+
+    tables = [(alias, table_columns, offsets.get(alias.lower())) for alias, table_columns in refs]
+    return GeneratedQuery(match.group("select"), match.group("from").strip(), match.group("where"),
+                          match.group("order"), (match.group("direction") or "").upper() == "DESC",
+                          tables, position)
@@ -1,14 +1,48 @@
-from fastapi import FastAPI, HTTPException
+import asyncio
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, HTTPException, Query, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import PlainTextResponse, Response, StreamingResponse
+from pydantic import BaseModel, Field
 from typing import List, Dict, Optional, Any
 import json
 from datetime import datetime
 from database_manager import DatabaseManager
+from metrics import (CONTENT_TYPE as METRICS_CONTENT_TYPE, REGISTRY, RESULT_ROWS, Counter, Gauge,
+                     MetricsMiddleware, StageTimer)
+from pagination import InvalidCursor
 from query_generator import QueryGenerator
 from result_visualizer import ResultVisualizer
+from serialization import json_default
+from shared_store import create_shared_store
+from structured_logging import DebugTraceMiddleware, configure_logging
 
-app = FastAPI(title="AI Query Engine")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Run pool health checks while serving and close every pool on shutdown"""
+    log_listener = configure_logging()
+    log_listener.start()
+    health_check_task = asyncio.create_task(db_manager.run_health_checks())
+    # Serve right away; the busiest connections' pools open in the background
+    prewarm_task = asyncio.create_task(db_manager.prewarm())
+    background_tasks = [health_check_task, prewarm_task]
+    if shared_store is not None:
+        background_tasks.append(asyncio.create_task(shared_store.run_maintenance()))
+    try:
+        yield
+    finally:
+        for task in background_tasks:
+            task.cancel()
+        await db_manager.close_all()
+        cpu_executor.shutdown(wait=False, cancel_futures=True)
+        log_listener.stop()
+
+
+app = FastAPI(title="AI Query Engine", lifespan=lifespan)
 
 # CORS middleware
 app.add_middleware(
@@ -26,10 +60,76 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize managers
-db_manager = DatabaseManager()
-query_generator = QueryGenerator()
-visualizer = ResultVisualizer()
+# Per-request debug tracing (see DEBUG_TRACE_HEADER)
+app.add_middleware(DebugTraceMiddleware)
+# Request latency and response size for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Initialize managers. Each worker process has its own; with SHARED_CACHE_PATH
+# set they share schema, translation and result caches through one file
+shared_store = create_shared_store()
+db_manager = DatabaseManager(shared_store=shared_store)
+query_generator = QueryGenerator(shared_store=shared_store)
+visualizer = ResultVisualizer(query_generator=query_generator)
+
+# Visualizing and encoding large results runs here instead of on the event loop
+CPU_WORKERS = int(os.getenv("CPU_WORKERS", str(min(4, os.cpu_count() or 1))))
+CPU_OFFLOAD_MIN_ROWS = int(os.getenv("CPU_OFFLOAD_MIN_ROWS", "2000"))
+
+# /api/chat/batch limits
+BATCH_MAX_MESSAGES = int(os.getenv("BATCH_MAX_MESSAGES", "100"))
+BATCH_MAX_CONCURRENCY = int(os.getenv("BATCH_MAX_CONCURRENCY", "4"))
+cpu_executor = ThreadPoolExecutor(max_workers=CPU_WORKERS, thread_name_prefix="cpu")
+
+
+async def run_cpu_bound(row_count: int, fn, *args):
+    """Run post-processing inline for small results and on the CPU executor for large ones"""
+    if row_count < CPU_OFFLOAD_MIN_ROWS:
+        return fn(*args)
+    return await asyncio.get_running_loop().run_in_executor(cpu_executor, fn, *args)
+
+
+def encode_payload(payload: Dict[str, Any]) -> bytes:
+    """Serialize a response directly instead of walking every cell through jsonable_encoder"""
+    return json.dumps(payload, default=json_default, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+# Translations made against a schema are dropped as soon as it changes
+db_manager.schema_cache.listeners.append(query_generator.on_schema_change)
+
+
+def _pool_samples() -> Dict[tuple, float]:
+    return {
+        (connection_id, stat): value
+        for connection_id, stats in db_manager.pool_stats().items()
+        for stat, value in stats.items()
+    }
+
+
+def _cache_samples(*fields: str) -> Dict[tuple, float]:
+    caches = {
+        "translation": query_generator.translation_cache,
+        "results": db_manager.result_cache
+    }
+    return {
+        (name, field): cache.stats()[field]
+        for name, cache in caches.items()
+        for field in fields
+    }
+
+
+# Pool and cache state is read when /metrics is scraped
+REGISTRY.register(Gauge(
+    "query_engine_pool_connections", "Connections per pool by state (size, idle, min_size, max_size)",
+    ["connection_id", "stat"], callback=_pool_samples))
+REGISTRY.register(Counter(
+    "query_engine_cache_lookups_total", "Cache lookups by outcome", ["cache", "outcome"],
+    callback=lambda: _cache_samples("hits", "misses")))
+REGISTRY.register(Counter(
+    "query_engine_cache_evictions_total", "Cache entries evicted or expired", ["cache", "reason"],
+    callback=lambda: _cache_samples("evictions", "expirations")))
+REGISTRY.register(Gauge(
+    "query_engine_cache_entries", "Cache size by measure (entries, bytes)", ["cache", "measure"],
+    callback=lambda: _cache_samples("size", "bytes")))
 
 
 class ChatMessage(BaseModel):
@@ -41,6 +141,30 @@ class ChatMessage(BaseModel):
 class ChatRequest(BaseModel):
     message: str
     db_connection_id: Optional[str] = None
+    bypass_cache: bool = False  # Re-run the query even if a cached result exists
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # Tighter than the connection's statement_timeout
+    max_rows: Optional[int] = Field(None, gt=0)  # Tighter than the connection's max_rows
+    page_size: Optional[int] = Field(None, gt=0)  # Page the results by keyset, this many rows per page
+    cursor: Optional[str] = None  # "next_cursor" of the previous page of the same message
+    chart_pushdown: Optional[bool] = None  # Compute bar and pie charts in the database (default CHART_PUSHDOWN)
+
+
+class ChatBatchRequest(BaseModel):
+    messages: List[str]
+    db_connection_id: Optional[str] = None
+    bypass_cache: bool = False
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # Per query
+    max_rows: Optional[int] = Field(None, gt=0)  # Per query
+    concurrency: Optional[int] = None  # Queries in flight at once, capped by BATCH_MAX_CONCURRENCY
+    chart_pushdown: Optional[bool] = None  # Compute bar and pie charts in the database (default CHART_PUSHDOWN)
+
+
+class ChatStreamRequest(BaseModel):
+    message: str
+    db_connection_id: Optional[str] = None
+    timeout_seconds: Optional[float] = Field(None, gt=0)  # Tighter than the connection's statement_timeout, per fetch
+    max_rows: Optional[int] = Field(None, gt=0)  # Tighter than the connection's max_rows
+    unbounded: bool = False  # Drop the generator's LIMIT, and the row cap if the connection allows it
 
 
 class DBConnection(BaseModel):
@@ -51,6 +175,12 @@ class DBConnection(BaseModel):
     password: str
     database: str
     db_type: str = "postgresql"  # postgresql, mysql, sqlite
+    pool_min_size: Optional[int] = None  # Defaults to DB_POOL_MIN_SIZE
+    pool_max_size: Optional[int] = None  # Defaults to DB_POOL_MAX_SIZE
+    result_cache_ttl: Optional[float] = None  # Seconds; defaults to RESULT_CACHE_TTL (0 disables)
+    statement_timeout: Optional[float] = None  # Seconds; defaults to QUERY_TIMEOUT_SECONDS (0 = none)
+    max_rows: Optional[int] = None  # Defaults to QUERY_MAX_ROWS (0 = none)
+    allow_unbounded_stream: bool = False  # Let /api/chat/stream lift max_rows with "unbounded"
 
 
 class MessageHistory(BaseModel):
@@ -66,14 +196,20 @@ async def root():
 async def add_database_connection(connection: DBConnection):
     """Add a new database connection"""
     try:
-        connection_id = db_manager.add_connection(
+        connection_id = await db_manager.add_connection(
             name=connection.name,
             host=connection.host,
             port=connection.port,
             username=connection.username,
             password=connection.password,
             database=connection.database,
-            db_type=connection.db_type
+            db_type=connection.db_type,
+            pool_min_size=connection.pool_min_size,
+            pool_max_size=connection.pool_max_size,
+            result_cache_ttl=connection.result_cache_ttl,
+            statement_timeout=connection.statement_timeout,
+            max_rows=connection.max_rows,
+            allow_unbounded_stream=connection.allow_unbounded_stream
         )
         return {"success": True, "connection_id": connection_id}
     except Exception as e:
@@ -83,7 +219,7 @@ async def add_database_connection(connection: DBConnection):
 @app.get("/api/databases", response_model=Dict[str, Any])
 async def list_databases():
     """List all database connections"""
-    connections = db_manager.list_connections()
+    connections = await db_manager.list_connections()
     return {"connections": connections}
 
 
@@ -91,56 +227,325 @@ async def list_databases():
 async def remove_database_connection(connection_id: str):
     """Remove a database connection"""
     try:
-        db_manager.remove_connection(connection_id)
+        await db_manager.remove_connection(connection_id)
         return {"success": True}
     except Exception as e:
         raise HTTPException(status_code=404, detail=str(e))
 
 
+@app.post("/api/databases/{connection_id}/schema/refresh")
+async def refresh_database_schema(connection_id: str):
+    """Rebuild the cached schema for a database connection"""
+    if not await db_manager.has_connection(connection_id):
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    try:
+        schema = await db_manager.refresh_schema(connection_id)
+        return {"success": True, **schema}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# Clients opt into columnar results with this Accept type or ?format=columnar
+COLUMNAR_MEDIA_TYPE = "application/vnd.query-engine.columnar+json"
+
+# Trailing LIMIT added by the query generator
+TRAILING_LIMIT = re.compile(r"\s+LIMIT\s+\d+\s*;?\s*$", re.IGNORECASE)
+
+
+async def resolve_connection_id(connection_id: Optional[str]) -> str:
+    """Validate the requested connection or fall back to the first configured one"""
+    if connection_id:
+        if not await db_manager.has_connection(connection_id):
+            raise HTTPException(status_code=404, detail="Database connection not found")
+        return connection_id
+    # Use default connection if available; re-read the registry only if none is known
+    connections = await db_manager.list_connections() or await db_manager.list_connections(refresh=True)
+    if not connections:
+        raise HTTPException(status_code=400, detail="No database connections configured")
+    return list(connections.keys())[0]
+
+
+async def cancel_on_disconnect(http_request: Request, awaitable):
+    """Await a query, cancelling it (and the statement behind it) if the client disconnects"""
+    task = asyncio.ensure_future(awaitable)
+    
+    async def watch_disconnect():
+        # The body has already been read, so the next message is the disconnect
+        while (await http_request.receive())["type"] != "http.disconnect":
+            pass
+        task.cancel()
+    
+    watcher = asyncio.create_task(watch_disconnect())
+    try:
+        return await task
+    except asyncio.CancelledError:
+        if not task.cancelled() or not watcher.done():
+            raise
+        # Nobody is left to read the response; 499 only shows up in logs and metrics
+        raise HTTPException(status_code=499, detail="Client disconnected")
+    finally:
+        watcher.cancel()
+
+
+def wants_columnar(http_request: Request, response_format: Optional[str]) -> bool:
+    """Whether the client negotiated the columnar response format"""
+    if response_format is not None:
+        return response_format == "columnar"
+    return COLUMNAR_MEDIA_TYPE in http_request.headers.get("accept", "")
+
+
 @app.post("/api/chat", response_model=Dict[str, Any])
-async def chat(request: ChatRequest):
+async def chat(request: ChatRequest, http_request: Request, response: Response,
+               response_format: Optional[str] = Query(None, alias="format")):
     """Handle chat messages and generate SQL queries"""
+    columnar = wants_columnar(http_request, response_format)
+    timer = StageTimer("chat")
     try:
         # Validate database connection
-        if request.db_connection_id:
-            if not db_manager.has_connection(request.db_connection_id):
-                raise HTTPException(status_code=404, detail="Database connection not found")
-        else:
-            # Use default connection if available
-            connections = db_manager.list_connections()
-            if not connections:
-                raise HTTPException(status_code=400, detail="No database connections configured")
-            request.db_connection_id = list(connections.keys())[0]
+        with timer.stage("connection"):
+            request.db_connection_id = await resolve_connection_id(request.db_connection_id)
         
         # Get database schema for context
-        schema_info = await db_manager.get_schema_info(request.db_connection_id)
+        with timer.stage("schema"):
+            schema_info = await db_manager.get_schema_info(request.db_connection_id)
         
-        # Generate SQL query from natural language
-        sql_query = query_generator.generate_sql(
-            user_query=request.message,
-            schema_info=schema_info
-        )
+        # Generate SQL query and explanation from natural language (cached per schema version)
+        with timer.stage("translate"):
+            sql_query, sql_params, explanation = await query_generator.translate(
+                user_query=request.message,
+                schema_info=schema_info,
+                schema_version=db_manager.get_schema_version(request.db_connection_id)
+            )
         
-        # Execute query
-        results = await db_manager.execute_query(request.db_connection_id, sql_query)
+        # Execute query, and the aggregates behind its charts alongside it
+        use_cache = not (request.bypass_cache or "no-cache" in http_request.headers.get("cache-control", ""))
+        aggregate = visualizer.aggregate_query(sql_query, sql_params, schema_info, request.chart_pushdown)
+        with timer.stage("execute"):
+            if request.page_size or request.cursor:
+                execution = db_manager.execute_page(
+                    request.db_connection_id, sql_query, sql_params, page_size=request.page_size,
+                    cursor=request.cursor, columnar=columnar, use_cache=use_cache,
+                    timeout=request.timeout_seconds
+                )
+            else:
+                execution = db_manager.execute_query(
+                    request.db_connection_id, sql_query, sql_params, columnar=columnar, use_cache=use_cache,
+                    timeout=request.timeout_seconds, max_rows=request.max_rows
+                )
+            results, aggregates = await cancel_on_disconnect(http_request, asyncio.gather(
+                execution,
+                db_manager.execute_aggregate(request.db_connection_id, aggregate, use_cache, request.timeout_seconds)
+            ))
+        row_count = results.get("count", 0)
+        RESULT_ROWS.observe(row_count, endpoint="chat")
         
         # Get visualizations
-        visualizations = visualizer.create_visualizations(results)
-        
-        # Generate explanation
-        explanation = query_generator.explain_query(sql_query, request.message)
+        with timer.stage("visualize"):
+            visualizations = await run_cpu_bound(row_count, visualizer.create_visualizations, results, aggregates)
         
-        return {
+        payload = {
             "sql_query": sql_query,
+            "sql_params": sql_params,
             "results": results,
             "visualizations": visualizations,
             "explanation": explanation,
             "connection_id": request.db_connection_id
         }
+        if columnar or row_count >= CPU_OFFLOAD_MIN_ROWS:
+            with timer.stage("serialize"):
+                content = await run_cpu_bound(row_count, encode_payload, payload)
+            return Response(
+                content=content,
+                media_type=COLUMNAR_MEDIA_TYPE if columnar else "application/json",
+                headers={"Vary": "Accept", "Server-Timing": timer.server_timing()}
+            )
+        response.headers["Server-Timing"] = timer.server_timing()
+        return payload
+    except HTTPException:
+        raise
+    except InvalidCursor as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/api/chat/batch")
+async def chat_batch(request: ChatBatchRequest, http_request: Request,
+                     response_format: Optional[str] = Query(None, alias="format")):
+    """Answer several questions against one connection.
+    
+    The schema is fetched once, every question is translated, and the
+    queries run concurrently (at most `concurrency` at a time). Items come
+    back in request order; a failing question gets an "error" instead of
+    failing the batch.
+    """
+    if not request.messages:
+        raise HTTPException(status_code=400, detail="No messages given")
+    if len(request.messages) > BATCH_MAX_MESSAGES:
+        raise HTTPException(status_code=400, detail=f"At most {BATCH_MAX_MESSAGES} messages per batch")
+    columnar = wants_columnar(http_request, response_format)
+    use_cache = not (request.bypass_cache or "no-cache" in http_request.headers.get("cache-control", ""))
+    concurrency = max(1, min(request.concurrency or BATCH_MAX_CONCURRENCY, BATCH_MAX_CONCURRENCY))
+    timer = StageTimer("chat_batch")
+    
+    connection_id = await resolve_connection_id(request.db_connection_id)
+    with timer.stage("schema"):
+        schema_info = await db_manager.get_schema_info(connection_id)
+        schema_version = db_manager.get_schema_version(connection_id)
+    
+    with timer.stage("translate"):
+        translations = []
+        for message in request.messages:
+            try:
+                translations.append(await query_generator.translate(message, schema_info, schema_version))
+            except Exception as e:
+                translations.append(e)
+    
+    semaphore = asyncio.Semaphore(concurrency)
+    
+    async def answer(index: int, message: str) -> Dict[str, Any]:
+        item: Dict[str, Any] = {"index": index, "message": message}
+        translation = translations[index]
+        if isinstance(translation, Exception):
+            item["error"] = f"Query generation error: {translation}"
+            return item
+        sql_query, sql_params, explanation = translation
+        item["sql_query"] = sql_query
+        item["sql_params"] = sql_params
+        aggregate = visualizer.aggregate_query(sql_query, sql_params, schema_info, request.chart_pushdown)
+        try:
+            async with semaphore:
+                results, aggregates = await asyncio.gather(
+                    db_manager.execute_query(
+                        connection_id, sql_query, sql_params, columnar=columnar, use_cache=use_cache,
+                        timeout=request.timeout_seconds, max_rows=request.max_rows
+                    ),
+                    db_manager.execute_aggregate(connection_id, aggregate, use_cache, request.timeout_seconds)
+                )
+            RESULT_ROWS.observe(results.get("count", 0), endpoint="chat_batch")
+            item["results"] = results
+            item["visualizations"] = await run_cpu_bound(
+                results.get("count", 0), visualizer.create_visualizations, results, aggregates
+            )
+            item["explanation"] = explanation
+        except Exception as e:
+            item["error"] = str(e)
+        return item
+    
+    with timer.stage("execute"):
+        items = await cancel_on_disconnect(
+            http_request, asyncio.gather(*(answer(i, message) for i, message in enumerate(request.messages)))
+        )
+    
+    failed = sum(1 for item in items if "error" in item)
+    payload = {
+        "connection_id": connection_id,
+        "items": items,
+        "succeeded": len(items) - failed,
+        "failed": failed
+    }
+    total_rows = sum(item["results"].get("count", 0) for item in items if "results" in item)
+    with timer.stage("serialize"):
+        content = await run_cpu_bound(total_rows, encode_payload, payload)
+    return Response(
+        content=content,
+        media_type=COLUMNAR_MEDIA_TYPE if columnar else "application/json",
+        headers={"Vary": "Accept", "Server-Timing": timer.server_timing()}
+    )
+
+
+@app.post("/api/chat/stream")
+async def chat_stream(request: ChatStreamRequest):
+    """Run a chat query and stream its rows as NDJSON.
+    
+    The first line is a meta object (SQL, explanation, columns), then one JSON
+    array per row, then an end object with the row count ("truncated": true
+    if the row cap cut it short). Errors after the stream has started are
+    reported as a final error object.
+    """
+    timer = StageTimer("chat_stream")
+    connection_id = await resolve_connection_id(request.db_connection_id)
+    with timer.stage("schema"):
+        schema_info = await db_manager.get_schema_info(connection_id)
+    with timer.stage("translate"):
+        sql_query, sql_params, explanation = await query_generator.translate(
+            user_query=request.message,
+            schema_info=schema_info,
+            schema_version=db_manager.get_schema_version(connection_id)
+        )
+        if request.unbounded:
+            sql_query = TRAILING_LIMIT.sub(";", sql_query)
+            explanation = query_generator.explain_query(sql_query, request.message, sql_params)
+    
+    # Start the query before responding so SQL errors still return a 500
+    stream = db_manager.stream_query(connection_id, sql_query, sql_params, timeout=request.timeout_seconds,
+                                     max_rows=request.max_rows, unbounded=request.unbounded)
+    try:
+        with timer.stage("execute"):
+            columns, _ = await stream.__anext__()
+    except Exception as e:
+        await stream.aclose()
+        raise HTTPException(status_code=500, detail=f"Query execution error: {str(e)}")
+    
+    async def ndjson_lines():
+        count = 0
+        truncated = False
+        try:
+            yield json.dumps({
+                "type": "meta",
+                "sql_query": sql_query,
+                "sql_params": sql_params,
+                "explanation": explanation,
+                "columns": columns,
+                "connection_id": connection_id
+            }, default=json_default) + "\n"
+            async for _, rows in stream:
+                if rows is None:
+                    truncated = True
+                    continue
+                count += len(rows)
+                yield "".join(json.dumps(row, default=json_default) + "\n" for row in rows)
+            end = {"type": "end", "count": count}
+            if truncated:
+                end["truncated"] = True
+            yield json.dumps(end) + "\n"
+        except Exception as e:
+            yield json.dumps({"type": "error", "detail": str(e), "count": count}) + "\n"
+        finally:
+            RESULT_ROWS.observe(count, endpoint="chat_stream")
+            await stream.aclose()
+    
+    # Timings cover the work done before the first row; the body streams afterwards
+    return StreamingResponse(ndjson_lines(), media_type="application/x-ndjson",
+                             headers={"Server-Timing": timer.server_timing()})
+
+
+@app.get("/api/cache/stats")
+async def cache_stats():
+    """Hit/miss counters for the server-side caches"""
+    stats = {
+        "translation": query_generator.translation_cache.stats(),
+        "results": db_manager.result_cache.stats()
+    }
+    if shared_store is not None:
+        stats["shared"] = await asyncio.to_thread(shared_store.stats)
+    return stats
+
+
+@app.get("/metrics")
+async def metrics():
+    """Prometheus text exposition of request, stage, pool and cache metrics"""
+    return PlainTextResponse(REGISTRY.render(), media_type=METRICS_CONTENT_TYPE)
+
+
+@app.delete("/api/cache/results")
+async def purge_result_cache(connection_id: Optional[str] = None):
+    """Drop cached query results for one connection, or for all connections"""
+    if connection_id is not None and not await db_manager.has_connection(connection_id):
+        raise HTTPException(status_code=404, detail="Database connection not found")
+    return {"success": True, "purged": db_manager.purge_result_cache(connection_id)}
+
+
 @app.post("/api/validate-connection")
 async def validate_connection(connection: DBConnection):
     """Validate if database connection is working"""
@@ -163,5 +568,14 @@ async def validate_connection(connection: DBConnection):
 
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
+    workers = int(os.getenv("WEB_CONCURRENCY", "1"))
+    if workers > 1:
+        # Workers only see each other's connections through a persistent registry
+        if not os.getenv("CONNECTION_REGISTRY_PATH"):
+            raise SystemExit("WEB_CONCURRENCY > 1 needs CONNECTION_REGISTRY_PATH so workers share connections")
+        # Worker processes import the app themselves and inherit this default
+        os.environ.setdefault("SHARED_CACHE_PATH", "shared_cache.db")
+        uvicorn.run("main:app", host="0.0.0.0", port=8000, workers=workers)
+    else:
+        uvicorn.run(app, host="0.0.0.0", port=8000)
 
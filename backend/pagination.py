@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import re
+from typing import Any, Dict, List, Optional, Tuple
+
+from connection_registry import read_or_create_key
+from generated_sql import parse_generated_query
+from result_cache import normalize_sql
+from serialization import decode_tagged, encode_tagged
+
+# HMAC secret for page cursors; by default a key file is generated next to the
+# connection registry so every worker accepts every other worker's cursors
+CURSOR_SECRET = os.getenv("CURSOR_SECRET", "")
+# Bytes of the HMAC-SHA256 signature kept in a cursor
+CURSOR_SIGNATURE_BYTES = 16
+
+# The generator's LIMIT, which the page size replaces
+TRAILING_LIMIT = re.compile(r"\s+LIMIT\s+\d+\s*;?\s*$", re.IGNORECASE)
+
+
+class InvalidCursor(ValueError):
+    """The cursor was tampered with, or belongs to another query or schema version"""
+
+
+class KeysetPlan:
+    """How to fetch one page of a query by seeking past the last row's key.
+
+    key holds (qualified column, position of that column in the result)
+    pairs, most significant first. Page N costs the same as page 1: the
+    database seeks to the key instead of counting past OFFSET rows.
+    """
+
+    def __init__(self, select: str, source: str, where: Optional[str],
+                 key: List[Tuple[str, int]], descending: bool, column_count: int):
+        self.select = select
+        self.source = source
+        self.where = where
+        self.key = key
+        self.descending = descending
+        # Columns the result should have; fewer or more means the schema moved on
+        self.column_count = column_count
+
+    def page_sql(self, params: List[Any], last_key: Optional[List[Any]], limit: int) -> Tuple[str, List[Any]]:
+        """SQL and parameters for the page after last_key (the first page if None)"""
+        conditions = [f"({self.where})"] if self.where else []
+        params = list(params)
+        if last_key is not None:
+            first = len(params) + 1
+            params.extend(last_key)
+            columns = [column for column, _ in self.key]
+            placeholders = [f"${first + i}" for i in range(len(columns))]
+            operator = "<" if self.descending else ">"
+            if len(columns) == 1:
+                conditions.append(f"{columns[0]} {operator} {placeholders[0]}")
+            else:
+                # The single-column bound lets an index on the leading key drive the scan
+                conditions.append(f"{columns[0]} {operator}= {placeholders[0]}")
+                conditions.append(f"({', '.join(columns)}) {operator} ({', '.join(placeholders)})")
+        direction = " DESC" if self.descending else ""
+        order = ", ".join(f"{column}{direction}" for column, _ in self.key)
+        where = f" WHERE {' AND '.join(conditions)}" if conditions else ""
+        return f"SELECT {self.select} FROM {self.source}{where} ORDER BY {order} LIMIT {int(limit)};", params
+
+    def last_key(self, row: List[Any]) -> List[Any]:
+        return [row[position] for _, position in self.key]
+
+
+def plan_keyset(query: str, schema: Dict[str, Any]) -> Optional[KeysetPlan]:
+    """A keyset plan for a generated query, or None if its rows have no usable key.
+
+    The key is the ORDER BY column (if any) followed by the primary key of
+    every selected table. A nullable ORDER BY column is refused: rows with
+    NULLs would be skipped by the key comparison.
+    """
+    parsed = parse_generated_query(query, schema)
+    if parsed is None:
+        return None
+
+    key: List[Tuple[str, int]] = []
+    if parsed.order:
+        located = parsed.column(parsed.order)
+        if located is None:
+            return None
+        alias, column, position = located
+        if position is None or (column.get("nullable") == "YES" and not column.get("primary_key")):
+            return None
+        key.append((f"{alias}.{column['name']}", position))
+    # Tables only joined to connect others are not selected and need no key:
+    # generated joins follow foreign keys, so the selected rows determine them
+    for alias, table_columns, offset in parsed.tables:
+        if offset is None:
+            continue
+        primary_key = [(f"{alias}.{column['name']}", offset + index) for index, column in enumerate(table_columns)
+                       if isinstance(column, dict) and column.get("primary_key")]
+        if not primary_key:
+            return None
+        key.extend(entry for entry in primary_key if entry not in key)
+
+    return KeysetPlan(parsed.select, parsed.source, parsed.where, key, parsed.descending, parsed.column_count)
+
+
+def query_fingerprint(connection_id: str, schema_version: Optional[str], query: str, params: List[Any]) -> str:
+    """Identifies a query against one version of a connection's schema"""
+    # The generator's LIMIT is not part of the query's identity; the page size replaces it
+    query = TRAILING_LIMIT.sub("", query)
+    payload = json.dumps([connection_id, schema_version, normalize_sql(query), params], default=encode_tagged)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()[:32]
+
+
+class CursorCodec:
+    """Opaque, signed page cursors: the last row's key, the page size and the query fingerprint"""
+
+    def __init__(self, secret: bytes):
+        self.secret = secret
+
+    def _sign(self, payload: bytes) -> bytes:
+        return hmac.new(self.secret, payload, hashlib.sha256).digest()[:CURSOR_SIGNATURE_BYTES]
+
+    def encode(self, fingerprint: str, last_key: List[Any], page_size: int) -> str:
+        payload = json.dumps({"f": fingerprint, "k": last_key, "n": page_size},
+                             default=encode_tagged, separators=(",", ":")).encode("utf-8")
+        return base64.urlsafe_b64encode(self._sign(payload) + payload).decode("ascii").rstrip("=")
+
+    def decode(self, cursor: str, fingerprint: str) -> Tuple[List[Any], int]:
+        """(last key, page size) of a cursor issued for this fingerprint"""
+        try:
+            raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        except (ValueError, TypeError):
+            raise InvalidCursor("Malformed cursor")
+        signature, payload = raw[:CURSOR_SIGNATURE_BYTES], raw[CURSOR_SIGNATURE_BYTES:]
+        if not hmac.compare_digest(signature, self._sign(payload)):
+            raise InvalidCursor("Invalid cursor")
+        data = json.loads(payload, object_hook=decode_tagged)
+        if data["f"] != fingerprint:
+            raise InvalidCursor("Cursor does not belong to this query, or the schema has changed since")
+        return data["k"], data["n"]
+
+
+def create_cursor_codec(key_file: Optional[str]) -> CursorCodec:
+    """Codec signing with CURSOR_SECRET, else a shared key file, else a per-process secret"""
+    if CURSOR_SECRET:
+        secret = CURSOR_SECRET.encode("utf-8")
+    elif key_file:
+        secret = read_or_create_key(key_file, "CURSOR_SECRET").encode("ascii")
+    else:
+        secret = os.urandom(32)
+    return CursorCodec(secret)
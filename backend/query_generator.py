@@ -1,15 +1,113 @@
+import heapq
+import os
 import re
-from typing import Dict, Any
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+from cache import LRUCache, SharedLRUCache
+from schema_cache import schema_version as compute_schema_version
+from generated_sql import parse_generated_query
+from schema_index import GROUP_COLUMN_WORDS, MEASURE_TYPES, ORG_WORDS, SchemaIndex, is_integer_type, table_alias
+from shared_store import SharedStore
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Schema indexes kept for recently seen schema versions
+SCHEMA_INDEX_CACHE_SIZE = 32
+
+# Translations of recently asked questions, per schema version (0 disables)
+TRANSLATION_CACHE_SIZE = int(os.getenv("TRANSLATION_CACHE_SIZE", "1024"))
+TRANSLATION_CACHE_TTL_SECONDS = float(os.getenv("TRANSLATION_CACHE_TTL_SECONDS", "3600"))
+
+# Most tables a question's fallback branches consider, best-scoring first
+SCHEMA_CANDIDATE_TABLES = int(os.getenv("SCHEMA_CANDIDATE_TABLES", "5"))
+
+SHOW_ALL_PATTERN = re.compile(r'show\s+(me\s+)?all|list\s+all|get\s+all|get\s+me')
+
+# Pattern: "name matches with X" or "name matches X" or "name like X"
+# Also handle: "matches the name as X" or "which matches name as X"
+CONDITION_PATTERNS = [re.compile(pattern, re.IGNORECASE) for pattern in [
+    # Standard: "name matches with X" or "name matches X"
+    r'(?:of\s+)?(\w+)\s+matches\s+(?:with\s+)?(["\']?)(\w+)',
+    # Reverse: "matches the name as X" or "matches name as X"
+    r'matches\s+(?:the\s+)?(\w+)\s+as\s+(["\']?)(\w+)',
+    # Reverse with "with": "matches the name with X"
+    r'matches\s+(?:the\s+)?(\w+)\s+with\s+(["\']?)(\w+)',
+    # Other patterns
+    r'(?:of\s+)?(\w+)\s+like\s+(["\']?)(\w+)',
+    r'(?:of\s+)?(\w+)\s+contains\s+(["\']?)(\w+)',
+    r'(?:of\s+)?(\w+)\s+equals\s+(["\']?)(\w+)',
+    r'(?:of\s+)?(\w+)\s+is\s+(["\']?)(\w+)',
+    r'(?:of\s+)?(\w+)\s+=\s+(["\']?)(\w+)',
+]]
+
+WHERE_PATTERN = re.compile(r'where\s+(\w+)\s*=\s*(["\']?)(\w+)\2')
+ID_VALUE_PATTERN = re.compile(r'\bid\s*[=:]\s*(\d+)')
+NUMBER_PATTERN = re.compile(r'\b(\d+)\b')
+
+# Query words whose patterns look up the table named in the query
+NAMED_TABLE_KEYWORDS = ('count', 'where', 'filter', 'sort', 'order', 'group', 'aggregate')
 
 
 class QueryGenerator:
     """Convert natural language to SQL queries"""
     
-    def __init__(self):
-        self.conversation_history = []
+    def __init__(self, shared_store: Optional[SharedStore] = None):
+        self._indexes: "OrderedDict[str, SchemaIndex]" = OrderedDict()
+        # (schema version, normalized question) -> (SQL, SQL description), shared
+        # with the other worker processes when a store is given
+        if shared_store is not None:
+            self.translation_cache = SharedLRUCache(shared_store, "translations", TRANSLATION_CACHE_SIZE,
+                                                    TRANSLATION_CACHE_TTL_SECONDS)
+        else:
+            self.translation_cache = LRUCache(TRANSLATION_CACHE_SIZE, TRANSLATION_CACHE_TTL_SECONDS)
     
-    def generate_sql(self, user_query: str, schema_info: Dict[str, Any]) -> str:
-        """Generate SQL query from natural language"""
+    @staticmethod
+    def normalize_message(user_query: str) -> str:
+        """Case and whitespace do not change the generated SQL"""
+        return " ".join(user_query.lower().split())
+    
+    async def translate(self, user_query: str, schema_info: Dict[str, Any],
+                        schema_version: Optional[str] = None) -> Tuple[str, List[Any], str]:
+        """Generate SQL, its parameters and its explanation, reusing earlier answers to the same question"""
+        if schema_version is None:
+            schema_version = compute_schema_version(schema_info)
+        key = (schema_version, self.normalize_message(user_query))
+        cached = await self.translation_cache.aget(key)
+        if cached is None:
+            sql_query, params = self.generate_sql(user_query, schema_info, schema_version)
+            cached = (sql_query, params, self.describe_sql(sql_query))
+            await self.translation_cache.aput(key, cached)
+        sql_query, params, description = cached
+        return sql_query, list(params), self._explanation_header(sql_query, user_query, params) + description
+    
+    def on_schema_change(self, connection_id: str, old_version: Optional[str], new_version: Optional[str]):
+        """SchemaCache listener: forget translations made against the old schema"""
+        if old_version is not None:
+            self.translation_cache.purge_group(old_version)
+    
+    def get_index(self, schema_info: Dict[str, Any], schema_version: Optional[str] = None) -> SchemaIndex:
+        """Lookup structures for a schema, built once per schema version"""
+        if schema_version is None:
+            schema_version = compute_schema_version(schema_info)
+        index = self._indexes.get(schema_version)
+        if index is None:
+            index = SchemaIndex(schema_info)
+            self._indexes[schema_version] = index
+            if len(self._indexes) > SCHEMA_INDEX_CACHE_SIZE:
+                self._indexes.popitem(last=False)
+        else:
+            self._indexes.move_to_end(schema_version)
+        return index
+    
+    def generate_sql(self, user_query: str, schema_info: Dict[str, Any],
+                     schema_version: Optional[str] = None) -> Tuple[str, List[Any]]:
+        """Generate a SQL query from natural language.
+        
+        Values taken from the question are never written into the SQL: they
+        come back as a parameter list bound to $1, $2, ... placeholders, so
+        questions that differ only in their values share one statement.
+        """
         
         # Simple pattern-based approach
         # In production, you'd use an LLM like OpenAI GPT-4 or local LLM
@@ -17,152 +115,90 @@ class QueryGenerator:
         query_lower = user_query.lower()
         
         # Extract table and column information from schema
-        tables = list(schema_info.keys())
+        index = self.get_index(schema_info, schema_version)
+        tables = index.tables
         
         # DEBUG: Print tables and query
-        print(f"DEBUG: Tables in schema: {tables}")
-        print(f"DEBUG: Query: {user_query}")
+        logger.debug("Tables in schema: %s", tables)
+        logger.debug("Query: %s", user_query)
         
         # Pattern: Detect when multiple tables are mentioned
         # e.g., "get wallets and vccs of organisations"
         mentioned_tables = []
         
-        def get_singular(table_name):
-            """Convert plural to singular"""
-            if table_name.endswith('ies'):
-                return table_name[:-3] + 'y'
-            elif table_name.endswith('s') and not table_name.endswith('ss'):
-                return table_name[:-1]
-            return table_name
-        
-        def fuzzy_match_table(query_text, table_name):
-            """Check if query mentions this table with fuzzy matching - ULTRA STRICT version"""
-            query_lower = query_text.lower()
-            table_lower = table_name.lower()
-            
-            # ONLY match the exact core business tables
-            # This prevents ALL over-matching
-            
-            # Check for wallet - ONLY "wallets" table
-            if 'wallet' in query_lower and table_lower == 'wallets':
-                return True
-            
-            # Check for vcc - ONLY "vccs" table
-            if 'vcc' in query_lower and table_lower == 'vccs':
-                return True
-            
-            # Check for organisation/organization - ONLY "organizations" table
-            if ('org' in query_lower or 'organisation' in query_lower or 'organization' in query_lower) and table_lower == 'organizations':
-                return True
-            
-            return False
-        
         # Extract core business tables (wallets, vccs, organizations) from query
         core_tables = []
-        query_lower = user_query.lower()
         
         # Check for wallet references
         if 'wallet' in query_lower:
-            if 'wallets' in [t.lower() for t in tables]:
+            if index.has_table('wallets'):
                 core_tables.append('wallets')
-                print(f"DEBUG: Added wallets to core tables")
+                logger.debug("Added wallets to core tables")
         
         # Check for vcc references  
         if 'vcc' in query_lower:
-            if 'vccs' in [t.lower() for t in tables]:
+            if index.has_table('vccs'):
                 core_tables.append('vccs')
-                print(f"DEBUG: Added vccs to core tables")
+                logger.debug("Added vccs to core tables")
         
         # Check for organization references
         if 'org' in query_lower or 'organisation' in query_lower or 'organization' in query_lower:
-            if 'organizations' in [t.lower() for t in tables]:
+            if index.has_table('organizations'):
                 core_tables.append('organizations')
-                print(f"DEBUG: Added organizations to core tables")
+                logger.debug("Added organizations to core tables")
         
         # Only proceed with JOIN if we have at least 2 core tables
-        print(f"DEBUG: Core tables detected: {core_tables}")
+        logger.debug("Core tables detected: %s", core_tables)
         if len(core_tables) >= 2:
-            print(f"DEBUG: Calling _generate_join_query with: {core_tables}")
-            return self._generate_join_query(core_tables, schema_info, query_lower)
+            logger.debug("Calling _generate_join_query with: %s", core_tables)
+            return self._generate_join_query(core_tables, index, query_lower), []
         
         # Otherwise use mentioned_tables for single table queries
         mentioned_tables = core_tables
         
-        print(f"DEBUG: Mentioned tables: {mentioned_tables}")
+        # Relevance of the tables the query names, misspellings included
+        table_scores = index.relevance.scores(query_lower)
+        best_tables = heapq.nsmallest(SCHEMA_CANDIDATE_TABLES, table_scores,
+                                      key=lambda t: (-table_scores[t], index.positions[t]))
+        
+        logger.debug("Mentioned tables: %s", mentioned_tables)
         
         # Check for filter conditions FIRST (before generating query)
-        where_conditions = self._extract_conditions(user_query, schema_info, core_tables if core_tables else mentioned_tables)
-        print(f"DEBUG: Extracted WHERE conditions: {where_conditions}")
+        where_conditions, where_params = self._extract_conditions(
+            user_query, index, core_tables if core_tables else mentioned_tables)
+        logger.debug("Extracted WHERE conditions: %s", where_conditions)
         
         # Pattern: "show me all X" or "list all X"
-        if re.search(r'show\s+(me\s+)?all|list\s+all|get\s+all|get\s+me', query_lower):
+        if SHOW_ALL_PATTERN.search(query_lower):
             # Skip fuzzy matching - use core_tables if available
             if len(core_tables) >= 1:
-                print(f"DEBUG: Using core_tables for query")
+                logger.debug("Using core_tables for query")
                 # Return the appropriate query based on core_tables
                 if len(core_tables) == 1:
                     table_name = core_tables[0]
                     if where_conditions:
-                        return f"SELECT * FROM {table_name} WHERE {where_conditions} LIMIT 100;"
-                    return f"SELECT * FROM {table_name} LIMIT 100;"
+                        return f"SELECT * FROM {table_name} WHERE {where_conditions} LIMIT 100;", where_params
+                    return f"SELECT * FROM {table_name} LIMIT 100;", []
                 elif len(core_tables) >= 2:
-                    join_query = self._generate_join_query(core_tables, schema_info, query_lower)
+                    join_query = self._generate_join_query(core_tables, index, query_lower)
                     if where_conditions:
-                        # Add WHERE clause to JOIN query
-                        join_query = join_query.rstrip(';')
-                        return f"{join_query} WHERE {where_conditions};"
-                    return join_query
-            
-            # Only if no core_tables found, use fallback
-            potential_tables = core_tables.copy()
-            table_scores = {}
-            
-            for table in tables:
-                # Only check if it's an exact core table
-                table_lower = table.lower()
-                if table_lower == 'wallets' and 'wallet' in query_lower:
-                    if table not in potential_tables:
-                        potential_tables.append(table)
-                        table_scores[table] = 100
-                        print(f"DEBUG: Added {table} to potential_tables")
-                elif table_lower == 'vccs' and 'vcc' in query_lower:
-                    if table not in potential_tables:
-                        potential_tables.append(table)
-                        table_scores[table] = 100
-                        print(f"DEBUG: Added {table} to potential_tables")
-                elif table_lower == 'organizations' and ('org' in query_lower or 'organisation' in query_lower or 'organization' in query_lower):
-                    if table not in potential_tables:
-                        potential_tables.append(table)
-                        table_scores[table] = 100
-                        print(f"DEBUG: Added {table} to potential_tables")
-                
-                # Also try exact matching as backup
-                table_lower = table.lower()
-                table_singular = get_singular(table_lower)
-                
-                if table not in potential_tables:
-                    matches = False
-                    # Exact match or singular/plural variants
-                    if table_lower in query_lower or table_singular in query_lower:
-                        matches = True
-                    # Check if singular table name matches plural in query
-                    elif table_singular + 's' in query_lower or table_lower + 's' in query_lower:
-                        matches = True
-                    # Check if plural table name matches singular in query
-                    elif table_lower.endswith('s') and table_lower[:-1] in query_lower:
-                        matches = True
-                    
-                    if matches:
-                        potential_tables.append(table)
-                        print(f"DEBUG: potential_tables added: {table}")
+                        # Add WHERE clause to JOIN query, ahead of its LIMIT
+                        join_query = join_query.replace(" LIMIT 100;", f" WHERE {where_conditions} LIMIT 100;")
+                        return join_query, where_params
+                    return join_query, []
             
+            # Only if no core_tables found, use fallback: exact names or singular/plural variants,
+            # keeping the most relevant few, else the best misspelt match
+            potential_tables = self._top_candidates(index.mentioned_tables(query_lower), table_scores, index)
+            if not potential_tables:
+                potential_tables = best_tables[:1]
             # If we found multiple tables, generate JOIN
-            print(f"DEBUG: potential_tables found: {potential_tables}")
+            logger.debug("potential_tables found: %s", potential_tables)
             if len(potential_tables) >= 2:
-                print(f"DEBUG: Generating JOIN query for: {potential_tables}")
+                logger.debug("Generating JOIN query for: %s", potential_tables)
                 # Sort by score (highest first) to prioritize business tables
                 sorted_tables = sorted(potential_tables, key=lambda t: table_scores.get(t, 0), reverse=True)
-                return self._generate_join_query(sorted_tables, schema_info, query_lower)
+                return self._generate_join_query(sorted_tables, index, query_lower), []
             
             # Otherwise, return first matching table
             if potential_tables:
@@ -170,299 +206,295 @@ class QueryGenerator:
                 # try harder to find related tables
                 if len(potential_tables) == 1 and ('wallet' in query_lower or 'vcc' in query_lower or 'organisation' in query_lower or 'organization' in query_lower):
                     # Try to find additional related tables
-                    for table in tables:
-                        table_lower = table.lower()
+                    related = set()
+                    if 'wallet' in query_lower:
+                        related.update(index.wallet_tables)
+                    if 'vcc' in query_lower:
+                        related.update(index.vcc_tables)
+                    if any(word in query_lower for word in ORG_WORDS):
+                        related.update(index.org_tables)
+                    for table in index.in_schema_order(related):
                         if table not in potential_tables:
-                            # Look for wallet-related tables
-                            if 'wallet' in query_lower and 'wallet' in table_lower:
-                                potential_tables.append(table)
-                                print(f"DEBUG: Added additional wallet table: {table}")
-                            # Look for vcc-related tables
-                            elif 'vcc' in query_lower and 'vcc' in table_lower:
-                                potential_tables.append(table)
-                                print(f"DEBUG: Added additional vcc table: {table}")
-                            # Look for organisation-related tables
-                            elif ('organisation' in query_lower or 'organization' in query_lower or 'oragnisation' in query_lower) and ('org' in table_lower or 'organisation' in table_lower or 'organization' in table_lower):
-                                potential_tables.append(table)
-                                print(f"DEBUG: Added additional org table: {table}")
+                            potential_tables.append(table)
+                            logger.debug("Added additional related table: %s", table)
+                    potential_tables = self._top_candidates(potential_tables, table_scores, index)
                     
                     # Try again with updated tables
                     if len(potential_tables) >= 2:
-                        print(f"DEBUG: Now generating JOIN query for: {potential_tables}")
+                        logger.debug("Now generating JOIN query for: %s", potential_tables)
                         # Sort by score (highest first)
                         sorted_tables = sorted(potential_tables, key=lambda t: table_scores.get(t, 0), reverse=True)
-                        return self._generate_join_query(sorted_tables, schema_info, query_lower)
+                        return self._generate_join_query(sorted_tables, index, query_lower), []
                 
                 # Sort tables by score and return best match
                 if potential_tables:
                     sorted_tables = sorted(potential_tables, key=lambda t: table_scores.get(t, 0), reverse=True)
                     table_name = sorted_tables[0]
-                    print(f"DEBUG: Using best table (by score): {table_name}")
+                    logger.debug("Using best table (by score): %s", table_name)
                     if where_conditions:
-                        return f"SELECT * FROM {table_name} WHERE {where_conditions} LIMIT 100;"
-                    return f"SELECT * FROM {table_name} LIMIT 100;"
+                        return f"SELECT * FROM {table_name} WHERE {where_conditions} LIMIT 100;", where_params
+                    return f"SELECT * FROM {table_name} LIMIT 100;", []
         
         # Pattern: "count X"
+        # First table named verbatim, for the keyword patterns below
+        named_table = None
+        if any(keyword in query_lower for keyword in NAMED_TABLE_KEYWORDS):
+            named_table = index.first_table_in(query_lower) or (best_tables[0] if best_tables else None)
+        
         if 'count' in query_lower:
-            for table in tables:
-                if table.lower() in query_lower:
-                    return f"SELECT COUNT(*) as count FROM {table};"
+            if named_table:
+                return f"SELECT COUNT(*) as count FROM {named_table};", []
         
         # Pattern: "find X where Y = Z" or "filter X"
         if 'where' in query_lower or 'filter' in query_lower:
             # Extract table name
-            for table in tables:
-                if table.lower() in query_lower:
-                    # Extract potential conditions
-                    conditions = self._extract_conditions(user_query, schema_info, [table])
-                    if conditions:
-                        return f"SELECT * FROM {table} WHERE {conditions} LIMIT 100;"
-                    else:
-                        return f"SELECT * FROM {table} LIMIT 100;"
+            if named_table:
+                # Extract potential conditions
+                conditions, params = self._extract_conditions(user_query, index, [named_table])
+                if conditions:
+                    return f"SELECT * FROM {named_table} WHERE {conditions} LIMIT 100;", params
+                else:
+                    return f"SELECT * FROM {named_table} LIMIT 100;", []
         
         # Pattern: "join" or "combine"
         if 'join' in query_lower or 'combine' in query_lower:
             if len(tables) >= 2:
-                # Simple join on first two tables
-                table1, table2 = tables[0], tables[1]
-                return f"SELECT * FROM {table1} JOIN {table2} ON {table1}.id = {table2}.{table1}_id LIMIT 100;"
+                # Join the tables the query names (one table with its first neighbour),
+                # else the two most relevant, else the first two in the schema
+                join_tables = self._top_candidates(index.mentioned_tables(query_lower), table_scores, index)
+                if not join_tables:
+                    join_tables = best_tables[:2]
+                if len(join_tables) == 1 and index.join_graph.adjacency[join_tables[0]]:
+                    join_tables.append(index.join_graph.adjacency[join_tables[0]][0][0])
+                if len(join_tables) < 2:
+                    join_tables = tables[:2]
+                return self._generate_join_query(join_tables, index, query_lower), []
         
         # Pattern: "order by" or "sort by"
         if 'sort' in query_lower or 'order' in query_lower:
-            for table in tables:
-                if table.lower() in query_lower:
-                    # Try to extract column name
-                    columns = [col['name'] for col in schema_info.get(table, [])]
-                    order_col = 'id' if 'id' in columns else columns[0] if columns else 'id'
-                    order_dir = 'DESC' if 'desc' in query_lower else 'ASC'
-                    return f"SELECT * FROM {table} ORDER BY {order_col} {order_dir} LIMIT 100;"
+            if named_table:
+                # Try to extract column name
+                order_col = index.columns(named_table).order_column
+                order_dir = 'DESC' if 'desc' in query_lower else 'ASC'
+                return f"SELECT * FROM {named_table} ORDER BY {order_col} {order_dir} LIMIT 100;", []
         
         # Pattern: "group by" or "aggregate"
         if 'group' in query_lower or 'aggregate' in query_lower:
-            for table in tables:
-                if table.lower() in query_lower:
-                    # Try to find a likely grouping column
-                    columns = [col['name'] for col in schema_info.get(table, [])]
-                    # Look for category-type columns
-                    group_cols = [c for c in columns if any(x in c.lower() for x in ['type', 'category', 'status', 'group'])]
-                    if group_cols:
-                        group_col = group_cols[0]
-                        return f"SELECT {group_col}, COUNT(*) as count FROM {table} GROUP BY {group_col};"
-        
-        # Default: return first table
+            if named_table:
+                # Look for category-type columns
+                group_cols = index.columns(named_table).group_columns
+                if group_cols:
+                    group_col = group_cols[0]
+                    return f"SELECT {group_col}, COUNT(*) as count FROM {named_table} GROUP BY {group_col};", []
+        
+        # Default: return the most relevant table, else the first one
+        if best_tables:
+            return f"SELECT * FROM {best_tables[0]} LIMIT 100;", []
         if tables:
-            return f"SELECT * FROM {tables[0]} LIMIT 100;"
+            return f"SELECT * FROM {tables[0]} LIMIT 100;", []
         
-        return "SELECT 1;"
+        return "SELECT 1;", []
     
-    def _generate_join_query(self, tables: list, schema_info: Dict[str, Any], query: str) -> str:
-        """Generate a JOIN query for wallets, vccs, and organizations only"""
-        
-        # Remove duplicates and filter to only our 3 core tables
-        tables = list(dict.fromkeys(tables))
-        core_tables = []
-        
-        for table in tables:
-            table_lower = table.lower()
-            if table_lower in ['wallets', 'vccs', 'organizations']:
-                core_tables.append(table)
-        
-        # If not enough core tables, return simple query
-        if len(core_tables) < 2:
-            if core_tables:
-                return f"SELECT * FROM {core_tables[0]} LIMIT 100;"
-            return f"SELECT * FROM {tables[0]} LIMIT 100;"
-        
-        print(f"DEBUG: Generating JOIN for CORE tables: {core_tables}")
-        
-        # Determine main table (wallets)
-        main_table = 'wallets' if 'wallets' in core_tables else core_tables[0]
-        
-        # Build fixed aliases - NO DUPLICATES
-        aliases = {main_table: 'w'}
-        used_aliases = {'w'}
-        
-        for table in core_tables:
-            if table == main_table:
-                continue
-            
-            table_lower = table.lower()
-            if 'org' in table_lower or 'organisation' in table_lower or 'organization' in table_lower:
-                if 'o' not in used_aliases:
-                    aliases[table] = 'o'
-                    used_aliases.add('o')
-                else:
-                    # Skip if already used
-                    print(f"DEBUG: Skipping {table} - alias 'o' already used")
-                    continue
-            elif 'vcc' in table_lower:
-                if 'v' not in used_aliases:
-                    aliases[table] = 'v'
-                    used_aliases.add('v')
-                else:
-                    # Skip if already used
-                    print(f"DEBUG: Skipping {table} - alias 'v' already used")
-                    continue
+    @staticmethod
+    def _top_candidates(tables: list, table_scores: Dict[str, float], index: SchemaIndex) -> list:
+        """The SCHEMA_CANDIDATE_TABLES best-scoring of tables, in their original order"""
+        if len(tables) <= SCHEMA_CANDIDATE_TABLES:
+            return tables
+        keep = set(sorted(tables, key=lambda t: (-table_scores.get(t, 0), index.positions[t]))[:SCHEMA_CANDIDATE_TABLES])
+        return [table for table in tables if table in keep]
+    
+    def _generate_join_query(self, tables: list, index: SchemaIndex, query: str) -> str:
+        """Generate a JOIN query over the shortest foreign-key paths between tables"""
         
-        from_clause = f"FROM {main_table} {aliases[main_table]}"
+        # Remove duplicates and tables the schema does not have
+        tables = [table for table in dict.fromkeys(tables) if table in index.positions]
+        if not tables:
+            return "SELECT 1;"
+        graph = index.join_graph
+        
+        # Start from the table closest to all the others (wallets for wallets, vccs and organizations)
+        def spread(table):
+            distances = [graph.distance(table, other) for other in tables if other != table]
+            reachable = [d for d in distances if d is not None]
+            return (len(distances) - len(reachable), sum(reachable))
+        main_table = min(tables, key=spread)
+        ordered = [main_table] + [table for table in tables if table != main_table]
+        
+        steps = graph.plan(ordered)
+        if not steps:
+            logger.debug("No join path between %s", tables)
+            return f"SELECT * FROM {main_table} LIMIT 100;"
+        
+        aliases = {main_table: table_alias(main_table, set())}
         join_clauses = []
-        
-        # Build SELECT with only unique aliases
-        select_cols = []
-        for table, alias in aliases.items():
-            select_cols.append(f"{alias}.*")
-        
-        # Build JOIN clauses
-        for table in core_tables:
-            if table == main_table or table not in aliases:
-                continue
-            
-            table_alias = aliases[table]
-            
-            # Organizations join
-            if 'org' in table.lower() or 'organisation' in table.lower() or 'organization' in table.lower():
-                join_clauses.append(f"INNER JOIN {table} {table_alias} ON w.organization_id = {table_alias}.organization_id")
-                print(f"DEBUG: Added org join for {table}")
-            
-            # VCCs join
-            elif 'vcc' in table.lower():
-                join_clauses.append(f"INNER JOIN {table} {table_alias} ON {table_alias}.funding_wallet_id = w.funding_wallet_id")
-                print(f"DEBUG: Added vcc join for {table}")
-        
-        join_str = " ".join(join_clauses)
-        
-        query_sql = f"SELECT {', '.join(select_cols)} {from_clause} {join_str} LIMIT 100;"
-        print(f"DEBUG: Final query: {query_sql}")
+        for joined, table, (child, child_col, parent, parent_col) in steps:
+            aliases[table] = table_alias(table, set(aliases.values()))
+            join_clauses.append(
+                f"INNER JOIN {table} {aliases[table]} "
+                f"ON {aliases[child]}.{child_col} = {aliases[parent]}.{parent_col}"
+            )
+            logger.debug("Joined %s to %s on %s.%s = %s.%s", table, joined, child, child_col, parent, parent_col)
+        
+        # Tables only on the path between the requested ones are joined but not selected
+        select_cols = [f"{aliases[table]}.*" for table in ordered if table in aliases]
+        
+        query_sql = (f"SELECT {', '.join(select_cols)} FROM {main_table} {aliases[main_table]} "
+                     f"{' '.join(join_clauses)} LIMIT 100;")
+        logger.debug("Final query: %s", query_sql)
         return query_sql
     
-    def _extract_conditions(self, query: str, schema_info: Dict[str, Any], tables: list) -> str:
-        """Extract WHERE conditions from natural language"""
-        print(f"DEBUG: _extract_conditions called with query: '{query}', tables: {tables}")
+    def _extract_conditions(self, query: str, index: SchemaIndex, tables: list) -> Tuple[str, List[Any]]:
+        """Extract WHERE conditions from natural language, with their values as parameters"""
+        logger.debug("_extract_conditions called with query: '%s', tables: %s", query, tables)
         query_lower = query.lower()
         conditions = []
+        params: List[Any] = []
+        
+        def bind(column: str, value: str) -> str:
+            params.append(columns.bind_value(column, value))
+            return f"${len(params)}"
         
         # Get the first table to check columns
         if not tables:
-            print(f"DEBUG: No tables provided, returning empty conditions")
-            return ""
+            logger.debug("No tables provided, returning empty conditions")
+            return "", params
         
         table_name = tables[0] if isinstance(tables, list) else tables
-        print(f"DEBUG: Using table: '{table_name}'")
-        schema_columns = schema_info.get(table_name, [])
-        print(f"DEBUG: Schema columns for {table_name}: {len(schema_columns)} columns")
-        column_names = [col['name'].lower() if isinstance(col, dict) else str(col).lower() for col in schema_columns]
-        print(f"DEBUG: Column names: {column_names[:5]}...")  # Print first 5 columns
-        
-        # Pattern: "name matches with X" or "name matches X" or "name like X"
-        # Also handle: "matches the name as X" or "which matches name as X"
-        match_patterns = [
-            # Standard: "name matches with X" or "name matches X"
-            r'(?:of\s+)?(\w+)\s+matches\s+(?:with\s+)?(["\']?)(\w+)',
-            # Reverse: "matches the name as X" or "matches name as X"
-            r'matches\s+(?:the\s+)?(\w+)\s+as\s+(["\']?)(\w+)',
-            # Reverse with "with": "matches the name with X"
-            r'matches\s+(?:the\s+)?(\w+)\s+with\s+(["\']?)(\w+)',
-            # Other patterns
-            r'(?:of\s+)?(\w+)\s+like\s+(["\']?)(\w+)',
-            r'(?:of\s+)?(\w+)\s+contains\s+(["\']?)(\w+)',
-            r'(?:of\s+)?(\w+)\s+equals\s+(["\']?)(\w+)',
-            r'(?:of\s+)?(\w+)\s+is\s+(["\']?)(\w+)',
-            r'(?:of\s+)?(\w+)\s+=\s+(["\']?)(\w+)',
-        ]
-        
-        for pattern in match_patterns:
-            matches = re.finditer(pattern, query_lower, re.IGNORECASE)
-            for match in matches:
-                print(f"DEBUG: Pattern matched: {pattern}")
-                print(f"DEBUG: Match groups: {match.groups()}")
+        logger.debug("Using table: '%s'", table_name)
+        columns = index.columns(table_name)
+        column_names = columns.names
+        logger.debug("Schema columns for %s: %s columns", table_name, len(column_names))
+        logger.debug("Column names: %s", column_names)
+        
+        for pattern in CONDITION_PATTERNS:
+            for match in pattern.finditer(query_lower):
+                logger.debug("Pattern matched: %s", pattern.pattern)
+                logger.debug("Match groups: %s", match.groups())
                 column_candidate = match.group(1).lower()
                 # For patterns with 3 groups, value is group 3, otherwise group 2
                 if len(match.groups()) >= 3:
                     value = match.group(3).strip("'\"")
                 else:
                     value = match.group(2).strip("'\"")
-                print(f"DEBUG: Extracted column_candidate: '{column_candidate}', value: '{value}'")
+                logger.debug("Extracted column_candidate: '%s', value: '%s'", column_candidate, value)
                 
                 # Find matching column name
-                matched_column = None
-                for col in column_names:
-                    col_clean = col.lower().replace('_', ' ')
-                    # Check if column_candidate matches the column name
-                    # e.g., "name" should match "organization_name" or "name"
-                    if (column_candidate == col or 
-                        column_candidate in col_clean or 
-                        col_clean.endswith(column_candidate) or
-                        col.endswith('_' + column_candidate)):
-                        matched_column = col
-                        print(f"DEBUG: Matched column '{column_candidate}' to '{col}'")
-                        break
+                # e.g., "name" should match "organization_name" or "name"
+                matched_column = columns.match(column_candidate)
+                if matched_column:
+                    logger.debug("Matched column '%s' to '%s'", column_candidate, matched_column)
                 
                 if matched_column:
                     # Use ILIKE for case-insensitive matching (PostgreSQL)
                     if 'matches' in match.group(0) or 'like' in match.group(0) or 'contains' in match.group(0):
-                        conditions.append(f"{matched_column} ILIKE '%{value}%'")
+                        params.append(f"%{value}%")
+                        conditions.append(f"{matched_column} ILIKE ${len(params)}")
                     else:
-                        conditions.append(f"{matched_column} = '{value}'")
-                    print(f"DEBUG: Extracted condition: {matched_column} matches '{value}'")
+                        conditions.append(f"{matched_column} = {bind(matched_column, value)}")
+                    logger.debug("Extracted condition: %s matches '%s'", matched_column, value)
         
-        print(f"DEBUG: Total conditions found: {len(conditions)}")
-        if conditions:
-            print(f"DEBUG: Final WHERE conditions: {' AND '.join(conditions)}")
+        logger.debug("Total conditions found: %s %s", len(conditions), conditions)
         
         # Pattern: "where X = Y" explicit
         if 'where' in query_lower:
-            where_match = re.search(r'where\s+(\w+)\s*=\s*(["\']?)(\w+)\2', query_lower)
+            where_match = WHERE_PATTERN.search(query_lower)
             if where_match:
                 col = where_match.group(1).lower()
                 val = where_match.group(3)
-                for column in column_names:
-                    if col in column.lower() or column.lower() in col:
-                        conditions.append(f"{column} = '{val}'")
-                        break
+                column = columns.overlapping(col)
+                if column:
+                    conditions.append(f"{column} = {bind(column, val)}")
         
         # Look for common patterns
         if 'status' in query_lower:
             # Try to find status value
             if 'active' in query_lower:
-                status_col = next((col for col in column_names if 'status' in col or col == 'is_active'), 'status')
-                conditions.append(f"{status_col} = 'active'")
+                conditions.append(f"{columns.status_column} = {bind(columns.status_column, 'active')}")
             elif 'inactive' in query_lower:
-                status_col = next((col for col in column_names if 'status' in col or col == 'is_active'), 'status')
-                conditions.append(f"{status_col} = 'inactive'")
+                conditions.append(f"{columns.status_column} = {bind(columns.status_column, 'inactive')}")
         
         if 'id' in query_lower:
             # Try to extract numeric ID
-            numbers = re.findall(r'\bid\s*[=:]\s*(\d+)', query_lower)
+            numbers = ID_VALUE_PATTERN.findall(query_lower)
             if not numbers:
-                numbers = re.findall(r'\b(\d+)\b', query)
+                numbers = NUMBER_PATTERN.findall(query)
             if numbers:
-                id_col = next((col for col in column_names if 'id' in col), 'id')
-                conditions.append(f"{id_col} = {numbers[0]}")
+                conditions.append(f"{columns.id_column} = {bind(columns.id_column, numbers[0])}")
         
-        return " AND ".join(conditions) if conditions else ""
+        return " AND ".join(conditions) if conditions else "", params
     
-    def explain_query(self, sql_query: str, original_query: str) -> str:
+    def chart_aggregate_sql(self, sql_query: str, params: List[Any],
+                            schema_info: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        """Companion SQL that computes a query's bar and pie chart data in the database.
+        
+        Groups the query's rows (all of them, not just the first LIMIT) by its
+        first category column, counting them and summing its first measure
+        column. Returns the SQL, its parameters and the two column names, or
+        None when the query has no category column or is not a plain SELECT.
+        """
+        parsed = parse_generated_query(sql_query, schema_info)
+        if parsed is None:
+            return None
+        category = measure = None
+        for alias, column, _ in parsed.selected_columns():
+            name = column["name"]
+            if column.get("primary_key") or column.get("foreign_key") or name.lower().endswith("id"):
+                continue
+            column_type = str(column.get("type") or "").lower()
+            if category is None and any(word in name.lower() for word in GROUP_COLUMN_WORDS):
+                category = (alias, name)
+            elif measure is None and (is_integer_type(column_type)
+                                      or any(word in column_type for word in MEASURE_TYPES)):
+                measure = (alias, name)
+        if category is None:
+            return None
+        
+        group_by = f"{category[0]}.{category[1]}"
+        select = [f"{group_by} AS label", "COUNT(*) AS count"]
+        if measure:
+            select.append(f"SUM({measure[0]}.{measure[1]}) AS total")
+        where = f" WHERE {parsed.where}" if parsed.where else ""
+        return {
+            "sql": f"SELECT {', '.join(select)} FROM {parsed.source}{where} GROUP BY {group_by};",
+            "params": list(params),
+            "category": category[1],
+            "measure": measure[1] if measure else None
+        }
+    
+    def explain_query(self, sql_query: str, original_query: str, params: Optional[List[Any]] = None) -> str:
         """Generate an explanation of the SQL query"""
-        explanation = f"The query '{original_query}' was translated to:\n\n"
-        explanation += f"```sql\n{sql_query}\n```\n\n"
+        return self._explanation_header(sql_query, original_query, params) + self.describe_sql(sql_query)
+    
+    @staticmethod
+    def _explanation_header(sql_query: str, original_query: str, params: Optional[List[Any]] = None) -> str:
+        header = f"The query '{original_query}' was translated to:\n\n```sql\n{sql_query}\n```\n\n"
+        if params:
+            values = ", ".join(f"${position} = {value!r}" for position, value in enumerate(params, 1))
+            header += f"with parameters {values}.\n\n"
+        return header
+    
+    def describe_sql(self, sql_query: str) -> str:
+        """Describe the clauses used by a SQL query"""
+        explanation = ""
+        sql_upper = sql_query.upper()
         
         # Add basic explanation
-        if 'SELECT' in sql_query.upper():
+        if 'SELECT' in sql_upper:
             explanation += "This query retrieves data from the database. "
         
-        if 'WHERE' in sql_query.upper():
+        if 'WHERE' in sql_upper:
             explanation += "The WHERE clause filters the results based on specific conditions. "
         
-        if 'JOIN' in sql_query.upper():
+        if 'JOIN' in sql_upper:
             explanation += "The JOIN combines data from multiple tables. "
         
-        if 'GROUP BY' in sql_query.upper():
+        if 'GROUP BY' in sql_upper:
             explanation += "The GROUP BY clause groups rows with the same values. "
         
-        if 'ORDER BY' in sql_query.upper():
+        if 'ORDER BY' in sql_upper:
             explanation += "The ORDER BY clause sorts the results. "
         
-        if 'LIMIT' in sql_query.upper():
+        if 'LIMIT' in sql_upper:
             explanation += "The LIMIT clause restricts the number of results returned. "
         
         return explanation
@@ -0,0 +1,56 @@
+import re
+import sys
+from typing import Any, Dict
+
+# Whitespace outside quoted literals and identifiers; quoted text is kept verbatim
+_SQL_TOKENS = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`)|\s+""")
+
+# Only plain reads are cached
+_READ_ONLY_START = re.compile(r"^\s*(select|with)\b", re.IGNORECASE)
+_WRITE_KEYWORDS = re.compile(
+    r"\b(insert|update|delete|merge|upsert|replace|create|alter|drop|truncate|grant|revoke|"
+    r"into|for\s+update|for\s+(?:key\s+)?share|nextval|setval|pg_sleep|sleep|random|now|current_timestamp|"
+    r"current_date|current_time|localtime|localtimestamp)\b",
+    re.IGNORECASE
+)
+# Calls whose result changes from one execution to the next, or that act on the
+# server; matched only as calls so that columns of the same name stay cacheable
+_VOLATILE_CALLS = re.compile(
+    r"\b(rand|uuid|uuid_generate_v[1-5]|gen_random_uuid|newid|sysdate|curdate|curtime|utc_date|utc_time|"
+    r"utc_timestamp|unix_timestamp|clock_timestamp|statement_timestamp|transaction_timestamp|timeofday|"
+    r"currval|lastval|last_insert_id|last_insert_rowid|changes|total_changes|txid_current\w*|"
+    r"pg_current_xact_id\w*|set_config|pg_notify|pg_(?:try_)?advisory\w*|get_lock|release_lock|"
+    r"pg_terminate_backend|pg_cancel_backend|pg_reload_conf|lo_\w+|dblink\w*|benchmark)\s*\(",
+    re.IGNORECASE
+)
+
+# Rows sampled when estimating the memory held by a result
+_SIZE_SAMPLE_ROWS = 32
+
+
+def normalize_sql(query: str) -> str:
+    """Collapse whitespace and drop a trailing semicolon, leaving literals untouched"""
+    normalized = _SQL_TOKENS.sub(lambda m: m.group(1) or " ", query).strip()
+    return normalized.rstrip(";").rstrip()
+
+
+def is_cacheable_query(query: str) -> bool:
+    """SELECT/WITH statements that neither write nor depend on volatile functions"""
+    return (bool(_READ_ONLY_START.match(query)) and not _WRITE_KEYWORDS.search(query)
+            and not _VOLATILE_CALLS.search(query))
+
+
+def estimate_result_bytes(results: Dict[str, Any]) -> int:
+    """Approximate memory held by a result, extrapolated from a sample of rows"""
+    rows = results.get("rows", [])
+    if not rows:
+        return sys.getsizeof(rows)
+    step = max(len(rows) // _SIZE_SAMPLE_ROWS, 1)
+    sample = rows[::step][:_SIZE_SAMPLE_ROWS]
+    sample_bytes = 0
+    for row in sample:
+        sample_bytes += sys.getsizeof(row)
+        # Dict rows share their key strings with every other row
+        for value in (row.values() if isinstance(row, dict) else row):
+            sample_bytes += sys.getsizeof(value)
+    return sys.getsizeof(rows) + sample_bytes * len(rows) // len(sample)
@@ -1,21 +1,66 @@
-from typing import Dict, List, Any
+import os
+from decimal import Decimal
+from typing import Dict, List, Any, Optional
 import json
+from column_profiler import ResultProfile
+from downsampling import lttb, top_k
+
+# Chart payload limits, so chart size no longer grows with the result
+CHART_MAX_POINTS = int(os.getenv("CHART_MAX_POINTS", "500"))
+CHART_MAX_CATEGORIES = int(os.getenv("CHART_MAX_CATEGORIES", "20"))
+CHART_MAX_SLICES = int(os.getenv("CHART_MAX_SLICES", "10"))
+# Compute bar and pie charts with GROUP BY queries run next to the main query,
+# over every matching row instead of the rows that came back
+CHART_PUSHDOWN = os.getenv("CHART_PUSHDOWN", "0") == "1"
 
 
 class ResultVisualizer:
     """Create visualizations from query results"""
     
-    def create_visualizations(self, results: Dict[str, Any]) -> Dict[str, Any]:
-        """Create multiple visualization formats"""
+    def __init__(self, max_points: Optional[int] = None, max_categories: Optional[int] = None,
+                 max_slices: Optional[int] = None, query_generator=None, pushdown: Optional[bool] = None):
+        self.max_points = max_points or CHART_MAX_POINTS
+        self.max_categories = max_categories or CHART_MAX_CATEGORIES
+        self.max_slices = max_slices or CHART_MAX_SLICES
+        self.query_generator = query_generator
+        self.pushdown = CHART_PUSHDOWN if pushdown is None else pushdown
+    
+    def aggregate_query(self, sql_query: str, params: List[Any], schema_info: Dict[str, Any],
+                        pushdown: Optional[bool] = None) -> Optional[Dict[str, Any]]:
+        """The GROUP BY query to run next to sql_query for its charts, or None to chart its rows.
+        
+        pushdown overrides CHART_PUSHDOWN for one request.
+        """
+        if self.query_generator is None or not (self.pushdown if pushdown is None else pushdown):
+            return None
+        return self.query_generator.chart_aggregate_sql(sql_query, params, schema_info)
+    
+    def create_visualizations(self, results: Dict[str, Any],
+                              aggregates: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """Create multiple visualization formats.
+        
+        aggregates is an aggregate_query() with its "results"; when given, the
+        bar and pie charts are built from it instead of from the rows.
+        """
+        # Profile every column once and share it between the charts and the summary
+        profile = ResultProfile(results)
         visualizations = {
             "table": self._create_table_visualization(results),
-            "charts": self._create_chart_visualizations(results),
-            "summary": self._create_summary(results)
+            "charts": self._create_chart_visualizations(profile, aggregates),
+            "summary": self._create_summary(results, profile)
         }
         return visualizations
     
     def _create_table_visualization(self, results: Dict[str, Any]) -> Dict[str, Any]:
         """Create table format"""
+        if results.get("format") == "columnar":
+            # Columnar responses carry the rows once, in results.rows
+            return {
+                "type": "table",
+                "columns": results.get("columns", []),
+                "rows_ref": "results.rows",
+                "row_count": results.get("count", 0)
+            }
         return {
             "type": "table",
             "columns": results.get("columns", []),
@@ -23,7 +68,7 @@ class ResultVisualizer:
             "row_count": results.get("count", 0)
         }
     
-    def _create_summary(self, results: Dict[str, Any]) -> Dict[str, Any]:
+    def _create_summary(self, results: Dict[str, Any], profile: ResultProfile) -> Dict[str, Any]:
         """Create statistical summary"""
         count = results.get("count", 0)
         summary = {
@@ -32,112 +77,115 @@ class ResultVisualizer:
             "columns": results.get("columns", []),
         }
         
-        # Try to calculate numeric statistics
-        rows = results.get("rows", [])
-        if rows and len(rows) > 0:
-            numeric_columns = []
-            for col in results.get("columns", []):
-                # Try to determine if column is numeric
-                if any(row.get(col) and isinstance(row.get(col), (int, float)) for row in rows[:5]):
-                    values = [row.get(col) for row in rows if row.get(col) is not None]
-                    if values:
-                        numeric_columns.append({
-                            "column": col,
-                            "count": len(values),
-                            "min": min(values),
-                            "max": max(values),
-                            "avg": sum(values) / len(values)
-                        })
-            
-            summary["numeric_summary"] = numeric_columns
+        # Numeric statistics for columns that look numeric
+        if profile.row_count > 0:
+            summary["numeric_summary"] = [
+                stats for stats in (column.summary() for column in profile.columns) if stats
+            ]
         
         return summary
     
-    def _create_chart_visualizations(self, results: Dict[str, Any]) -> List[Dict[str, Any]]:
+    def _create_aggregate_charts(self, aggregates: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Bar and pie charts from database-computed (label, count[, total]) rows"""
+        charts = []
+        rows = aggregates["results"].get("rows", [])
+        category = aggregates["category"]
+        measure = aggregates["measure"]
+        
+        if measure:
+            sums = {
+                str(row[0]): float(row[2]) if isinstance(row[2], Decimal) else row[2] or 0
+                for row in rows
+            }
+            data_map = top_k(sums, self.max_categories)
+            if data_map:
+                charts.append({
+                    "type": "bar",
+                    "title": f"{measure} by {category}",
+                    "data": [{"label": k, "value": v} for k, v in data_map.items()],
+                    "total_categories": len(sums),
+                    "source": "database"
+                })
+        
+        counts = {str(row[0]): row[1] for row in rows}
+        data_map = top_k(counts, self.max_slices)
+        if data_map:
+            charts.append({
+                "type": "pie",
+                "title": f"Distribution of {category}",
+                "data": [{"label": k, "value": v} for k, v in data_map.items()],
+                "total_categories": len(counts),
+                "source": "database"
+            })
+        return charts
+    
+    def _create_chart_visualizations(self, profile: ResultProfile,
+                                     aggregates: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
         """Create various chart visualizations"""
         charts = []
-        rows = results.get("rows", [])
         
-        if not rows:
+        if not profile.row_count:
             return charts
         
-        columns = results.get("columns", [])
+        # Bar and pie charts computed by the database replace the ones built from the rows
+        if aggregates is not None:
+            charts.extend(self._create_aggregate_charts(aggregates))
         
         # Detect chart types based on data
         # Bar chart for categorical + numeric
-        categorical_cols = []
-        numeric_cols = []
-        
-        for col in columns:
-            # Check if mostly categorical
-            unique_values = set()
-            for row in rows[:10]:  # Sample first 10 rows
-                val = row.get(col)
-                if val is not None:
-                    unique_values.add(str(val))
-            
-            # If few unique values relative to row count, likely categorical
-            if rows and len(unique_values) < len(rows) / 2:
-                categorical_cols.append(col)
-            
-            # Check if numeric
-            if any(isinstance(row.get(col), (int, float)) for row in rows):
-                numeric_cols.append(col)
+        categorical_cols = profile.categorical() if aggregates is None else []
+        numeric_cols = profile.numeric()
         
         # Bar Chart
         if categorical_cols and numeric_cols:
             cat_col = categorical_cols[0]
             num_col = numeric_cols[0]
             
-            # Aggregate data
-            data_map = {}
-            for row in rows:
-                key = str(row.get(cat_col, ""))
-                val = row.get(num_col, 0)
-                data_map[key] = data_map.get(key, 0) + (val if isinstance(val, (int, float)) else 0)
+            # Aggregate data, keeping the largest groups and folding the rest into "Other"
+            sums = profile.group_sum(cat_col, num_col)
+            data_map = top_k(sums, self.max_categories)
             
             if data_map:
                 charts.append({
                     "type": "bar",
-                    "title": f"{num_col} by {cat_col}",
+                    "title": f"{num_col.name} by {cat_col.name}",
                     "data": [
                         {"label": k, "value": v}
                         for k, v in data_map.items()
-                    ]
+                    ],
+                    "total_categories": len(sums)
                 })
         
         # Pie Chart (for categorical data with counts)
         if categorical_cols:
             cat_col = categorical_cols[0]
-            data_map = {}
-            for row in rows:
-                key = str(row.get(cat_col, ""))
-                data_map[key] = data_map.get(key, 0) + 1
+            data_map = top_k(cat_col.value_counts, self.max_slices)
             
-            if len(data_map) <= 10:  # Only for few categories
+            if data_map:
                 charts.append({
                     "type": "pie",
-                    "title": f"Distribution of {cat_col}",
+                    "title": f"Distribution of {cat_col.name}",
                     "data": [
                         {"label": k, "value": v}
                         for k, v in data_map.items()
-                    ]
+                    ],
+                    "total_categories": len(cat_col.value_counts)
                 })
         
         # Line Chart (for ordered numeric data)
-        if numeric_cols and len(rows) > 1:
+        if numeric_cols and profile.row_count > 1:
             num_col = numeric_cols[0]
-            # Check if data seems sequential
-            values = [row.get(num_col) for row in rows if row.get(num_col) is not None]
+            values = num_col.numbers
             if len(values) >= 2:
+                # Downsample long series to a fixed number of shape-preserving points
                 charts.append({
                     "type": "line",
-                    "title": f"{num_col} over time",
+                    "title": f"{num_col.name} over time",
                     "data": [
                         {"x": i, "y": v}
-                        for i, v in enumerate(values)
-                    ]
+                        for i, v in lttb(values, self.max_points)
+                    ],
+                    "total_points": len(values)
                 })
         
         return charts
-
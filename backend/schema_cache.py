@@ -0,0 +1,117 @@
+import asyncio
+import hashlib
+import json
+import time
+from typing import Any, Callable, Dict, List, Optional
+
+from shared_store import SharedStore, run_off_loop
+
+
+def schema_version(schema: Dict[str, Any]) -> str:
+    """Stable short hash of a schema dict, used to key anything derived from it"""
+    payload = json.dumps(schema, sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode("utf-8")).hexdigest()[:16]
+
+
+class SchemaCache:
+    """Per-connection schema cache with a TTL.
+
+    Each entry holds the schema, its content version and the catalog
+    fingerprint it was built from. Once an entry expires the caller can
+    compare a fresh fingerprint and, if DDL did not change, simply extend
+    the entry with ``touch`` instead of rebuilding it.
+
+    With a SharedStore, schemas built by one worker process are reused by
+    the others instead of each introspecting the database again; the store
+    is read and written in a thread.
+    """
+
+    def __init__(self, ttl_seconds: float = 300, store: Optional[SharedStore] = None):
+        self.ttl_seconds = ttl_seconds
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        # Called with (connection_id, old_version, new_version) when a schema changes
+        self.listeners: List[Callable[[str, Optional[str], Optional[str]], None]] = []
+        self.store = store
+        if store is not None:
+            store.subscribe("schema", self._expire_local)
+
+    async def get(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        """Return the entry for a connection, fresh or expired"""
+        if self.store is not None:
+            await self.store.apoll()
+            if not self.is_fresh(self.entries.get(connection_id)):
+                return await self._adopt_shared(connection_id)
+        return self.entries.get(connection_id)
+
+    async def _adopt_shared(self, connection_id: str) -> Optional[Dict[str, Any]]:
+        """Take a newer schema another process stored, if there is one"""
+        shared = await asyncio.to_thread(self.store.get, "schema", connection_id)
+        entry = self.entries.get(connection_id)
+        if shared is None:
+            return entry
+        stored, _, expires_at = shared
+        if entry is not None and entry["loaded_at"] >= stored["loaded_at"]:
+            return entry
+        adopted = {**stored, "expires_at": time.monotonic() + (expires_at - time.time())}
+        self.entries[connection_id] = adopted
+        old_version = entry["version"] if entry else None
+        if old_version != adopted["version"]:
+            self._notify(connection_id, old_version, adopted["version"])
+        return adopted
+
+    def _expire_local(self, connection_id: Optional[str]):
+        """Another process changed a schema: look in the store on the next lookup"""
+        for cid, entry in self.entries.items():
+            if connection_id is None or cid == connection_id:
+                entry["expires_at"] = 0
+
+    def is_fresh(self, entry: Optional[Dict[str, Any]]) -> bool:
+        return entry is not None and entry["expires_at"] > time.monotonic()
+
+    async def put(self, connection_id: str, schema: Dict[str, Any],
+                  fingerprint: Optional[str] = None) -> Dict[str, Any]:
+        """Store a freshly introspected schema"""
+        old = self.entries.get(connection_id)
+        entry = {
+            "schema": schema,
+            "version": schema_version(schema),
+            "fingerprint": fingerprint,
+            "loaded_at": time.time(),
+            "expires_at": time.monotonic() + self.ttl_seconds
+        }
+        self.entries[connection_id] = entry
+        old_version = old["version"] if old else None
+        if self.store is not None:
+            shared = {key: value for key, value in entry.items() if key != "expires_at"}
+            changed = old_version is not None and old_version != entry["version"]
+            await asyncio.to_thread(self._share, connection_id, shared, changed)
+        if old_version != entry["version"]:
+            self._notify(connection_id, old_version, entry["version"])
+        return entry
+
+    def _share(self, connection_id: str, shared: Dict[str, Any], changed: bool):
+        self.store.put("schema", connection_id, shared, group=connection_id, ttl_seconds=self.ttl_seconds)
+        if changed:
+            self.store.publish("schema", connection_id)
+
+    def touch(self, connection_id: str):
+        """Extend an entry's TTL after confirming the catalog is unchanged"""
+        entry = self.entries.get(connection_id)
+        if entry is not None:
+            entry["expires_at"] = time.monotonic() + self.ttl_seconds
+
+    def invalidate(self, connection_id: str):
+        """Drop the cached schema for a connection"""
+        old = self.entries.pop(connection_id, None)
+        if self.store is not None:
+            run_off_loop(self.store.purge, "schema", connection_id)
+        if old is not None:
+            self._notify(connection_id, old["version"], None)
+
+    def version(self, connection_id: str) -> Optional[str]:
+        entry = self.entries.get(connection_id)
+        return entry["version"] if entry else None
+
+    def _notify(self, connection_id: str, old_version: Optional[str], new_version: Optional[str]):
+        for listener in self.listeners:
+            listener(connection_id, old_version, new_version)
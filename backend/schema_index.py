@@ -0,0 +1,525 @@
+import datetime
+import heapq
+import math
+import re
+from collections import deque
+from decimal import Decimal
+from typing import Any, Dict, List, Optional, Tuple
+
+# Entity words the generator maps onto the core business tables
+ORG_WORDS = ("organisation", "organization", "oragnisation")
+
+# Relevance weights of a query word naming a table and naming one of its columns
+TABLE_TOKEN_WEIGHT = 3.0
+COLUMN_TOKEN_WEIGHT = 1.0
+# Tables scored per query word, so scoring cost does not grow with the catalog
+TOKEN_POSTING_LIMIT = 64
+# Column words in more tables than this (id, name, status...) say nothing about the table
+COLUMN_TOKEN_MAX_TABLES = 64
+# Trigram similarity a misspelt word needs to count as a table name word
+FUZZY_MIN_SIMILARITY = 0.5
+FUZZY_MIN_LENGTH = 4
+
+# Words in identifiers: snake_case parts and camelCase humps
+IDENTIFIER_WORD = re.compile(r'[A-Z]+(?![a-z])|[A-Z]?[a-z]+|\d+')
+QUERY_WORD = re.compile(r'[a-z0-9]+')
+
+# Words accepted as boolean column values
+BOOLEAN_WORDS = {"true": True, "t": True, "yes": True, "1": True,
+                 "false": False, "f": False, "no": False, "0": False}
+
+# Words marking a column as a category to group by (status, card_type...)
+GROUP_COLUMN_WORDS = ("type", "category", "status", "group")
+# Declared types besides integers that hold measures a chart can sum
+MEASURE_TYPES = ("numeric", "decimal", "real", "double", "float", "money")
+# Integer type names across PostgreSQL, MySQL and SQLite; matched by name, as
+# "int" also occurs in interval, point and others
+INTEGER_TYPES = {"int", "integer", "bigint", "smallint", "tinyint", "mediumint", "int2", "int4", "int8"}
+TYPE_NAME = re.compile(r'(?:unsigned\s+)?([a-z]+\d*)(?!\[)')
+# Date and time type names; asyncpg takes date/datetime/time objects for them, not strings
+DATE_TYPES = {"date"}
+TIMESTAMP_TYPES = {"timestamp", "timestamptz", "datetime"}
+TIME_TYPES = {"time", "timetz"}
+
+# Short words that cannot be used as table aliases
+RESERVED_ALIASES = {"as", "at", "by", "do", "if", "in", "is", "no", "of", "on", "or", "to"}
+
+
+def type_name(column_type: str) -> str:
+    """Base name of a declared column type ("int" for int(11) unsigned, "timestamp"
+    for timestamp with time zone), or "" """
+    match = TYPE_NAME.match(column_type.strip().lower())
+    return match.group(1) if match else ""
+
+
+def is_integer_type(column_type: str) -> bool:
+    """Whether a declared column type (integer, int(11), bigint unsigned, INT8...) holds integers"""
+    return type_name(column_type) in INTEGER_TYPES
+
+
+def parse_temporal(column_type: str, value: str) -> Any:
+    """The date, datetime or time an ISO 8601 value stands for in a column of
+    column_type, read the way PostgreSQL reads a literal; ValueError if it is not one"""
+    name = type_name(column_type)
+    with_zone = name.endswith("tz") or "with time zone" in column_type.lower()
+    value = value.strip().upper()
+    if name in DATE_TYPES:
+        return datetime.datetime.fromisoformat(value).date()
+    if name in TIMESTAMP_TYPES:
+        parsed = datetime.datetime.fromisoformat(value)
+        # A timestamp without time zone ignores the offset of a literal
+        return parsed if with_zone else parsed.replace(tzinfo=None)
+    if name in TIME_TYPES:
+        parsed = datetime.time.fromisoformat(value)
+        return parsed.replace(tzinfo=datetime.timezone.utc) if with_zone and parsed.tzinfo is None else parsed
+    raise ValueError(f"{column_type} is not a date or time type")
+
+
+def singular(name: str) -> str:
+    """Convert plural to singular"""
+    if name.endswith('ies'):
+        return name[:-3] + 'y'
+    elif name.endswith('s') and not name.endswith('ss'):
+        return name[:-1]
+    return name
+
+
+def table_alias(table: str, used: set) -> str:
+    """Short alias for a table (the initials of its words) not already in used"""
+    base = ''.join(part[0] for part in table.lower().split('_') if part)
+    if not base.isidentifier() or base in RESERVED_ALIASES:
+        base = 't'
+    alias, suffix = base, 2
+    while alias in used:
+        alias, suffix = f"{base}{suffix}", suffix + 1
+    return alias
+
+
+def _substrings(word: str):
+    """Every non-empty substring of a word"""
+    for start in range(len(word)):
+        for end in range(start + 1, len(word) + 1):
+            yield word[start:end]
+
+
+class NameMatcher:
+    """Find which of a fixed list of names occur as substrings of a text.
+
+    Only offsets where some name's first two characters occur are probed,
+    once per distinct name length, so a lookup costs O(len(text) x lengths)
+    dict probes at worst however many names there are.
+    """
+
+    def __init__(self, names: Dict[str, int]):
+        # name -> position of the first entry it stands for
+        self.names = names
+        self.lengths = sorted({len(name) for name in names})
+        self.prefixes = {name[:2] for name in names}
+
+    def positions(self, text: str) -> List[int]:
+        """Positions of every entry with a name inside text, in entry order"""
+        found = set()
+        names = self.names
+        prefixes = self.prefixes
+        end = len(text)
+        for start in range(end):
+            if text[start:start + 2] not in prefixes and text[start] not in prefixes:
+                continue
+            for length in self.lengths:
+                if start + length > end:
+                    break
+                position = names.get(text[start:start + length])
+                if position is not None:
+                    found.add(position)
+        return sorted(found)
+
+
+class TableColumns:
+    """Lookup structures for one table's columns, built on first use"""
+
+    def __init__(self, schema_columns: List[Any]):
+        self.names = [col['name'].lower() if isinstance(col, dict) else str(col).lower()
+                      for col in schema_columns]
+        self.original_names = [col['name'] for col in schema_columns if isinstance(col, dict)]
+        # Lower-case column name -> lower-case declared type ("" when unknown)
+        self.types = {col['name'].lower(): str(col.get('type') or '').lower()
+                      for col in schema_columns if isinstance(col, dict)}
+
+        # Candidate word -> first column it refers to: the exact name, any
+        # substring of a word in the name, or any suffix after an underscore
+        self.by_word: Dict[str, str] = {}
+        # Substring of a full column name -> first column containing it
+        self.by_substring: Dict[str, int] = {}
+        # Full column name -> first position
+        self.by_name: Dict[str, int] = {}
+        for position, col in enumerate(self.names):
+            self.by_word.setdefault(col, col)
+            for word in col.replace('_', ' ').split(' '):
+                for part in _substrings(word):
+                    self.by_word.setdefault(part, col)
+            for i, char in enumerate(col):
+                if char == '_':
+                    self.by_word.setdefault(col[i + 1:], col)
+            for part in _substrings(col):
+                self.by_substring.setdefault(part, position)
+            self.by_name.setdefault(col, position)
+
+        self.status_column = next((col for col in self.names if 'status' in col or col == 'is_active'), 'status')
+        self.id_column = next((col for col in self.names if 'id' in col), 'id')
+        self.order_column = ('id' if 'id' in self.original_names
+                             else self.original_names[0] if self.original_names else 'id')
+        self.group_columns = [c for c in self.original_names
+                              if any(word in c.lower() for word in GROUP_COLUMN_WORDS)]
+
+    def bind_value(self, column: str, value: str) -> Any:
+        """A value typed the way the driver expects for the column (drivers type bind
+        parameters strictly, unlike quoted SQL literals)"""
+        column_type = self.types.get(column, '')
+        name = type_name(column_type)
+        try:
+            if 'bool' in column_type:
+                return BOOLEAN_WORDS.get(value.lower(), value)
+            if name in INTEGER_TYPES:
+                return int(value)
+            if name in DATE_TYPES or name in TIMESTAMP_TYPES or name in TIME_TYPES:
+                return parse_temporal(column_type, value)
+            if any(name in column_type for name in ('numeric', 'decimal')):
+                return Decimal(value)
+            if any(name in column_type for name in ('real', 'double', 'float')):
+                return float(value)
+        except (ValueError, ArithmeticError):
+            pass
+        return value
+
+    def match(self, candidate: str) -> Optional[str]:
+        """First column named by a word such as "name" (matches organization_name)"""
+        return self.by_word.get(candidate)
+
+    def overlapping(self, candidate: str) -> Optional[str]:
+        """First column that contains the candidate or is contained in it"""
+        positions = []
+        position = self.by_substring.get(candidate)
+        if position is not None:
+            positions.append(position)
+        for part in _substrings(candidate):
+            position = self.by_name.get(part)
+            if position is not None:
+                positions.append(position)
+        return self.names[min(positions)] if positions else None
+
+
+# (child table, child column, parent table, parent column): child.column = parent.column
+JoinEdge = Tuple[str, str, str, str]
+
+
+class JoinGraph:
+    """Which tables can be joined to which, and on what columns.
+
+    Edges come from declared foreign keys, plus a naming convention for
+    schemas that declare none: a column ``<name>_id`` (or ``<prefix>_<name>_id``)
+    refers to the table called ``<name>`` or its plural, on the column of the
+    same name, else on ``id`` or the table's single primary key column.
+    Shortest join paths from a table are found by BFS the first time that
+    table starts a join and reused for the rest of the schema version.
+    """
+
+    def __init__(self, schema_info: Dict[str, Any], tables: List[str]):
+        self.adjacency: Dict[str, List[Tuple[str, JoinEdge]]] = {table: [] for table in tables}
+        # Root table -> {table: (previous table, edge, hops from the root)}
+        self._paths: Dict[str, Dict[str, Tuple[Optional[str], Optional[JoinEdge], int]]] = {}
+
+        by_name: Dict[str, str] = {}
+        for table in tables:
+            by_name.setdefault(table.lower(), table)
+            by_name.setdefault(singular(table.lower()), table)
+        columns = {table: _column_names(schema_info.get(table, [])) for table in tables}
+        keys = {table: [col['name'] for col in schema_info.get(table, [])
+                        if isinstance(col, dict) and col.get('primary_key')]
+                for table in tables}
+
+        declared = set()
+        for table in tables:
+            for col in schema_info.get(table, []):
+                reference = col.get('foreign_key') if isinstance(col, dict) else None
+                if not reference or reference.get('table') not in self.adjacency:
+                    continue
+                declared.add((table, col['name'].lower()))
+                self._add_edge((table, col['name'], reference['table'], reference['column']))
+
+        for table in tables:
+            for name in columns[table]:
+                name_lower = name.lower()
+                if not name_lower.endswith('_id') or (table, name_lower) in declared:
+                    continue
+                target = self._conventional_target(table, name_lower[:-3], by_name, columns, keys)
+                if target is not None:
+                    self._add_edge((table, name) + target)
+
+    @staticmethod
+    def _conventional_target(table: str, stem: str, by_name: Dict[str, str], columns: Dict[str, List[str]],
+                             keys: Dict[str, List[str]]) -> Optional[Tuple[str, str]]:
+        """(table, column) a <stem>_id column refers to, trying the longest name first"""
+        parts = stem.split('_')
+        for start in range(len(parts)):
+            parent = by_name.get('_'.join(parts[start:]))
+            if parent is None or parent == table:
+                continue
+            lower = {name.lower(): name for name in columns[parent]}
+            column = lower.get(stem + '_id') or lower.get('id')
+            if column is None and len(keys[parent]) == 1:
+                column = keys[parent][0]
+            if column is not None:
+                return parent, column
+        return None
+
+    def _add_edge(self, edge: JoinEdge):
+        child, _, parent, _ = edge
+        if child == parent:
+            return
+        self.adjacency[child].append((parent, edge))
+        self.adjacency[parent].append((child, edge))
+
+    def _tree(self, root: str) -> Dict[str, Tuple[Optional[str], Optional[JoinEdge], int]]:
+        """BFS from root: table -> (previous table, edge, hops) on a shortest path"""
+        tree = self._paths.get(root)
+        if tree is None:
+            tree = {root: (None, None, 0)}
+            queue = deque([root])
+            while queue:
+                table = queue.popleft()
+                hops = tree[table][2] + 1
+                for neighbour, edge in self.adjacency[table]:
+                    if neighbour not in tree:
+                        tree[neighbour] = (table, edge, hops)
+                        queue.append(neighbour)
+            self._paths[root] = tree
+        return tree
+
+    def distance(self, source: str, target: str) -> Optional[int]:
+        step = self._tree(source).get(target)
+        return step[2] if step else None
+
+    def plan(self, tables: List[str]) -> List[Tuple[str, str, JoinEdge]]:
+        """Join steps connecting tables to tables[0], shortest paths first found.
+
+        Each step is (table already joined, table to join, edge). Tables the
+        first one cannot reach are left out; intermediate tables on a path
+        are joined as well.
+        """
+        root = tables[0]
+        tree = self._tree(root)
+        joined = {root}
+        steps = []
+        for table in tables[1:]:
+            if table not in tree or table in joined:
+                continue
+            path = []
+            while table not in joined:
+                previous, edge, _ = tree[table]
+                path.append((previous, table, edge))
+                table = previous
+            for step in reversed(path):
+                joined.add(step[1])
+                steps.append(step)
+        return steps
+
+
+def _column_names(schema_columns: List[Any]) -> List[str]:
+    return [col['name'] if isinstance(col, dict) else str(col) for col in schema_columns]
+
+
+def identifier_words(name: str) -> List[str]:
+    """Lower-case words of an identifier, with their singular forms, numbers and letters left out"""
+    words = []
+    for word in IDENTIFIER_WORD.findall(name):
+        word = word.lower()
+        if len(word) < 2 or word.isdigit():
+            continue
+        for form in (word, singular(word)):
+            if form not in words:
+                words.append(form)
+    return words
+
+
+def trigrams(word: str) -> set:
+    padded = f" {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class RelevanceIndex:
+    """Scores how relevant each table is to a question.
+
+    Question words are matched against the words of table and column names,
+    and misspelt words (walets) against table name words by trigram
+    similarity. Matches are weighted by how few tables share the word.
+    Every word's posting list is capped, so ranking a question costs the
+    same on a catalog of thousands of tables as on a small one.
+    """
+
+    def __init__(self, schema_info: Dict[str, Any], tables: List[str]):
+        self.tables = tables
+        # word -> [(table position, weight)] of tables with the word in their name / a column name
+        self.name_postings: Dict[str, List[Tuple[int, float]]] = {}
+        self.column_postings: Dict[str, List[Tuple[int, float]]] = {}
+        # Table name words, and trigram -> ids of those words
+        self.table_words: List[str] = []
+        self.word_trigrams: List[set] = []
+        self.by_trigram: Dict[str, List[int]] = {}
+
+        table_postings: Dict[str, List[int]] = {}
+        column_postings: Dict[str, List[int]] = {}
+        for position, table in enumerate(tables):
+            name_words = identifier_words(table)
+            for word in name_words:
+                table_postings.setdefault(word, []).append(position)
+            seen = set(name_words)
+            for name in _column_names(schema_info.get(table, [])):
+                for word in identifier_words(name):
+                    if word not in seen:
+                        seen.add(word)
+                        column_postings.setdefault(word, []).append(position)
+
+        total = len(tables) + 1
+        for word, positions in table_postings.items():
+            # Shorter table names first: "wallets" is what "wallet" means, not "wallet_audit_log"
+            positions.sort(key=lambda p: (len(tables[p]), p))
+            weight = TABLE_TOKEN_WEIGHT * math.log(1 + total / len(positions))
+            self.name_postings[word] = [(p, weight) for p in positions[:TOKEN_POSTING_LIMIT]]
+            word_id = len(self.table_words)
+            self.table_words.append(word)
+            self.word_trigrams.append(trigrams(word))
+            for gram in self.word_trigrams[word_id]:
+                self.by_trigram.setdefault(gram, []).append(word_id)
+        for word, positions in column_postings.items():
+            if len(positions) > COLUMN_TOKEN_MAX_TABLES:
+                continue
+            weight = COLUMN_TOKEN_WEIGHT * math.log(1 + total / len(positions))
+            self.column_postings[word] = [(p, weight) for p in positions]
+
+    def _similar_table_words(self, word: str) -> List[Tuple[str, float]]:
+        """Table name words spelt like word, with their trigram similarity"""
+        grams = trigrams(word)
+        shared: Dict[int, int] = {}
+        for gram in grams:
+            postings = self.by_trigram.get(gram, ())
+            if len(postings) > TOKEN_POSTING_LIMIT:
+                continue
+            for word_id in postings:
+                shared[word_id] = shared.get(word_id, 0) + 1
+        similar = []
+        for word_id, count in shared.items():
+            similarity = count / (len(grams) + len(self.word_trigrams[word_id]) - count)
+            if similarity >= FUZZY_MIN_SIMILARITY:
+                similar.append((self.table_words[word_id], similarity))
+        return similar
+
+    def _position_scores(self, query_lower: str) -> Dict[int, float]:
+        """Score per table position, for tables whose name the question matches"""
+        scores: Dict[int, float] = {}
+        named = set()
+        for word in dict.fromkeys(QUERY_WORD.findall(query_lower)):
+            forms = dict.fromkeys((word, singular(word)))
+            matches = [(form, 1.0) for form in forms if form in self.name_postings or form in self.column_postings]
+            if not matches and len(word) >= FUZZY_MIN_LENGTH:
+                matches = self._similar_table_words(word)
+            # Each word counts once per table, by its best match
+            best: Dict[int, float] = {}
+            for form, similarity in matches:
+                for postings, in_name in ((self.name_postings.get(form, ()), True),
+                                          (self.column_postings.get(form, ()), False)):
+                    for position, weight in postings:
+                        score = weight * similarity
+                        if score > best.get(position, 0.0):
+                            best[position] = score
+                    if in_name:
+                        named.update(position for position, _ in postings)
+            for position, score in best.items():
+                scores[position] = scores.get(position, 0.0) + score
+        # Column words only rank tables the question names
+        return {position: score for position, score in scores.items() if position in named}
+
+    def scores(self, query_lower: str) -> Dict[str, float]:
+        """Relevance of the tables whose name (or a misspelling of it) the question contains"""
+        return {self.tables[p]: score for p, score in self._position_scores(query_lower).items()}
+
+    def top(self, query_lower: str, k: int) -> List[str]:
+        """The k most relevant tables, best first (schema order on ties)"""
+        scores = self._position_scores(query_lower)
+        return [self.tables[p] for p in heapq.nsmallest(k, scores, key=lambda p: (-scores[p], p))]
+
+
+class SchemaIndex:
+    """Schema-derived lookup structures for QueryGenerator.
+
+    Built once per schema version so translating a query costs roughly
+    O(query length) instead of rescanning every table and column.
+    """
+
+    def __init__(self, schema_info: Dict[str, Any]):
+        self.schema_info = schema_info
+        self.tables = list(schema_info.keys())
+        self.positions = {table: position for position, table in enumerate(self.tables)}
+        self.lower_tables = {table.lower() for table in self.tables}
+
+        # Tables mentioned by name, including singular/plural variants
+        mentions: Dict[str, int] = {}
+        exact: Dict[str, int] = {}
+        for position, table in enumerate(self.tables):
+            table_lower = table.lower()
+            table_singular = singular(table_lower)
+            variants = [table_lower, table_singular, table_singular + 's', table_lower + 's']
+            if table_lower.endswith('s'):
+                variants.append(table_lower[:-1])
+            for variant in variants:
+                if variant:
+                    mentions.setdefault(variant, position)
+            exact.setdefault(table_lower, position)
+        self._mentions = NameMatcher(mentions)
+        self._exact = NameMatcher(exact)
+
+        # Tables related to each core entity, for widening single-table matches
+        self.wallet_tables = [t for t in self.tables if 'wallet' in t.lower()]
+        self.vcc_tables = [t for t in self.tables if 'vcc' in t.lower()]
+        self.org_tables = [t for t in self.tables
+                           if any(word in t.lower() for word in ('org', 'organisation', 'organization'))]
+
+        self._columns: Dict[str, TableColumns] = {}
+        self._join_graph: Optional[JoinGraph] = None
+        self._relevance: Optional[RelevanceIndex] = None
+
+    @property
+    def relevance(self) -> RelevanceIndex:
+        """Table relevance scoring, built the first time a question needs it"""
+        if self._relevance is None:
+            self._relevance = RelevanceIndex(self.schema_info, self.tables)
+        return self._relevance
+
+    @property
+    def join_graph(self) -> JoinGraph:
+        """Join edges between the tables, built the first time a join is generated"""
+        if self._join_graph is None:
+            self._join_graph = JoinGraph(self.schema_info, self.tables)
+        return self._join_graph
+
+    def has_table(self, table_lower: str) -> bool:
+        return table_lower in self.lower_tables
+
+    def in_schema_order(self, tables) -> List[str]:
+        return sorted(tables, key=self.positions.__getitem__)
+
+    def mentioned_tables(self, query_lower: str) -> List[str]:
+        """Tables whose name or singular/plural form appears in the query, in schema order"""
+        return [self.tables[p] for p in self._mentions.positions(query_lower)]
+
+    def first_table_in(self, query_lower: str) -> Optional[str]:
+        """First table (in schema order) whose exact name appears in the query"""
+        positions = self._exact.positions(query_lower)
+        return self.tables[positions[0]] if positions else None
+
+    def columns(self, table: str) -> TableColumns:
+        """Column lookups for a table, built the first time it is queried"""
+        columns = self._columns.get(table)
+        if columns is None:
+            columns = TableColumns(self.schema_info.get(table, []))
+            self._columns[table] = columns
+        return columns
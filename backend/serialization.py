@@ -0,0 +1,67 @@
+import base64
+import datetime
+import decimal
+import uuid
+from typing import Any, Dict
+
+
+def json_default(value: Any) -> Any:
+    """json.dumps fallback for database values, matching FastAPI's jsonable_encoder"""
+    if isinstance(value, decimal.Decimal):
+        return float(value)
+    if isinstance(value, (datetime.datetime, datetime.date, datetime.time)):
+        return value.isoformat()
+    if isinstance(value, datetime.timedelta):
+        return value.total_seconds()
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        try:
+            return bytes(value).decode("utf-8")
+        except UnicodeDecodeError:
+            return base64.b64encode(bytes(value)).decode("ascii")
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+def encode_tagged(value: Any) -> Any:
+    """json.dumps fallback that tags the values JSON can't carry, so decode_tagged
+    restores them with the same type"""
+    if isinstance(value, decimal.Decimal):
+        return {"$decimal": str(value)}
+    if isinstance(value, datetime.datetime):
+        return {"$datetime": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"$date": value.isoformat()}
+    if isinstance(value, datetime.time):
+        return {"$time": value.isoformat()}
+    if isinstance(value, datetime.timedelta):
+        return {"$timedelta": value.total_seconds()}
+    if isinstance(value, uuid.UUID):
+        return {"$uuid": str(value)}
+    if isinstance(value, (bytes, bytearray, memoryview)):
+        return {"$bytes": base64.b64encode(bytes(value)).decode("ascii")}
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    return str(value)
+
+
+_TAG_DECODERS = {
+    "$decimal": decimal.Decimal,
+    "$datetime": datetime.datetime.fromisoformat,
+    "$date": datetime.date.fromisoformat,
+    "$time": datetime.time.fromisoformat,
+    "$timedelta": lambda seconds: datetime.timedelta(seconds=seconds),
+    "$uuid": uuid.UUID,
+    "$bytes": base64.b64decode,
+}
+
+
+def decode_tagged(value: Dict[str, Any]) -> Any:
+    """json.loads object_hook reversing encode_tagged"""
+    if len(value) == 1:
+        tag, encoded = next(iter(value.items()))
+        if tag in _TAG_DECODERS:
+            return _TAG_DECODERS[tag](encoded)
+    return value
@@ -0,0 +1,276 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Callable, Dict, Hashable, List, Optional, Tuple
+
+from serialization import decode_tagged, encode_tagged
+from structured_logging import get_logger
+
+logger = get_logger(__name__)
+
+# Cache entries shared by every worker process on the host (empty = each process caches alone)
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "")
+# Purges made by other workers reach this one's in-memory caches within this many seconds
+SHARED_CACHE_SYNC_SECONDS = float(os.getenv("SHARED_CACHE_SYNC_SECONDS", "1"))
+SHARED_CACHE_MAX_BYTES = int(os.getenv("SHARED_CACHE_MAX_BYTES", str(256 * 1024 * 1024)))
+# Larger entries (big result sets) stay in the process that computed them
+SHARED_CACHE_MAX_ENTRY_BYTES = int(os.getenv("SHARED_CACHE_MAX_ENTRY_BYTES", str(256 * 1024)))
+# How long to wait for another worker's write lock; a busy store counts as a miss
+SHARED_CACHE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SHARED_CACHE_BUSY_TIMEOUT_SECONDS", "0.05"))
+SHARED_CACHE_MAINTENANCE_SECONDS = 60
+# Invalidations are kept this long for workers that have not polled in a while
+INVALIDATION_RETENTION_SECONDS = 24 * 3600
+
+STORE_SCHEMA = """
+    CREATE TABLE IF NOT EXISTS entries (
+        namespace TEXT NOT NULL,
+        key TEXT NOT NULL,
+        grp TEXT,
+        value BLOB NOT NULL,
+        size INTEGER NOT NULL,
+        stored_at REAL NOT NULL,
+        expires_at REAL,
+        PRIMARY KEY (namespace, key)
+    );
+    CREATE INDEX IF NOT EXISTS entries_group ON entries (namespace, grp);
+    CREATE TABLE IF NOT EXISTS invalidations (
+        id INTEGER PRIMARY KEY AUTOINCREMENT,
+        namespace TEXT NOT NULL,
+        grp TEXT,
+        origin TEXT NOT NULL,
+        created_at REAL NOT NULL
+    );
+"""
+
+
+class SharedStore:
+    """Cache entries shared by worker processes through a local SQLite file.
+
+    Entries live in namespaces ("schema", "translations", "results") and
+    belong to a group (a connection id or schema version) that is purged
+    as a unit. Processes keep their own in-memory copies; purges are logged
+    so that ``poll`` can apply other processes' purges to those copies.
+
+    Every method blocks on SQLite, so async callers run them in a thread
+    (``apoll`` does so itself). A store locked by another writer for longer
+    than the busy timeout is treated as a miss instead of waiting.
+
+    Values are stored as JSON (results, schemas and translations are
+    JSON-shaped), never pickled: whoever can write the file can poison the
+    caches but not run code in the workers. The file is created private to
+    the user running the server.
+    """
+
+    def __init__(self, path: str, sync_interval: float = SHARED_CACHE_SYNC_SECONDS,
+                 max_bytes: int = SHARED_CACHE_MAX_BYTES,
+                 max_entry_bytes: int = SHARED_CACHE_MAX_ENTRY_BYTES,
+                 busy_timeout: float = SHARED_CACHE_BUSY_TIMEOUT_SECONDS):
+        self.path = path
+        self.sync_interval = sync_interval
+        self.max_bytes = max_bytes
+        self.max_entry_bytes = max_entry_bytes
+        # Identifies this process's own invalidations, which it has already applied
+        self.origin = uuid.uuid4().hex
+        self._subscribers: Dict[str, List[Callable[[Optional[str]], None]]] = {}
+        self._lock = threading.Lock()
+        if not os.path.exists(path):
+            os.close(os.open(path, os.O_WRONLY | os.O_CREAT, 0o600))
+        # Workers starting together may wait on each other to create the schema
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(STORE_SCHEMA)
+        self._last_invalidation = self._conn.execute(
+            "SELECT COALESCE(MAX(id), 0) FROM invalidations"
+        ).fetchone()[0]
+        self._conn.execute(f"PRAGMA busy_timeout = {int(busy_timeout * 1000)}")
+        self._next_poll = 0.0
+
+    @staticmethod
+    def _encode_key(key: Hashable) -> str:
+        return json.dumps(key, default=str)
+
+    def get(self, namespace: str, key: Hashable) -> Optional[Tuple[Any, int, Optional[float]]]:
+        """(value, size, expires_at wall-clock time) of a live entry, or None"""
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, size, expires_at FROM entries WHERE namespace = ? AND key = ?",
+                    (namespace, self._encode_key(key))
+                ).fetchone()
+        except sqlite3.OperationalError as e:
+            logger.debug("Shared cache busy, treating %s lookup as a miss: %s", namespace, e)
+            return None
+        if row is None:
+            return None
+        value, size, expires_at = row
+        if expires_at is not None and expires_at <= time.time():
+            return None
+        try:
+            return json.loads(value, object_hook=decode_tagged), size, expires_at
+        except ValueError as e:
+            logger.debug("Unreadable shared %s entry, treating it as a miss: %s", namespace, e)
+            return None
+
+    def put(self, namespace: str, key: Hashable, value: Any, group: Optional[str] = None,
+            size: int = 0, ttl_seconds: Optional[float] = None) -> bool:
+        """Store an entry; False if it is over max_entry_bytes or the store was busy"""
+        if size > self.max_entry_bytes:
+            return False
+        now = time.time()
+        blob = json.dumps(value, default=encode_tagged, separators=(",", ":")).encode("utf-8")
+        if len(blob) > self.max_entry_bytes:
+            return False
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                    (namespace, self._encode_key(key), group, blob, size, now,
+                     now + ttl_seconds if ttl_seconds else None)
+                )
+        except sqlite3.OperationalError as e:
+            logger.debug("Shared cache busy, not sharing a %s entry: %s", namespace, e)
+            return False
+        return True
+
+    def purge(self, namespace: str, group: Optional[str] = None) -> int:
+        """Delete a group's entries (all of the namespace if None) and tell the other processes"""
+        try:
+            with self._lock:
+                if group is None:
+                    cursor = self._conn.execute("DELETE FROM entries WHERE namespace = ?", (namespace,))
+                else:
+                    cursor = self._conn.execute(
+                        "DELETE FROM entries WHERE namespace = ? AND grp = ?", (namespace, group)
+                    )
+                self._log_invalidation(namespace, group)
+        except sqlite3.OperationalError as e:
+            logger.warning("Shared cache busy, could not purge %s/%s: %s", namespace, group, e)
+            return 0
+        return cursor.rowcount
+
+    def publish(self, namespace: str, group: Optional[str] = None):
+        """Tell the other processes their copies of a group are stale, keeping the stored entries"""
+        try:
+            with self._lock:
+                self._log_invalidation(namespace, group)
+        except sqlite3.OperationalError as e:
+            logger.warning("Shared cache busy, could not publish %s/%s: %s", namespace, group, e)
+
+    def _log_invalidation(self, namespace: str, group: Optional[str]):
+        self._conn.execute(
+            "INSERT INTO invalidations (namespace, grp, origin, created_at) VALUES (?, ?, ?, ?)",
+            (namespace, group, self.origin, time.time())
+        )
+
+    def subscribe(self, namespace: str, callback: Callable[[Optional[str]], None]):
+        """Call callback(group) when another process purges or publishes in a namespace"""
+        self._subscribers.setdefault(namespace, []).append(callback)
+
+    def poll(self):
+        """Apply other processes' invalidations, at most once per sync interval"""
+        if self._poll_due():
+            self._apply_invalidations(self._read_invalidations())
+
+    async def apoll(self):
+        """poll() with the store read in a thread; subscribers still run on the event loop"""
+        if self._poll_due():
+            self._apply_invalidations(await asyncio.to_thread(self._read_invalidations))
+
+    def _poll_due(self) -> bool:
+        now = time.monotonic()
+        if now < self._next_poll:
+            return False
+        self._next_poll = now + self.sync_interval
+        return True
+
+    def _read_invalidations(self) -> List[Tuple[int, str, Optional[str], str]]:
+        try:
+            with self._lock:
+                return self._conn.execute(
+                    "SELECT id, namespace, grp, origin FROM invalidations WHERE id > ? ORDER BY id",
+                    (self._last_invalidation,)
+                ).fetchall()
+        except sqlite3.OperationalError as e:
+            # Picked up on the next poll
+            logger.debug("Shared cache busy, skipping poll: %s", e)
+            return []
+
+    def _apply_invalidations(self, rows: List[Tuple[int, str, Optional[str], str]]):
+        for invalidation_id, namespace, group, origin in rows:
+            if invalidation_id <= self._last_invalidation:
+                continue
+            self._last_invalidation = invalidation_id
+            if origin == self.origin:
+                continue
+            for callback in self._subscribers.get(namespace, []):
+                callback(group)
+
+    def prune(self) -> int:
+        """Drop expired entries, then the oldest ones while over the size budget"""
+        now = time.time()
+        with self._lock:
+            removed = self._conn.execute(
+                "DELETE FROM entries WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+            self._conn.execute(
+                "DELETE FROM invalidations WHERE created_at < ?", (now - INVALIDATION_RETENTION_SECONDS,)
+            )
+            total = self._conn.execute("SELECT COALESCE(SUM(LENGTH(value)), 0) FROM entries").fetchone()[0]
+            if total > self.max_bytes:
+                rows = self._conn.execute(
+                    "SELECT rowid, LENGTH(value) FROM entries ORDER BY stored_at"
+                ).fetchall()
+                evicted = []
+                for rowid, length in rows:
+                    if total <= self.max_bytes:
+                        break
+                    evicted.append((rowid,))
+                    total -= length
+                self._conn.executemany("DELETE FROM entries WHERE rowid = ?", evicted)
+                removed += len(evicted)
+        return removed
+
+    async def run_maintenance(self, interval: float = SHARED_CACHE_MAINTENANCE_SECONDS):
+        """Prune the store periodically until cancelled"""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                await asyncio.to_thread(self.prune)
+            except Exception as e:
+                logger.warning("Shared cache maintenance failed: %s", e)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT namespace, COUNT(*), COALESCE(SUM(LENGTH(value)), 0) FROM entries GROUP BY namespace"
+            ).fetchall()
+        return {
+            "path": self.path,
+            "max_bytes": self.max_bytes,
+            "namespaces": {namespace: {"size": count, "bytes": size} for namespace, count, size in rows}
+        }
+
+    def close(self):
+        with self._lock:
+            self._conn.close()
+
+
+def run_off_loop(fn: Callable[..., Any], *args: Any):
+    """Call a blocking store method in a thread when on the event loop (without
+    waiting for it), or directly otherwise"""
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        fn(*args)
+        return
+    loop.run_in_executor(None, fn, *args)
+
+
+def create_shared_store() -> Optional[SharedStore]:
+    """The store selected by SHARED_CACHE_PATH, if any"""
+    return SharedStore(SHARED_CACHE_PATH) if SHARED_CACHE_PATH else None
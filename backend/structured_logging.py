@@ -0,0 +1,105 @@
+import json
+import logging
+import os
+import queue
+import sys
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Any, Dict, Optional
+
+from serialization import json_default
+
+# Logging configuration
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "json")  # json or text
+# Requests carrying this header get debug tracing; set it empty to disable
+DEBUG_TRACE_HEADER = os.getenv("DEBUG_TRACE_HEADER", "X-Debug-Trace")
+
+ROOT_LOGGER = "query_engine"
+
+# Debug tracing switched on for the current request only
+debug_trace: ContextVar[bool] = ContextVar("debug_trace", default=False)
+
+# LogRecord attributes that are not user-supplied extra fields
+_RECORD_ATTRIBUTES = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with any extra= fields as top-level keys"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry: Dict[str, Any] = {
+            "time": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in record.__dict__.items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=json_default)
+
+
+class TracingLogger(logging.LoggerAdapter):
+    """Logger whose debug output can be switched on per request.
+
+    Messages use %-style arguments, so nothing is formatted unless the
+    record is actually emitted.
+    """
+
+    def isEnabledFor(self, level: int) -> bool:
+        if level == logging.DEBUG and debug_trace.get():
+            return True
+        return self.logger.isEnabledFor(level)
+
+    def log(self, level: int, msg, *args, **kwargs):
+        if self.isEnabledFor(level):
+            # Bypass the logger's own level check, which knows nothing about tracing
+            self.logger._log(level, msg, args, **kwargs)
+
+
+def get_logger(name: str) -> TracingLogger:
+    return TracingLogger(logging.getLogger(f"{ROOT_LOGGER}.{name}"), {})
+
+
+def configure_logging() -> QueueListener:
+    """Send application logs through a queue to a background writer thread.
+
+    Request handlers only enqueue records, so slow stdout or log pipes never
+    block the event loop. The caller starts the returned listener and stops
+    it on shutdown to flush what is left.
+    """
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if LOG_FORMAT == "text":
+        stream_handler.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(name)s: %(message)s"))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.SimpleQueue = queue.SimpleQueue()
+    logger = logging.getLogger(ROOT_LOGGER)
+    logger.setLevel(LOG_LEVEL)
+    logger.handlers = [QueueHandler(log_queue)]
+    logger.propagate = False
+    return QueueListener(log_queue, stream_handler, respect_handler_level=True)
+
+
+class DebugTraceMiddleware:
+    """Enable debug tracing for requests that send the trace header"""
+
+    def __init__(self, app, header: Optional[str] = DEBUG_TRACE_HEADER):
+        self.app = app
+        self.header = header.lower().encode("latin-1") if header else None
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or self.header is None:
+            return await self.app(scope, receive, send)
+        enabled = any(name == self.header and value not in (b"", b"0", b"false")
+                      for name, value in scope["headers"])
+        token = debug_trace.set(enabled)
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            debug_trace.reset(token)
@@ -0,0 +1,54 @@
+import math
+
+from downsampling import OTHER_LABEL, lttb, top_k
+
+
+def test_lttb_keeps_endpoints_and_threshold():
+    values = [math.sin(i / 50) * 100 + i for i in range(10000)]
+
+    sampled = lttb(values, 500)
+
+    assert len(sampled) == 500
+    assert sampled[0] == (0, values[0])
+    assert sampled[-1] == (9999, values[-1])
+    indexes = [index for index, _ in sampled]
+    assert indexes == sorted(set(indexes))
+    assert all(values[index] == value for index, value in sampled)
+
+
+def test_lttb_keeps_a_spike():
+    values = [0.0] * 1000
+    values[637] = 50.0
+
+    assert (637, 50.0) in lttb(values, 20)
+
+
+def test_lttb_returns_short_series_unchanged():
+    assert lttb([3, 1, 2], 10) == [(0, 3), (1, 1), (2, 2)]
+    assert lttb([3, 1, 2, 5], 2) == [(0, 3), (3, 5)]
+    assert lttb([3, 1, 2, 5], 0) == []
+
+
+def test_top_k_folds_the_rest_into_other():
+    counts = {"a": 50, "b": 5, "c": 40, "d": 3, "e": 2}
+
+    reduced = top_k(counts, 3)
+
+    assert reduced == {"a": 50, "c": 40, OTHER_LABEL: 10}
+    assert sum(reduced.values()) == sum(counts.values())
+
+
+def test_top_k_keeps_small_maps_in_order():
+    counts = {"b": 1, "a": 2}
+
+    assert list(top_k(counts, 2).items()) == [("b", 1), ("a", 2)]
+
+
+def test_top_k_does_not_clobber_a_real_other_category():
+    counts = {OTHER_LABEL: 100, "a": 50, "b": 1, "c": 1}
+
+    reduced = top_k(counts, 3)
+
+    assert reduced[OTHER_LABEL] == 100
+    assert reduced[OTHER_LABEL + " "] == 2
+    assert sum(reduced.values()) == sum(counts.values())
@@ -0,0 +1,66 @@
+import pytest
+
+from generated_sql import parse_generated_query
+
+SCHEMA = {
+    "organizations": [
+        {"name": "id", "type": "integer", "primary_key": True},
+        {"name": "name", "type": "text"},
+        {"name": "status", "type": "text"},
+    ],
+    "wallets": [
+        {"name": "id", "type": "integer", "primary_key": True},
+        {"name": "organization_id", "type": "integer"},
+        {"name": "balance", "type": "numeric"},
+    ],
+}
+
+
+def test_clauses_and_column_positions():
+    parsed = parse_generated_query(
+        "SELECT * FROM wallets w INNER JOIN organizations o ON w.organization_id = o.id "
+        "WHERE o.status = $1 ORDER BY w.balance DESC LIMIT 100;", SCHEMA)
+
+    assert parsed.select == "*"
+    assert parsed.source == "wallets w INNER JOIN organizations o ON w.organization_id = o.id"
+    assert parsed.where == "o.status = $1"
+    assert parsed.order == "w.balance"
+    assert parsed.descending
+    assert parsed.column_count == 6
+    assert [(alias, column["name"], position) for alias, column, position in parsed.selected_columns()] == [
+        ("w", "id", 0), ("w", "organization_id", 1), ("w", "balance", 2),
+        ("o", "id", 3), ("o", "name", 4), ("o", "status", 5),
+    ]
+    assert parsed.column("o.status")[2] == 5
+    assert parsed.column("O.STATUS")[2] == 5
+    assert parsed.column("w.missing") is None
+
+
+def test_joined_but_unselected_tables_have_no_positions():
+    parsed = parse_generated_query(
+        "SELECT w.* FROM wallets w JOIN organizations o ON w.organization_id = o.id;", SCHEMA)
+
+    assert parsed.column_count == 3
+    assert [alias for alias, _, _ in parsed.selected_columns()] == ["w", "w", "w"]
+    assert parsed.column("o.status") == ("o", SCHEMA["organizations"][2], None)
+    assert parsed.where is None and parsed.order is None and not parsed.descending
+
+
+@pytest.mark.parametrize("query", [
+    "",
+    "SELECT",
+    "SELECT * FROM",
+    "DELETE FROM organizations;",
+    "SELECT * FROM organizations WHERE",
+    "SELECT * FROM organizations LIMIT ten;",
+    "SELECT * FROM organizations; DROP TABLE organizations;",
+    "SELECT name FROM organizations;",
+    "SELECT x.* FROM organizations o;",
+    "SELECT * FROM customers;",
+    "SELECT * FROM organizations o LEFT JOIN wallets w ON w.organization_id = o.id;",
+    "SELECT COUNT(*) FROM organizations;",
+    "SELECT * FROM organizations GROUP BY status;",
+    "SELECT * FROM (SELECT * FROM organizations) o;",
+])
+def test_malformed_or_unsupported_queries_are_not_parsed(query):
+    assert parse_generated_query(query, SCHEMA) is None
@@ -0,0 +1,75 @@
+from schema_index import JoinGraph
+
+# cards -> wallets -> organizations by declared foreign keys; audit_logs joins nothing
+SCHEMA = {
+    "organizations": [{"name": "id", "primary_key": True}, {"name": "name"}],
+    "wallets": [
+        {"name": "id", "primary_key": True},
+        {"name": "organization_id", "foreign_key": {"table": "organizations", "column": "id"}},
+    ],
+    "cards": [
+        {"name": "id", "primary_key": True},
+        {"name": "wallet_id", "foreign_key": {"table": "wallets", "column": "id"}},
+    ],
+    "audit_logs": [{"name": "id", "primary_key": True}],
+}
+
+WALLET_ORGANIZATION = ("wallets", "organization_id", "organizations", "id")
+CARD_WALLET = ("cards", "wallet_id", "wallets", "id")
+
+
+def test_path_joins_intermediate_tables():
+    graph = JoinGraph(SCHEMA, list(SCHEMA))
+
+    assert graph.plan(["cards", "organizations"]) == [
+        ("cards", "wallets", CARD_WALLET),
+        ("wallets", "organizations", WALLET_ORGANIZATION),
+    ]
+    assert graph.plan(["organizations", "cards"]) == [
+        ("organizations", "wallets", WALLET_ORGANIZATION),
+        ("wallets", "cards", CARD_WALLET),
+    ]
+
+
+def test_tables_on_the_path_are_joined_once():
+    graph = JoinGraph(SCHEMA, list(SCHEMA))
+
+    assert graph.plan(["cards", "organizations", "wallets"]) == [
+        ("cards", "wallets", CARD_WALLET),
+        ("wallets", "organizations", WALLET_ORGANIZATION),
+    ]
+
+
+def test_unreachable_tables_are_left_out():
+    graph = JoinGraph(SCHEMA, list(SCHEMA))
+
+    assert graph.plan(["cards", "audit_logs"]) == []
+    assert graph.distance("cards", "audit_logs") is None
+    assert graph.distance("cards", "organizations") == 2
+    assert graph.distance("cards", "cards") == 0
+
+
+def test_shortest_path_is_preferred():
+    schema = dict(SCHEMA, cards=SCHEMA["cards"] + [
+        {"name": "organization_id", "foreign_key": {"table": "organizations", "column": "id"}},
+    ])
+    graph = JoinGraph(schema, list(schema))
+
+    assert graph.plan(["cards", "organizations"]) == [
+        ("cards", "organizations", ("cards", "organization_id", "organizations", "id")),
+    ]
+
+
+def test_undeclared_keys_follow_the_naming_convention():
+    schema = {
+        "organizations": [{"name": "org_key", "primary_key": True}],
+        "wallets": [{"name": "id"}, {"name": "billing_organization_id"}],
+        "cards": [{"name": "id"}, {"name": "wallet_id"}],
+    }
+    graph = JoinGraph(schema, list(schema))
+
+    # <prefix>_<name>_id finds the table by its singular name, on its single primary key
+    assert graph.plan(["cards", "organizations"]) == [
+        ("cards", "wallets", ("cards", "wallet_id", "wallets", "id")),
+        ("wallets", "organizations", ("wallets", "billing_organization_id", "organizations", "org_key")),
+    ]
@@ -0,0 +1,147 @@
+import asyncio
+import datetime
+import decimal
+import sqlite3
+
+import pytest
+
+from connection_registry import ConnectionRegistry
+from database_manager import DatabaseManager
+from pagination import CursorCodec, InvalidCursor, plan_keyset, query_fingerprint
+
+SCHEMA = {
+    "organizations": [
+        {"name": "id", "type": "integer", "nullable": "NO", "primary_key": True},
+        {"name": "name", "type": "text", "nullable": "YES"},
+        {"name": "status", "type": "text", "nullable": "NO"},
+    ],
+    "wallets": [
+        {"name": "id", "type": "integer", "nullable": "NO", "primary_key": True},
+        {"name": "organization_id", "type": "integer", "nullable": "NO",
+         "foreign_key": {"table": "organizations", "column": "id"}},
+        {"name": "balance", "type": "numeric", "nullable": "YES"},
+    ],
+}
+
+
+def test_single_table_pages_by_primary_key():
+    plan = plan_keyset("SELECT * FROM organizations LIMIT 100;", SCHEMA)
+
+    assert plan.key == [("organizations.id", 0)]
+    assert plan.page_sql([], None, 10) == ("SELECT * FROM organizations ORDER BY organizations.id LIMIT 10;", [])
+    assert plan.page_sql([], [42], 10) == (
+        "SELECT * FROM organizations WHERE organizations.id > $1 ORDER BY organizations.id LIMIT 10;", [42]
+    )
+    assert plan.last_key([42, "Acme", "active"]) == [42]
+
+
+def test_descending_order_column_is_followed_by_primary_key():
+    plan = plan_keyset("SELECT * FROM organizations o WHERE o.status = $1 ORDER BY o.status DESC LIMIT 100;", SCHEMA)
+
+    assert plan.key == [("o.status", 2), ("o.id", 0)]
+    assert plan.descending
+    sql, params = plan.page_sql(["active"], ["active", 7], 10)
+    assert sql == ("SELECT * FROM organizations o WHERE (o.status = $1) AND o.status <= $2"
+                   " AND (o.status, o.id) < ($2, $3) ORDER BY o.status DESC, o.id DESC LIMIT 10;")
+    assert params == ["active", "active", 7]
+    assert plan.last_key([7, "Acme", "active"]) == ["active", 7]
+
+
+def test_join_keys_on_every_selected_table():
+    plan = plan_keyset("SELECT * FROM wallets w INNER JOIN organizations o ON w.organization_id = o.id "
+                       "ORDER BY w.balance LIMIT 100;", SCHEMA)
+    assert plan is None  # balance is nullable
+
+    plan = plan_keyset("SELECT * FROM wallets w INNER JOIN organizations o ON w.organization_id = o.id LIMIT 100;",
+                       SCHEMA)
+    assert plan.key == [("w.id", 0), ("o.id", 3)]
+    assert plan.column_count == 6
+
+
+def test_tables_only_joined_need_no_key():
+    plan = plan_keyset("SELECT w.* FROM wallets w INNER JOIN organizations o ON w.organization_id = o.id LIMIT 100;",
+                       SCHEMA)
+
+    assert plan.key == [("w.id", 0)]
+    assert plan.column_count == 3
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT status, COUNT(*) FROM organizations GROUP BY status;",
+    "SELECT DISTINCT * FROM organizations;",
+    "SELECT * FROM customers LIMIT 100;",
+    "SELECT * FROM organizations o ORDER BY o.missing;",
+])
+def test_queries_without_a_usable_key_are_not_planned(query):
+    assert plan_keyset(query, SCHEMA) is None
+
+
+def test_cursor_round_trips_key_values():
+    codec = CursorCodec(b"secret")
+    key = [decimal.Decimal("10.50"), datetime.datetime(2024, 1, 2, 3, 4, 5), 7]
+
+    cursor = codec.encode("fingerprint", key, 25)
+
+    assert codec.decode(cursor, "fingerprint") == (key, 25)
+
+
+def test_tampered_cursor_is_rejected():
+    codec = CursorCodec(b"secret")
+    cursor = codec.encode("fingerprint", [7], 25)
+    tampered = cursor[:-2] + ("A" if cursor[-2] != "A" else "B") + cursor[-1]
+
+    with pytest.raises(InvalidCursor):
+        codec.decode(tampered, "fingerprint")
+    with pytest.raises(InvalidCursor):
+        CursorCodec(b"other secret").decode(cursor, "fingerprint")
+    with pytest.raises(InvalidCursor):
+        codec.decode("not a cursor!", "fingerprint")
+
+
+def test_cursor_from_another_query_or_schema_version_is_rejected():
+    codec = CursorCodec(b"secret")
+    query = "SELECT * FROM organizations WHERE status = $1 LIMIT 100;"
+    fingerprint = query_fingerprint("conn", "v1", query, ["active"])
+    cursor = codec.encode(fingerprint, [7], 25)
+
+    # The generator's LIMIT is not part of the query's identity
+    assert codec.decode(cursor, query_fingerprint("conn", "v1", query.replace("100", "50"), ["active"])) == ([7], 25)
+    for other in (query_fingerprint("conn", "v2", query, ["active"]),
+                  query_fingerprint("conn", "v1", query, ["inactive"]),
+                  query_fingerprint("other", "v1", query, ["active"])):
+        with pytest.raises(InvalidCursor):
+            codec.decode(cursor, other)
+
+
+async def _sqlite_manager(tmp_path, max_rows):
+    path = tmp_path / "pages.db"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE organizations (id INTEGER PRIMARY KEY, name TEXT NOT NULL, status TEXT NOT NULL)")
+    db.executemany("INSERT INTO organizations VALUES (?, ?, ?)",
+                   [(i, f"org{i}", "active") for i in range(1, 51)])
+    db.commit()
+    db.close()
+    manager = DatabaseManager(registry=ConnectionRegistry())
+    connection_id = await manager.add_connection(name="pages", host="", port=0, username="", password="",
+                                                 database=str(path), db_type="sqlite", max_rows=max_rows)
+    return manager, connection_id
+
+
+def test_page_size_is_capped_by_the_connection_row_cap(tmp_path):
+    async def run():
+        manager, connection_id = await _sqlite_manager(tmp_path, max_rows=10)
+        try:
+            first = await manager.execute_page(connection_id, "SELECT * FROM organizations LIMIT 100;",
+                                               page_size=25)
+            second = await manager.execute_page(connection_id, "SELECT * FROM organizations LIMIT 100;",
+                                                cursor=first["next_cursor"])
+            with pytest.raises(ValueError):
+                await manager.execute_page(connection_id, "SELECT * FROM organizations LIMIT 100;", page_size=-5)
+            return first, second
+        finally:
+            await manager.close_all()
+
+    first, second = asyncio.run(run())
+
+    assert (first["count"], first["page_size"]) == (10, 10)
+    assert [row["id"] for row in second["rows"]] == list(range(11, 21))
@@ -0,0 +1,84 @@
+import asyncio
+import sqlite3
+import time
+
+import pydantic
+import pytest
+
+from connection_registry import ConnectionRegistry
+from database_manager import DatabaseManager, tightest_limit, timeout_message
+from main import ChatBatchRequest, ChatRequest, ChatStreamRequest
+from threaded_pool import PoolTimeout, SQLiteThreadPool
+
+
+def test_tightest_limit_ignores_unset_and_negative_limits():
+    assert tightest_limit(None, 30.0) == 30.0
+    assert tightest_limit(5.0, 30.0) == 5.0
+    assert tightest_limit(0, 100) == 100
+    assert tightest_limit(-1, 100) == 100
+    assert tightest_limit(None, 0, -5) is None
+
+
+@pytest.mark.parametrize("model", [ChatRequest, ChatStreamRequest])
+@pytest.mark.parametrize("field", ["timeout_seconds", "max_rows"])
+@pytest.mark.parametrize("value", [0, -1])
+def test_request_limits_must_be_positive(model, field, value):
+    with pytest.raises(pydantic.ValidationError):
+        model(message="show all wallets", **{field: value})
+    with pytest.raises(pydantic.ValidationError):
+        ChatBatchRequest(messages=["show all wallets"], **{field: value})
+
+
+def _stream(tmp_path, unbounded, allow_unbounded_stream):
+    path = tmp_path / "stream.db"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE IF NOT EXISTS wallets (id INTEGER PRIMARY KEY)")
+    db.executemany("INSERT OR IGNORE INTO wallets VALUES (?)", [(i,) for i in range(50)])
+    db.commit()
+    db.close()
+
+    async def run():
+        manager = DatabaseManager(registry=ConnectionRegistry())
+        connection_id = await manager.add_connection(name="stream", host="", port=0, username="", password="",
+                                                     database=str(path), db_type="sqlite", max_rows=10,
+                                                     allow_unbounded_stream=allow_unbounded_stream)
+        try:
+            return [rows async for _, rows in manager.stream_query(connection_id, "SELECT * FROM wallets;",
+                                                                   batch_size=4, unbounded=unbounded)]
+        finally:
+            await manager.close_all()
+
+    return asyncio.run(run())
+
+
+def test_unbounded_stream_keeps_the_row_cap_unless_the_connection_allows_it(tmp_path):
+    capped = _stream(tmp_path, unbounded=True, allow_unbounded_stream=False)
+    assert sum(len(rows) for rows in capped if rows) == 10
+    assert capped[-1] is None
+
+    lifted = _stream(tmp_path, unbounded=True, allow_unbounded_stream=True)
+    assert sum(len(rows) for rows in lifted if rows) == 50
+    assert None not in lifted
+
+
+def test_timeout_message_without_a_timeout():
+    assert timeout_message(0.5) == "timed out after 0.5 seconds"
+    assert timeout_message(None) == "timed out"
+
+
+def test_waiting_for_a_connection_is_not_a_statement_timeout(tmp_path):
+    async def run():
+        pool = SQLiteThreadPool(str(tmp_path / "pool.db"), max_size=1, max_idle_seconds=60)
+        try:
+            busy = asyncio.create_task(pool.run(lambda conn: time.sleep(0.5)))
+            await asyncio.sleep(0.1)
+            with pytest.raises(PoolTimeout):
+                await pool.run(lambda conn: None, timeout=0.1)
+            await busy
+            with pytest.raises(asyncio.TimeoutError) as raised:
+                await pool.run(lambda conn: time.sleep(0.5), timeout=0.1)
+            assert not isinstance(raised.value, PoolTimeout)
+        finally:
+            await pool.close()
+
+    asyncio.run(run())
@@ -0,0 +1,147 @@
+import asyncio
+import sqlite3
+
+import pytest
+
+from cache import LRUCache
+from connection_registry import ConnectionRegistry
+from database_manager import DatabaseManager
+from result_cache import is_cacheable_query, normalize_sql
+
+
+def test_normalize_sql_collapses_whitespace_outside_literals():
+    assert normalize_sql("  SELECT *\n  FROM   organizations\tWHERE name = 'a  b' ;  ") == (
+        "SELECT * FROM organizations WHERE name = 'a  b'"
+    )
+    assert normalize_sql('SELECT "two  words", \'it\'\'s  here\' FROM t;') == (
+        'SELECT "two  words", \'it\'\'s  here\' FROM t'
+    )
+    assert normalize_sql("SELECT 1") == normalize_sql("SELECT   1;")
+
+
+@pytest.mark.parametrize("query", [
+    "SELECT * FROM organizations WHERE status = $1 LIMIT 100;",
+    "  with active AS (SELECT * FROM organizations) SELECT * FROM active;",
+    "SELECT uuid, rand_score, changes FROM events;",
+    "SELECT * FROM organizations WHERE updated_at > $1;",
+])
+def test_plain_reads_are_cacheable(query):
+    assert is_cacheable_query(query)
+
+
+@pytest.mark.parametrize("query", [
+    "INSERT INTO organizations (name) VALUES ('Acme');",
+    "UPDATE organizations SET status = 'inactive';",
+    "DELETE FROM organizations;",
+    "WITH gone AS (DELETE FROM organizations RETURNING *) SELECT * FROM gone;",
+    "SELECT * INTO archive FROM organizations;",
+    "SELECT * FROM organizations FOR UPDATE;",
+    "SELECT * FROM organizations FOR NO KEY UPDATE;",
+    "SELECT * FROM organizations FOR KEY SHARE;",
+    "SELECT 1; DROP TABLE organizations;",
+    "SELECT nextval('organizations_id_seq');",
+    "SELECT pg_advisory_lock(1);",
+    "SELECT set_config('search_path', 'other', false);",
+    "SELECT random();",
+    "SELECT RAND();",
+    "SELECT gen_random_uuid();",
+    "SELECT UUID();",
+    "SELECT now();",
+    "SELECT clock_timestamp();",
+    "SELECT * FROM events WHERE day = CURRENT_DATE;",
+    "SELECT * FROM events WHERE at > localtimestamp;",
+    "SELECT CURDATE();",
+    "SELECT datetime('now');",
+    "SELECT LAST_INSERT_ID();",
+    "EXPLAIN ANALYZE DELETE FROM organizations;",
+])
+def test_writes_and_volatile_reads_are_not_cacheable(query):
+    assert not is_cacheable_query(query)
+
+
+def test_least_recently_used_results_are_evicted_over_the_byte_budget():
+    results = LRUCache(100, max_bytes=100)
+
+    results.put(("conn", "a"), "a", size=40)
+    results.put(("conn", "b"), "b", size=40)
+    results.get(("conn", "a"))
+    results.put(("conn", "c"), "c", size=40)
+
+    assert list(results.entries) == [("conn", "a"), ("conn", "c")]
+    assert results.total_bytes == 80
+    assert results.evictions == 1
+
+
+def test_results_larger_than_the_budget_are_not_cached():
+    results = LRUCache(100, max_bytes=100)
+    results.put(("conn", "a"), "a", size=40)
+
+    results.put(("conn", "a"), "replaced", size=101)
+    results.put(("conn", "b"), "b", size=101)
+
+    assert results.entries == {}
+    assert results.total_bytes == 0
+
+
+def test_purge_group_drops_one_connection():
+    results = LRUCache(100, max_bytes=100)
+    results.put(("conn", "a"), "a", size=10)
+    results.put(("other", "a"), "a", size=20)
+
+    assert results.purge_group("conn") == 1
+    assert list(results.entries) == [("other", "a")]
+    assert results.total_bytes == 20
+
+
+async def _sqlite_manager(tmp_path):
+    path = tmp_path / "results.db"
+    db = sqlite3.connect(path)
+    db.execute("CREATE TABLE organizations (id INTEGER PRIMARY KEY, name TEXT NOT NULL)")
+    db.executemany("INSERT INTO organizations VALUES (?, ?)", [(1, "Acme"), (2, "Globex")])
+    db.commit()
+    db.close()
+    manager = DatabaseManager(registry=ConnectionRegistry())
+    connection_id = await manager.add_connection(name="results", host="", port=0, username="", password="",
+                                                 database=str(path), db_type="sqlite", result_cache_ttl=60)
+    return manager, path, connection_id
+
+
+def test_reads_are_served_from_the_cache_until_the_schema_changes(tmp_path):
+    async def run():
+        manager, path, connection_id = await _sqlite_manager(tmp_path)
+        try:
+            await manager.execute_query(connection_id, "SELECT * FROM organizations;")
+            db = sqlite3.connect(path)
+            db.execute("INSERT INTO organizations VALUES (3, 'Initech')")
+            db.commit()
+            db.close()
+            cached = await manager.execute_query(connection_id, "SELECT *\n  FROM organizations")
+            # A first schema load has nothing stale to drop
+            manager._on_schema_change(connection_id, None, "v1")
+            still_cached = await manager.execute_query(connection_id, "SELECT * FROM organizations;")
+            manager._on_schema_change(connection_id, "v1", "v2")
+            fresh = await manager.execute_query(connection_id, "SELECT * FROM organizations;")
+            return cached, still_cached, fresh, manager.result_cache.stats()
+        finally:
+            await manager.close_all()
+
+    cached, still_cached, fresh, stats = asyncio.run(run())
+
+    assert cached["count"] == still_cached["count"] == 2
+    assert fresh["count"] == 3
+    assert (stats["hits"], stats["misses"]) == (2, 2)
+
+
+def test_volatile_reads_always_reach_the_database(tmp_path):
+    async def run():
+        manager, _, connection_id = await _sqlite_manager(tmp_path)
+        try:
+            draws = [await manager.execute_query(connection_id, "SELECT random() AS draw;") for _ in range(2)]
+            return draws, len(manager.result_cache.entries)
+        finally:
+            await manager.close_all()
+
+    (first, second), cached_entries = asyncio.run(run())
+
+    assert first["rows"] != second["rows"]
+    assert cached_entries == 0
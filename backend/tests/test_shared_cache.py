@@ -0,0 +1,146 @@
+import asyncio
+
+import cache
+import shared_store
+from cache import SharedLRUCache
+from query_generator import QueryGenerator
+from schema_cache import SchemaCache, schema_version
+from shared_store import SharedStore
+
+SCHEMA = {
+    "organizations": [
+        {"name": "id", "type": "integer", "nullable": "NO", "primary_key": True},
+        {"name": "name", "type": "text", "nullable": "YES"},
+    ],
+}
+
+
+class Clock:
+    """Stands in for the time module in cache.py and shared_store.py"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def _workers(tmp_path, **options):
+    """Two stores on one file, as two worker processes would open it"""
+    path = str(tmp_path / "shared.db")
+    return SharedStore(path, sync_interval=0, **options), SharedStore(path, sync_interval=0, **options)
+
+
+def test_translations_are_reused_by_other_workers(tmp_path):
+    store_a, store_b = _workers(tmp_path)
+    worker_a, worker_b = QueryGenerator(store_a), QueryGenerator(store_b)
+
+    async def run():
+        first = await worker_a.translate("Show all organizations", SCHEMA, "v1")
+        second = await worker_b.translate("show  ALL organizations", SCHEMA, "v1")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert first[:2] == second[:2]
+    assert worker_b.translation_cache.stats()["shared_hits"] == 1
+    assert worker_b.translation_cache.misses == 0
+    store_a.close()
+    store_b.close()
+
+
+def test_purges_reach_the_other_workers(tmp_path):
+    store_a, store_b = _workers(tmp_path)
+    results_a = SharedLRUCache(store_a, "results", 10)
+    results_b = SharedLRUCache(store_b, "results", 10)
+
+    async def fill():
+        await results_a.aput(("conn", "SELECT 1"), {"rows": [[1]]})
+        await results_a.aput(("other", "SELECT 1"), {"rows": [[2]]})
+        # Worker b now holds its own copies
+        return await results_b.aget(("conn", "SELECT 1")), await results_b.aget(("other", "SELECT 1"))
+
+    async def lookup():
+        return await results_b.aget(("conn", "SELECT 1")), await results_b.aget(("other", "SELECT 1"))
+
+    assert asyncio.run(fill()) == ({"rows": [[1]]}, {"rows": [[2]]})
+    # Off the event loop the store is purged before purge_group returns
+    results_a.purge_group("conn")
+    purged, kept = asyncio.run(lookup())
+
+    assert purged is None
+    assert kept == {"rows": [[2]]}
+    assert list(results_b.entries) == [("other", "SELECT 1")]
+    assert store_a.get("results", ("conn", "SELECT 1")) is None
+    store_a.close()
+    store_b.close()
+
+
+def test_large_entries_stay_in_their_worker(tmp_path):
+    store_a, store_b = _workers(tmp_path, max_entry_bytes=64)
+    results_a = SharedLRUCache(store_a, "results", 10)
+    results_b = SharedLRUCache(store_b, "results", 10)
+
+    async def run():
+        await results_a.aput(("conn", "big"), {"rows": []}, size=100)
+        await results_a.aput(("conn", "wide"), {"rows": ["x" * 100]})
+        return await results_b.aget(("conn", "big")), await results_b.aget(("conn", "wide"))
+
+    assert asyncio.run(run()) == (None, None)
+    assert results_a.get(("conn", "big")) == {"rows": []}
+    store_a.close()
+    store_b.close()
+
+
+def test_shared_entries_keep_their_ttl(tmp_path, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    monkeypatch.setattr(shared_store, "time", clock)
+    store_a, store_b = _workers(tmp_path)
+    results_a = SharedLRUCache(store_a, "results", 10, ttl_seconds=60)
+    results_b = SharedLRUCache(store_b, "results", 10, ttl_seconds=600)
+
+    async def run():
+        await results_a.aput(("conn", "SELECT 1"), {"rows": [[1]]})
+        clock.now += 30
+        adopted = await results_b.aget(("conn", "SELECT 1"))
+        clock.now += 31
+        return adopted, results_b.get(("conn", "SELECT 1")), store_b.get("results", ("conn", "SELECT 1"))
+
+    adopted, expired_copy, expired_entry = asyncio.run(run())
+
+    assert adopted == {"rows": [[1]]}
+    # Worker b's copy expires with the original entry, not after its own TTL
+    assert expired_copy is None
+    assert expired_entry is None
+    store_a.close()
+    store_b.close()
+
+
+def test_schema_changes_reach_the_other_workers(tmp_path):
+    store_a, store_b = _workers(tmp_path)
+    schemas_a, schemas_b = SchemaCache(store=store_a), SchemaCache(store=store_b)
+    changes = []
+    schemas_b.listeners.append(lambda *change: changes.append(change))
+    changed = {"organizations": SCHEMA["organizations"] + [{"name": "status", "type": "text", "nullable": "NO"}]}
+
+    async def run():
+        await schemas_a.put("conn", SCHEMA, "fingerprint-1")
+        adopted = await schemas_b.get("conn")
+        await schemas_a.put("conn", changed, "fingerprint-2")
+        return adopted, await schemas_b.get("conn")
+
+    adopted, updated = asyncio.run(run())
+
+    assert adopted["schema"] == SCHEMA
+    assert updated["schema"] == changed and updated["fingerprint"] == "fingerprint-2"
+    # Worker b's listeners purge what it derived from the old schema
+    assert changes == [
+        ("conn", None, schema_version(SCHEMA)),
+        ("conn", schema_version(SCHEMA), schema_version(changed)),
+    ]
+    store_a.close()
+    store_b.close()
@@ -0,0 +1,60 @@
+import datetime
+import decimal
+import os
+import pickle
+import stat
+import uuid
+
+from shared_store import SharedStore
+
+
+def test_store_file_is_private(tmp_path):
+    path = tmp_path / "shared.db"
+    store = SharedStore(str(path))
+
+    store.put("results", "key", {"rows": []})
+
+    for name in os.listdir(tmp_path):
+        assert stat.S_IMODE(os.stat(tmp_path / name).st_mode) == 0o600
+    store.close()
+
+
+def test_values_round_trip_as_json(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+    results = {
+        "columns": ["amount", "created_at", "day", "token", "raw"],
+        "rows": [{"amount": decimal.Decimal("10.50"), "created_at": datetime.datetime(2024, 1, 2, 3, 4, 5),
+                  "day": datetime.date(2024, 1, 2), "token": uuid.UUID(int=7), "raw": b"\x00\xff"}],
+        "count": 1,
+    }
+
+    assert store.put("results", ("conn", "SELECT 1"), results, group="conn", size=100)
+    value, size, expires_at = store.get("results", ("conn", "SELECT 1"))
+
+    assert value == results
+    assert size == 100 and expires_at is None
+    store.close()
+
+
+def test_pickled_entries_are_never_loaded(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"))
+
+    class Exploit:
+        def __reduce__(self):
+            return (os.system, ("exit 1",))
+
+    store._conn.execute("INSERT INTO entries VALUES (?, ?, ?, ?, ?, ?, ?)",
+                        ("results", store._encode_key("key"), None, pickle.dumps(Exploit()), 1, 0.0, None))
+
+    assert store.get("results", "key") is None
+    store.close()
+
+
+def test_entries_over_the_size_limit_are_not_shared(tmp_path):
+    store = SharedStore(str(tmp_path / "shared.db"), max_entry_bytes=64)
+
+    assert not store.put("results", "big", "x" * 100)
+    assert not store.put("results", "declared", "x", size=65)
+    assert store.put("results", "small", "x")
+    assert store.get("results", "big") is None
+    store.close()
@@ -0,0 +1,102 @@
+import datetime
+from decimal import Decimal
+
+import pytest
+
+from database_manager import to_dialect
+from schema_index import TableColumns, is_integer_type
+
+QUERY = "SELECT * FROM organizations WHERE name ILIKE $2 AND status = $1 AND id > $2 LIMIT 100;"
+
+
+def test_postgresql_is_unchanged():
+    assert to_dialect(QUERY, ["active", "%acme%"], "postgresql") == (QUERY, ["active", "%acme%"])
+
+
+def test_sqlite_takes_numbered_placeholders():
+    query, params = to_dialect(QUERY, ["active", "%acme%"], "sqlite")
+
+    assert query == "SELECT * FROM organizations WHERE name LIKE ?2 AND status = ?1 AND id > ?2 LIMIT 100;"
+    assert params == ["active", "%acme%"]
+
+
+def test_mysql_takes_positional_placeholders_in_order():
+    query, params = to_dialect(QUERY, ["active", "%acme%"], "mysql")
+
+    assert query == "SELECT * FROM organizations WHERE name LIKE %s AND status = %s AND id > %s LIMIT 100;"
+    assert params == ["%acme%", "active", "%acme%"]
+
+
+def test_mysql_doubles_literal_percent_signs():
+    query, params = to_dialect("SELECT * FROM t WHERE a ilike '10%' AND b = $1;", [1], "mysql")
+
+    assert query == "SELECT * FROM t WHERE a LIKE '10%%' AND b = %s;"
+    assert params == [1]
+
+
+def test_queries_without_parameters_only_lose_ilike():
+    query = "SELECT * FROM t WHERE a ILIKE '10%';"
+
+    assert to_dialect(query, [], "sqlite") == ("SELECT * FROM t WHERE a LIKE '10%';", None)
+    assert to_dialect(query, None, "mysql") == ("SELECT * FROM t WHERE a LIKE '10%';", None)
+
+
+def test_ilike_inside_identifiers_is_kept():
+    query, _ = to_dialect("SELECT unlikely_ilike_flag FROM t WHERE a ILIKE $1;", ["x"], "sqlite")
+
+    assert query == "SELECT unlikely_ilike_flag FROM t WHERE a LIKE ?1;"
+
+
+@pytest.mark.parametrize("column_type", [
+    "integer", "INT", "bigint", "smallint", "tinyint(1)", "mediumint", "int(11) unsigned", "bigint unsigned", "int8",
+])
+def test_integer_types(column_type):
+    assert is_integer_type(column_type)
+
+
+@pytest.mark.parametrize("column_type", ["interval", "point", "integer[]", "internal", "numeric", "text", ""])
+def test_non_integer_types(column_type):
+    assert not is_integer_type(column_type)
+
+
+def test_bind_value_follows_the_declared_type():
+    columns = TableColumns([
+        {"name": "id", "type": "bigint"},
+        {"name": "location", "type": "point"},
+        {"name": "balance", "type": "numeric"},
+        {"name": "is_active", "type": "boolean"},
+    ])
+
+    assert columns.bind_value("id", "42") == 42
+    assert columns.bind_value("location", "42") == "42"
+    assert columns.bind_value("balance", "10.50") == Decimal("10.50")
+    assert columns.bind_value("is_active", "yes") is True
+    assert columns.bind_value("id", "many") == "many"
+
+
+def test_bind_value_parses_dates_and_times():
+    columns = TableColumns([
+        {"name": "day", "type": "date"},
+        {"name": "created_at", "type": "timestamp without time zone"},
+        {"name": "updated_at", "type": "timestamp with time zone"},
+        {"name": "opens", "type": "time without time zone"},
+        {"name": "logged", "type": "DATETIME"},
+    ])
+
+    assert columns.bind_value("day", "2024-01-02") == datetime.date(2024, 1, 2)
+    assert columns.bind_value("day", "20240102") == datetime.date(2024, 1, 2)
+    assert columns.bind_value("created_at", "2024-01-02t03:04") == datetime.datetime(2024, 1, 2, 3, 4)
+    # A timestamp without time zone ignores the offset, as PostgreSQL does for a literal
+    assert columns.bind_value("created_at", "2024-01-02 03:04+02:00") == datetime.datetime(2024, 1, 2, 3, 4)
+    assert columns.bind_value("updated_at", "2024-01-02 03:04z") == datetime.datetime(
+        2024, 1, 2, 3, 4, tzinfo=datetime.timezone.utc)
+    assert columns.bind_value("opens", "09:30") == datetime.time(9, 30)
+    assert columns.bind_value("logged", "2024-01-02") == datetime.datetime(2024, 1, 2)
+    assert columns.bind_value("day", "2024") == "2024"
+
+
+def test_sqlite_binds_dates_as_iso_text():
+    _, params = to_dialect("SELECT * FROM t WHERE day = $1 AND at = $2 AND n = $3;",
+                           [datetime.date(2024, 1, 2), datetime.datetime(2024, 1, 2, 3, 4), 7], "sqlite")
+
+    assert params == ["2024-01-02", "2024-01-02 03:04:00", 7]
@@ -0,0 +1,116 @@
+import asyncio
+
+import cache
+from cache import LRUCache
+from query_generator import QueryGenerator
+
+SCHEMA = {
+    "organizations": [
+        {"name": "id", "type": "integer", "nullable": "NO", "primary_key": True},
+        {"name": "name", "type": "text", "nullable": "YES"},
+        {"name": "status", "type": "text", "nullable": "NO"},
+    ],
+}
+
+
+class Clock:
+    """Stands in for the time module in cache.py"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self):
+        return self.now
+
+    def time(self):
+        return self.now
+
+
+def test_questions_differing_in_case_and_spacing_share_a_translation():
+    generator = QueryGenerator()
+
+    async def run():
+        first = await generator.translate("Show all  organizations", SCHEMA, "v1")
+        second = await generator.translate("  show ALL organizations\n", SCHEMA, "v1")
+        return first, second
+
+    first, second = asyncio.run(run())
+
+    assert QueryGenerator.normalize_message("  show ALL\torganizations\n") == "show all organizations"
+    assert list(generator.translation_cache.entries) == [("v1", "show all organizations")]
+    assert (generator.translation_cache.hits, generator.translation_cache.misses) == (1, 1)
+    assert first[:2] == second[:2]
+    # The explanation quotes the question as it was asked, not the cached one
+    assert "'  show ALL organizations\n'" in second[2]
+
+
+def test_translations_are_keyed_by_schema_version():
+    generator = QueryGenerator()
+
+    async def run():
+        await generator.translate("show all organizations", SCHEMA, "v1")
+        await generator.translate("show all organizations", SCHEMA, "v2")
+
+    asyncio.run(run())
+
+    assert generator.translation_cache.misses == 2
+    assert set(generator.translation_cache.entries) == {
+        ("v1", "show all organizations"), ("v2", "show all organizations"),
+    }
+
+
+def test_schema_change_purges_translations_of_the_old_version():
+    generator = QueryGenerator()
+
+    async def run():
+        await generator.translate("show all organizations", SCHEMA, "v1")
+        await generator.translate("show all organizations", SCHEMA, "v2")
+
+    asyncio.run(run())
+    # A first load has no old version and leaves the cache alone
+    generator.on_schema_change("conn", None, "v1")
+    assert len(generator.translation_cache.entries) == 2
+
+    generator.on_schema_change("conn", "v1", "v3")
+
+    assert list(generator.translation_cache.entries) == [("v2", "show all organizations")]
+
+
+def test_entries_expire_after_the_ttl(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache, "time", clock)
+    translations = LRUCache(10, ttl_seconds=60)
+
+    translations.put(("v1", "question"), "SELECT 1;")
+    translations.put(("v1", "other"), "SELECT 2;", ttl_seconds=5)
+    clock.now += 30
+
+    assert translations.get(("v1", "question")) == "SELECT 1;"
+    assert translations.get(("v1", "other")) is None
+
+    clock.now += 30
+
+    assert translations.get(("v1", "question")) is None
+    assert translations.stats()["expirations"] == 2
+    assert translations.entries == {}
+
+
+def test_oldest_entries_are_evicted_beyond_max_entries():
+    translations = LRUCache(2)
+
+    translations.put(("v1", "a"), 1)
+    translations.put(("v1", "b"), 2)
+    translations.get(("v1", "a"))
+    translations.put(("v1", "c"), 3)
+
+    assert list(translations.entries) == [("v1", "a"), ("v1", "c")]
+    assert translations.evictions == 1
+
+
+def test_zero_entries_disables_the_cache():
+    translations = LRUCache(0)
+
+    translations.put(("v1", "a"), 1)
+
+    assert translations.get(("v1", "a")) is None
+    assert not translations.enabled
@@ -0,0 +1,331 @@
+import asyncio
+import sqlite3
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from typing import Any, AsyncIterator, Callable, Dict, List, Optional
+from urllib.request import pathname2url
+
+import pymysql
+
+
+class StreamCancelled(Exception):
+    """Raised inside a streaming worker once the consumer has gone away"""
+
+
+class PoolTimeout(ConnectionError):
+    """No pooled connection could be opened, or became free, in time"""
+
+
+_STREAM_DONE = object()
+
+
+class ThreadedConnectionPool:
+    """Run a blocking DB-API driver off the event loop.
+
+    Work is submitted to a bounded thread pool and every worker thread keeps
+    its own connection, so at most ``max_size`` connections are ever open and
+    no connection is shared between threads.
+    """
+
+    def __init__(self, max_size: int, max_idle_seconds: float, name: str = "db"):
+        self.max_size = max_size
+        self.max_idle_seconds = max_idle_seconds
+        self._executor = ThreadPoolExecutor(max_workers=max_size, thread_name_prefix=f"{name}-pool")
+        self._local = threading.local()
+        self._connections: List[Any] = []
+        self._lock = threading.Lock()
+        self._busy = 0
+        self._closing = False
+        # Called on the worker thread with the seconds a call waited for its connection
+        self.on_acquire: Optional[Callable[[float], None]] = None
+
+    def _connect(self):
+        """Open a new driver connection (runs on a worker thread)"""
+        raise NotImplementedError
+
+    def _is_alive(self, conn) -> bool:
+        """Check whether a connection is still usable (runs on a worker thread)"""
+        return True
+
+    def _interrupt(self, conn):
+        """Abort the statement running on conn (runs on a helper thread); no-op by default"""
+
+    def _interrupt_call(self, running: Dict[str, Any]):
+        """Interrupt a call that is still using its connection"""
+        # Holding the lock keeps the worker from moving on to another call meanwhile
+        with running["lock"]:
+            conn = running["conn"]
+            if conn is not None:
+                try:
+                    self._interrupt(conn)
+                except Exception:
+                    pass
+
+    def _discard(self, conn):
+        """Close a connection and forget it"""
+        with self._lock:
+            if conn in self._connections:
+                self._connections.remove(conn)
+        try:
+            conn.close()
+        except Exception:
+            pass
+        self._local.conn = None
+
+    def _thread_connection(self):
+        """Return this worker thread's connection, opening or replacing it as needed"""
+        conn = getattr(self._local, "conn", None)
+        now = time.monotonic()
+        # Long-idle connections may have been dropped by the server
+        if conn is not None and now - self._local.last_used > self.max_idle_seconds:
+            if not self._is_alive(conn):
+                self._discard(conn)
+                conn = None
+        if conn is None:
+            conn = self._connect()
+            with self._lock:
+                self._connections.append(conn)
+            self._local.conn = conn
+        self._local.last_used = now
+        return conn
+
+    def _call(self, fn: Callable, args: tuple, retry: bool = True, submitted: Optional[float] = None,
+              running: Optional[Dict[str, Any]] = None):
+        """Run fn(conn, *args) on the current worker thread, retrying once on a dead connection.
+
+        ``running["conn"]`` holds the connection while fn runs, so the caller
+        can interrupt the statement if it gives up waiting; ``running["acquired"]``
+        tells whether fn got a connection at all.
+        """
+        running = running or {"lock": threading.Lock(), "conn": None, "acquired": False}
+        with self._lock:
+            self._busy += 1
+        try:
+            conn = self._thread_connection()
+            if self.on_acquire is not None and submitted is not None:
+                self.on_acquire(time.perf_counter() - submitted)
+            with running["lock"]:
+                running["conn"] = conn
+                running["acquired"] = True
+            try:
+                return fn(conn, *args)
+            except Exception:
+                if not retry or self._is_alive(conn):
+                    raise
+                # The server dropped our connection - reconnect and retry once
+                self._discard(conn)
+                conn = self._thread_connection()
+                with running["lock"]:
+                    running["conn"] = conn
+                return fn(conn, *args)
+        finally:
+            with running["lock"]:
+                running["conn"] = None
+            with self._lock:
+                self._busy -= 1
+
+    async def run(self, fn: Callable, *args, timeout: Optional[float] = None) -> Any:
+        """Run fn(conn, *args) on a pooled connection without blocking the event loop.
+
+        Cancelling the awaiting task (a disconnected client) or running past
+        timeout interrupts the statement instead of leaving it running on the
+        worker. A timeout that expires before a connection was opened or free
+        raises PoolTimeout rather than TimeoutError.
+        """
+        if self._closing:
+            raise RuntimeError("Pool is closed")
+        loop = asyncio.get_running_loop()
+        running = {"lock": threading.Lock(), "conn": None, "acquired": False}
+        try:
+            return await asyncio.wait_for(loop.run_in_executor(
+                self._executor, self._call, fn, args, True, time.perf_counter(), running
+            ), timeout)
+        except asyncio.TimeoutError:
+            loop.run_in_executor(None, self._interrupt_call, running)
+            if not running["acquired"]:
+                raise PoolTimeout("timed out waiting for a database connection")
+            raise
+        except asyncio.CancelledError:
+            # Interrupting may need a round trip of its own; don't wait for it
+            loop.run_in_executor(None, self._interrupt_call, running)
+            raise
+
+    async def stream(self, fn: Callable, *args, max_pending: int = 2) -> AsyncIterator[Any]:
+        """Run fn(conn, emit, *args) on a pooled connection and yield everything it emits.
+
+        ``emit`` blocks the worker while ``max_pending`` items are waiting to be
+        consumed, so memory stays bounded however much the driver produces.
+        """
+        if self._closing:
+            raise RuntimeError("Pool is closed")
+        loop = asyncio.get_running_loop()
+        queue: asyncio.Queue = asyncio.Queue(maxsize=max_pending)
+        cancelled = threading.Event()
+        running = {"lock": threading.Lock(), "conn": None, "acquired": False}
+        finished = False
+
+        def put(item):
+            future = asyncio.run_coroutine_threadsafe(queue.put(item), loop)
+            while True:
+                try:
+                    return future.result(timeout=0.1)
+                except FutureTimeoutError:
+                    if cancelled.is_set():
+                        future.cancel()
+                        raise StreamCancelled()
+
+        def emit(item):
+            if cancelled.is_set():
+                raise StreamCancelled()
+            put(item)
+
+        def produce(conn):
+            try:
+                fn(conn, emit, *args)
+                put(_STREAM_DONE)
+            except StreamCancelled:
+                pass
+            except Exception as e:
+                put(e)
+
+        def worker_done(future):
+            # Failures before fn ran (e.g. connecting) never reach the queue otherwise
+            if not future.cancelled() and future.exception() is not None and not cancelled.is_set():
+                loop.create_task(queue.put(future.exception()))
+
+        # Partially streamed results cannot be replayed, so no reconnect-and-retry
+        worker = loop.run_in_executor(self._executor, self._call, produce, (), False, time.perf_counter(),
+                                      running)
+        worker.add_done_callback(worker_done)
+        try:
+            while True:
+                item = await queue.get()
+                if item is _STREAM_DONE or isinstance(item, Exception):
+                    finished = True
+                if item is _STREAM_DONE:
+                    break
+                if isinstance(item, Exception):
+                    raise item
+                yield item
+        finally:
+            cancelled.set()
+            if not finished:
+                # Abandoned mid-statement (e.g. the client went away) - stop the query itself
+                loop.run_in_executor(None, self._interrupt_call, running)
+            try:
+                await worker
+            except Exception:
+                # Already surfaced through the queue, or the stream was abandoned
+                pass
+
+    async def ping(self):
+        """Round-trip a trivial query through the pool"""
+        await self.run(lambda conn: conn.cursor().execute("SELECT 1"))
+
+    async def close(self):
+        """Wait for in-flight work, then close every connection"""
+        self._closing = True
+        await asyncio.get_running_loop().run_in_executor(None, self._executor.shutdown)
+        self.terminate()
+
+    def terminate(self):
+        """Close every connection immediately"""
+        self._closing = True
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        with self._lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.close()
+            except Exception:
+                pass
+
+    def is_closing(self) -> bool:
+        return self._closing
+
+    def get_size(self) -> int:
+        return len(self._connections)
+
+    def get_idle_size(self) -> int:
+        return max(len(self._connections) - self._busy, 0)
+
+    def get_min_size(self) -> int:
+        return 0
+
+    def get_max_size(self) -> int:
+        return self.max_size
+
+
+class MySQLThreadPool(ThreadedConnectionPool):
+    """PyMySQL connections pooled behind a bounded executor"""
+
+    def __init__(self, conn_info: Dict[str, Any], max_size: int, max_idle_seconds: float,
+                 connect_timeout: float):
+        super().__init__(max_size, max_idle_seconds, name="mysql")
+        self.conn_info = conn_info
+        self.connect_timeout = connect_timeout
+
+    def _connect(self):
+        return pymysql.connect(
+            host=self.conn_info["host"],
+            port=self.conn_info["port"],
+            user=self.conn_info["username"],
+            password=self.conn_info["password"],
+            database=self.conn_info["database"],
+            connect_timeout=int(self.connect_timeout),
+            # Long-lived connections must not pin a REPEATABLE READ snapshot
+            autocommit=True
+        )
+
+    def _is_alive(self, conn) -> bool:
+        try:
+            conn.ping(reconnect=False)
+            return True
+        except Exception:
+            return False
+
+    def _interrupt(self, conn):
+        # The busy connection can't take commands, so kill its statement from a fresh one
+        killer = self._connect()
+        try:
+            with killer.cursor() as cursor:
+                cursor.execute("KILL QUERY %d" % conn.thread_id())
+        finally:
+            killer.close()
+
+
+class SQLiteThreadPool(ThreadedConnectionPool):
+    """One sqlite3 connection per worker thread on a bounded executor"""
+
+    def __init__(self, database: str, max_size: int, max_idle_seconds: float,
+                 read_only: bool = False, wal: bool = True, mmap_size: int = 0,
+                 cached_statements: int = 128):
+        super().__init__(max_size, max_idle_seconds, name="sqlite")
+        self.read_only = read_only
+        self.cached_statements = cached_statements
+        self.wal = wal
+        self.mmap_size = mmap_size
+        # Accept plain paths as well as file: URIs with their own parameters
+        if database.startswith("file:"):
+            self.uri = database
+        else:
+            self.uri = f"file:{pathname2url(database)}"
+        if read_only and "mode=" not in self.uri:
+            self.uri += ("&" if "?" in self.uri else "?") + "mode=ro"
+
+    def _connect(self):
+        # Each connection only ever runs on its own worker thread, but the pool
+        # closes them from the event loop thread on shutdown
+        conn = sqlite3.connect(self.uri, uri=True, check_same_thread=False,
+                               cached_statements=self.cached_statements)
+        if self.wal and not self.read_only:
+            # Readers no longer block on writers; the mode persists in the file
+            conn.execute("PRAGMA journal_mode=WAL")
+        if self.mmap_size:
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+        return conn
+
+    def _interrupt(self, conn):
+        # Safe to call from another thread; the statement fails with "interrupted"
+        conn.interrupt()
@@ -33,15 +33,19 @@ function ChatInterface({ connectionId, connectionName }) {
     setLoading(true)
 
     try {
+      // Columnar results carry each row once, as an array of values
       const response = await axios.post(`${API_BASE_URL}/api/chat`, {
         message,
         db_connection_id: connectionId
+      }, {
+        params: { format: 'columnar' }
       })
 
       const assistantMessage = {
         role: 'assistant',
         content: response.data.explanation,
         sql_query: response.data.sql_query,
+        sql_params: response.data.sql_params,
         timestamp: new Date().toISOString()
       }
 
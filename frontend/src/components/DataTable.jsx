@@ -1,13 +1,16 @@
 import React from 'react'
 import './DataTable.css'
 
-function DataTable({ data }) {
-  if (!data || !data.rows || data.rows.length === 0) {
+function DataTable({ data, results }) {
+  // Columnar responses reference results.rows instead of repeating them
+  const columnar = results && results.format === 'columnar'
+  const rows = (columnar ? results.rows : data && data.rows) || []
+
+  if (!data || rows.length === 0) {
     return <div className="no-data">No data available</div>
   }
 
   const columns = data.columns || []
-  const rows = data.rows || []
 
   return (
     <div className="data-table-container">
@@ -23,9 +26,10 @@ function DataTable({ data }) {
           <tbody>
             {rows.map((row, rowIdx) => (
               <tr key={rowIdx}>
-                {columns.map((col, colIdx) => (
-                  <td key={colIdx}>{row[col] !== null ? String(row[col]) : 'null'}</td>
-                ))}
+                {columns.map((col, colIdx) => {
+                  const value = columnar ? row[colIdx] : row[col]
+                  return <td key={colIdx}>{value !== null ? String(value) : 'null'}</td>
+                })}
               </tr>
             ))}
           </tbody>
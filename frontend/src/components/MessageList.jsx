@@ -42,6 +42,9 @@ function MessageList({ messages, loading }) {
                   <details>
                     <summary>View SQL Query</summary>
                     <pre><code>{message.sql_query}</code></pre>
+                    {message.sql_params?.length > 0 && (
+                      <pre><code>{message.sql_params.map((value, i) => `$${i + 1} = ${JSON.stringify(value)}`).join('\n')}</code></pre>
+                    )}
                   </details>
                 </div>
               )}
@@ -45,7 +45,7 @@ function QueryResult({ result }) {
 
       <div className="result-content">
         {activeTab === 'table' && (
-          <DataTable data={visualizations.table} />
+          <DataTable data={visualizations.table} results={result.results} />
         )}
         {activeTab === 'charts' && (
           <Chart charts={visualizations.charts} />